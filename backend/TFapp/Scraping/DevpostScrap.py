@@ -1,6 +1,12 @@
 import requests
 from datetime import datetime
 
+try:
+    from .http_cache import conditional_get
+except ImportError:
+    # Running this file standalone (python DevpostScrap.py)
+    from http_cache import conditional_get
+
 try:
     from django.utils import timezone as dj_timezone
     DJANGO_TZ_AVAILABLE = True
@@ -79,13 +85,27 @@ def format_datetime(month, day, year):
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
 
-def fetch_devpost_filtered_events():
-    api_url = "https://devpost.com/api/hackathons?page=1&per_page=20"
-    response = requests.get(api_url, timeout=10)
-    response.raise_for_status()
+DEVPOST_API_URL = "https://devpost.com/api/hackathons"
+
+
+def fetch_devpost_page(session=None, page=1, per_page=20, base_url=DEVPOST_API_URL):
+    """Fetch one page of the Devpost hackathon API and return parsed events.
+
+    The request is conditional (ETag / Last-Modified from the previous
+    fetch of the same page); returns None when Devpost answers 304.
+    """
+    response = conditional_get(session, base_url, params={"page": page, "per_page": per_page})
+    if response is None:
+        return None
+    return parse_devpost_hackathons(response.json())
+
+
+def fetch_devpost_filtered_events(page=1, per_page=20):
+    return fetch_devpost_page(page=page, per_page=per_page) or []
 
-    data = response.json()
 
+def parse_devpost_hackathons(data):
+    """Convert a Devpost API payload into the scraper's event dicts."""
     events = []
 
     for h in data.get("hackathons", []):
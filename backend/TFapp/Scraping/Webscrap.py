@@ -2,6 +2,12 @@ import json
 from datetime import datetime
 from kaggle.api.kaggle_api_extended import KaggleApi
 
+try:
+    from .http_cache import payload_changed
+except ImportError:
+    # Running this file standalone (python Webscrap.py)
+    from http_cache import payload_changed
+
 # Try to use Django timezone utilities when running inside the project.
 # If Django isn't available (running this file standalone), fall back to UTC.
 try:
@@ -36,40 +42,59 @@ def ensure_timezone_aware(dt):
 def Confirmation():
     print("Added events to database")
 
+def fetch_kaggle_page(api, page, skip_unchanged=False):
+    """Fetch one page of Kaggle competitions as event dictionaries.
+
+    The Kaggle client offers no conditional requests, so with
+    skip_unchanged=True the page is hashed instead and None is returned
+    when it is identical to the previous fetch.
+    """
+    events = []
+    competitions = api.competitions_list(sort_by='latestDeadline', page=page)
+
+    for comp in competitions:
+        #print(dir(comp))
+        # Keep the original datetime objects from Kaggle's API instead
+        # of converting them to strings. We'll make them timezone-aware
+        # later (in the scheduler) if needed. Keeping them as datetimes
+        # makes it easier to inspect and convert correctly.
+        event = {
+            "id": comp.ref,
+            "title": comp.title,
+            #"organization": comp.organizationName,
+            "description": comp.description,
+            #"reward": comp.reward,
+            #"category": comp.category,
+            "startDate": comp.enabled_date,
+            "submissionsDeadline": comp.deadline,
+            #"hostSegment": comp.hostSegmentTitle,
+            #"isPrivate": comp.isPrivate,
+            #"enabledDate": comp.enabledDate,
+            #"maxTeamSize": comp.maxTeamSize,
+            #"userHasEntered": comp.userHasEntered
+        }
+        events.append(event)
+    if skip_unchanged and not payload_changed(f"kaggle:page:{page}", events):
+        return None
+    return events
+
+
+def kaggle_api():
+    api = KaggleApi()
+    api.authenticate()
+    return api
+
+
 def fetch_kaggle_events(max_pages=2):
     """
     Fetch Kaggle competitions (treated as events)
     and return a list of event dictionaries.
     """
-    api = KaggleApi()
-    api.authenticate()
+    api = kaggle_api()
 
     all_events = []
     for page in range(1, max_pages + 1):
-        competitions = api.competitions_list(sort_by='latestDeadline', page=page)
-        
-        for comp in competitions:
-            #print(dir(comp))
-            # Keep the original datetime objects from Kaggle's API instead
-            # of converting them to strings. We'll make them timezone-aware
-            # later (in the scheduler) if needed. Keeping them as datetimes
-            # makes it easier to inspect and convert correctly.
-            event = {
-                "id": comp.ref,
-                "title": comp.title,
-                #"organization": comp.organizationName,
-                "description": comp.description,
-                #"reward": comp.reward,
-                #"category": comp.category,
-                "startDate": comp.enabled_date,
-                "submissionsDeadline": comp.deadline,
-                #"hostSegment": comp.hostSegmentTitle,
-                #"isPrivate": comp.isPrivate,
-                #"enabledDate": comp.enabledDate,
-                #"maxTeamSize": comp.maxTeamSize,
-                #"userHasEntered": comp.userHasEntered
-            }
-            all_events.append(event)
+        all_events.extend(fetch_kaggle_page(api, page))
     return all_events
 
 
@@ -0,0 +1,74 @@
+"""Conditional HTTP fetching for the scrapers.
+
+`conditional_get` remembers the ETag / Last-Modified validators returned for
+each URL (query string included) and sends them back as If-None-Match /
+If-Modified-Since on the next request. When the server answers
+304 Not Modified it returns None, and the caller can skip the whole page.
+
+For sources that are not plain HTTP (the Kaggle client), `payload_changed`
+gives the same answer by comparing a digest of the fetched payload with the
+previous one.
+"""
+import hashlib
+import json
+import threading
+
+import requests
+
+_lock = threading.Lock()
+# url -> {"etag": ..., "last_modified": ...}
+_validators = {}
+# key -> sha256 hex digest of the last payload seen
+_digests = {}
+
+
+def conditional_get(session, url, params=None, timeout=10):
+    """GET ``url``; returns the response, or None if the server answered 304."""
+    http = session or requests
+    full_url = requests.Request("GET", url, params=params).prepare().url
+    with _lock:
+        state = dict(_validators.get(full_url, {}))
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    response = http.get(full_url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+
+    state = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    with _lock:
+        if state["etag"] or state["last_modified"]:
+            _validators[full_url] = state
+        else:
+            _validators.pop(full_url, None)
+    return response
+
+
+def payload_digest(payload):
+    """Stable sha256 of a JSON-serializable payload (datetimes via str())."""
+    data = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def payload_changed(key, payload):
+    """True if ``payload`` differs from the last one recorded under ``key``."""
+    digest = payload_digest(payload)
+    with _lock:
+        if _digests.get(key) == digest:
+            return False
+        _digests[key] = digest
+    return True
+
+
+def reset():
+    """Forget all validators and digests (next fetch is unconditional)."""
+    with _lock:
+        _validators.clear()
+        _digests.clear()
@@ -0,0 +1,129 @@
+"""Registry of event sources and a concurrent page fetcher.
+
+Each source knows how to fetch one page of events. `fetch_pages` runs every
+(source, page) pair on a thread pool and yields pages as soon as they
+arrive, so the caller can ingest page 1 of Devpost while Kaggle is still
+answering. HTTP sources share one pooled keep-alive `requests.Session` per
+source.
+
+New sources register themselves with `@register_source`:
+
+    @register_source
+    class MySource(EventSource):
+        name = "mysource"
+        def fetch_page(self, session, page):
+            ...
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .DevpostScrap import DEVPOST_API_URL, fetch_devpost_page
+
+logger = logging.getLogger(__name__)
+
+SOURCES = {}
+# Threads used to fetch pages concurrently
+MAX_WORKERS = 8
+
+
+def register_source(cls):
+    SOURCES[cls.name] = cls
+    return cls
+
+
+class EventSource:
+    """A paginated source of scraped events."""
+    name = None
+    max_pages = 1
+
+    def pages(self):
+        return range(1, self.max_pages + 1)
+
+    def fetch_page(self, session, page):
+        """Return the list of event dicts on ``page`` (may be empty), or
+        None if the page has not changed since the last fetch."""
+        raise NotImplementedError
+
+
+@register_source
+class DevpostSource(EventSource):
+    name = "devpost"
+
+    def __init__(self, base_url=DEVPOST_API_URL, max_pages=5, per_page=20):
+        self.base_url = base_url
+        self.max_pages = max_pages
+        self.per_page = per_page
+
+    def fetch_page(self, session, page):
+        return fetch_devpost_page(session, page=page, per_page=self.per_page, base_url=self.base_url)
+
+
+@register_source
+class KaggleSource(EventSource):
+    """Kaggle competitions via the official client (which brings its own HTTP pool)."""
+    name = "kaggle"
+
+    def __init__(self, max_pages=2):
+        self.max_pages = max_pages
+        self._api = None
+        self._lock = threading.Lock()
+
+    def api(self):
+        with self._lock:
+            if self._api is None:
+                # Imported lazily: the kaggle package authenticates on import
+                from .Webscrap import kaggle_api
+
+                self._api = kaggle_api()
+            return self._api
+
+    def fetch_page(self, session, page):
+        from .Webscrap import fetch_kaggle_page
+
+        return fetch_kaggle_page(self.api(), page, skip_unchanged=True)
+
+
+def make_session(pool_size=MAX_WORKERS):
+    """A keep-alive session whose connection pool fits every worker thread."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def default_sources():
+    return [cls() for cls in SOURCES.values()]
+
+
+def fetch_pages(sources=None, max_workers=MAX_WORKERS):
+    """Fetch all pages of ``sources`` concurrently.
+
+    Yields ``(source_name, page, events)`` in completion order; ``events``
+    is None for pages that have not changed since the last fetch. A failing
+    page is logged and skipped; it doesn't stop the other pages.
+    """
+    sources = default_sources() if sources is None else list(sources)
+    sessions = {src.name: make_session(max_workers) for src in sources}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape") as pool:
+            futures = {
+                pool.submit(src.fetch_page, sessions[src.name], page): (src.name, page)
+                for src in sources
+                for page in src.pages()
+            }
+            for future in as_completed(futures):
+                name, page = futures[future]
+                try:
+                    events = future.result()
+                except Exception:
+                    logger.exception("Failed to fetch %s page %s", name, page)
+                    continue
+                yield name, page, events
+    finally:
+        for session in sessions.values():
+            session.close()
@@ -13,15 +13,23 @@ class TfappConfig(AppConfig):
         We guard with the RUN_MAIN environment variable so the scheduler isn't
         started twice when the development autoreloader is active.
         """
-    # Only start scheduler in the autoreloader's child/main process.
-    # When using `runserver`, Django sets RUN_MAIN='true' in the process
-    # that should run background tasks; this avoids starting the scheduler
-    # twice (once in the parent process and once in the child).
-    if os.environ.get('RUN_MAIN') == 'true':
-        try:
-            # Import here to avoid side-effects at import time
-            from .scheduler import start_scheduler
+        # Register model signal handlers (embedding index maintenance)
+        from . import signals  # noqa: F401
 
-            start_scheduler()
-        except Exception:
-            logging.exception("Failed to start TFapp scheduler")
+        from django.conf import settings
+        if getattr(settings, 'TFAPP_SQLITE_TUNING', False):
+            from .sqlite_tuning import install
+            install()
+
+        # Only start scheduler in the autoreloader's child/main process.
+        # When using `runserver`, Django sets RUN_MAIN='true' in the process
+        # that should run background tasks; this avoids starting the scheduler
+        # twice (once in the parent process and once in the child).
+        if os.environ.get('RUN_MAIN') == 'true':
+            try:
+                # Import here to avoid side-effects at import time
+                from .scheduler import start_scheduler
+
+                start_scheduler()
+            except Exception:
+                logging.exception("Failed to start TFapp scheduler")
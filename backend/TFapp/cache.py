@@ -0,0 +1,113 @@
+"""Versioned response cache for the read-heavy event endpoints.
+
+Cached responses are keyed by a *generation* counter, the view action and
+the full query string (so every page is cached separately). Any write to an
+Event, Team or Membership bumps the generation (see signals.py, and the
+bulk writer in ingestion.py), which orphans every cached response at once;
+stale entries simply expire. Embeddings are not part of any response, so
+the embedding job leaves the generation alone.
+
+The generation and a time bucket of ``TFAPP_RESPONSE_CACHE_TIMEOUT`` seconds
+also form the response ETag, so a client revalidating with If-None-Match
+gets a 304 without the view or the cache being touched. The time bucket
+matters because some responses (e.g. upcoming events) change as time passes
+without any write.
+
+``get_cache`` returns the same backend for other cached data (see
+``recommendation/recommendations.py``).
+
+The cache backend is ``settings.CACHES[TFAPP_RESPONSE_CACHE_ALIAS]``:
+local memory by default, any shared Django backend (Redis, Memcached,
+database) to share entries and invalidation between processes.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    """The cache backend configured by ``TFAPP_RESPONSE_CACHE_ALIAS``."""
+    return caches[getattr(settings, 'TFAPP_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'TFAPP_RESPONSE_CACHE_TIMEOUT', 60)
+
+
+def generation(name):
+    """Current value of the generation counter ``name``.
+
+    Counters start from the clock, so a restart (or an evicted counter)
+    never reuses a number that cache keys were already built with.
+    """
+    cache = get_cache()
+    key = f'tfapp:generation:{name}'
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def bump_generation(name):
+    cache = get_cache()
+    key = f'tfapp:generation:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not set yet (or evicted): any fresh value is newer
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def response_generation():
+    return generation('responses')
+
+
+def bump_response_generation():
+    """Invalidate every cached response."""
+    bump_generation('responses')
+
+
+def response_key(request, action):
+    """``(cache key, ETag)`` for ``request`` handled by ``action``."""
+    bucket = int(time.time() // _timeout())
+    path = hashlib.sha1(request.get_full_path().encode('utf-8')).hexdigest()[:16]
+    version = f'{response_generation()}-{bucket}-{action}-{path}'
+    return f'tfapp:response:{version}', f'"{version}"'
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(',')) or header.strip() == '*'
+
+
+def cache_response(view_method):
+    """Cache the successful GET responses of a viewset action.
+
+    The wrapped method runs after authentication and permission checks, so
+    only requests that would have been allowed are answered from the cache.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_method(self, request, *args, **kwargs)
+        key, etag = response_key(request, self.action)
+        if _etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        cache = get_cache()
+        data = cache.get(key)
+        if data is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, timeout=_timeout())
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+    return wrapper
@@ -0,0 +1,131 @@
+"""Bulk, idempotent ingestion of scraped events.
+
+Every scraped item carries a source id (Kaggle ref / Devpost URL) that is
+stored in the unique `Event.source_key` column. `ingest_events` loads the
+rows already known for a batch with one query, diffs them in memory, then
+inserts new events with `bulk_create` and updates changed ones with
+`bulk_update`. Running it twice on the same batch changes nothing.
+
+The digest of the normalized item is stored with the row
+(`Event.source_digest`); an item whose digest matches is skipped without
+comparing fields or writing. Saving the row any other way (admin, API)
+clears the digest, and a deleted row has none, so the next pass restores or
+re-creates it from the source.
+"""
+import logging
+
+from django.db import transaction
+
+from .Scraping.DevpostScrap import ensure_timezone_aware
+from .cache import bump_response_generation
+from .Scraping.http_cache import payload_digest
+from .models import EmbeddingJob, Event
+from .recommendation.index import update_event_index
+from .recommendation.jobs import enqueue_embedding_jobs
+from .recommendation.search import update_search_index
+
+logger = logging.getLogger(__name__)
+
+# Fields copied from a scraped item onto the Event row
+SCRAPED_FIELDS = ('name', 'description', 'start_date', 'end_date')
+# Changes to these fields invalidate the event's embedding
+EMBEDDED_FIELDS = ('name', 'description')
+BATCH_SIZE = 500
+
+
+def _max_length(field_name):
+    return Event._meta.get_field(field_name).max_length
+
+
+def normalize_scraped_event(item):
+    """Map a scraper dict onto Event field values, or None if it is unusable."""
+    key = item.get("id")
+    start = ensure_timezone_aware(item.get("startDate"))
+    end = ensure_timezone_aware(item.get("submissionsDeadline"))
+    if not key or not hasattr(start, 'tzinfo') or not hasattr(end, 'tzinfo'):
+        return None
+    return {
+        'source_key': str(key)[:_max_length('source_key')],
+        'name': (item.get("title") or "")[:_max_length('name')],
+        'description': item.get("description") or "",
+        'start_date': start,
+        'end_date': end,
+    }
+
+
+def ingest_events(source, items):
+    """Insert or update the scraped ``items`` of one ``source``.
+
+    Returns a dict with the number of ``inserted``, ``updated``,
+    ``unchanged`` and ``skipped`` (unparseable) items.
+    """
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    scraped = {}
+    for item in items:
+        values = normalize_scraped_event(item)
+        if values is None:
+            counts['skipped'] += 1
+            continue
+        # Later duplicates of the same id within a batch win
+        scraped[values['source_key']] = values
+
+    digests = {key: payload_digest(values) for key, values in scraped.items()}
+
+    with transaction.atomic():
+        # Only the digests first: unchanged items never load their fields
+        stored = Event.objects.filter(source_key__in=list(scraped)).values_list('source_key', 'source_digest')
+        for key, digest in stored:
+            if digest == digests[key]:
+                del scraped[key]
+                counts['unchanged'] += 1
+        if not scraped:
+            return counts
+
+        existing = {
+            ev.source_key: ev
+            for ev in Event.objects.filter(source_key__in=list(scraped)).only('pk', 'source_key', 'embedding_needs_update', *SCRAPED_FIELDS)
+        }
+        new_events, changed, dirty, restamped = [], [], [], []
+        for key, values in scraped.items():
+            ev = existing.get(key)
+            if ev is None:
+                new_events.append(Event(location=key[:_max_length('location')], source_digest=digests[key], **values))
+                continue
+            ev.source_digest = digests[key]
+            diff = [f for f in SCRAPED_FIELDS if getattr(ev, f) != values[f]]
+            if not diff:
+                # Only the stored digest was missing or outdated
+                counts['unchanged'] += 1
+                restamped.append(ev)
+                continue
+            for f in diff:
+                setattr(ev, f, values[f])
+            if any(f in EMBEDDED_FIELDS for f in diff):
+                ev.mark_embedding_dirty()
+                dirty.append(ev.pk)
+            changed.append(ev)
+
+        # bulk_create/bulk_update skip post_save, so queue embedding jobs here
+        Event.objects.bulk_create(new_events, batch_size=BATCH_SIZE)
+        Event.objects.bulk_update(changed, [*SCRAPED_FIELDS, 'embedding_needs_update', 'source_digest'], batch_size=BATCH_SIZE)
+        Event.objects.bulk_update(restamped, ['source_digest'], batch_size=BATCH_SIZE)
+        enqueue_embedding_jobs(EmbeddingJob.EntityType.EVENT, [ev.pk for ev in new_events] + dirty)
+
+        if new_events or changed:
+            # No post_save from bulk writes; invalidate cached responses here
+            transaction.on_commit(bump_response_generation)
+        if changed:
+            # ...and patch the indexes, whose end_date / text would otherwise
+            # stay stale until a rebuild. New events enter them once embedded.
+            changed_pks = [ev.pk for ev in changed]
+
+            def refresh_indexes():
+                rows = list(Event.objects.filter(pk__in=changed_pks).only('pk', 'embedding', *SCRAPED_FIELDS))
+                update_event_index(rows)
+                update_search_index(rows)
+            transaction.on_commit(refresh_indexes)
+
+    counts['inserted'] = len(new_events)
+    counts['updated'] = len(changed)
+    logger.info("Ingested %s events: %s", source, counts)
+    return counts
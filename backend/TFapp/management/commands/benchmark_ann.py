@@ -0,0 +1,109 @@
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from TFapp.recommendation.index import EmbeddingIndex
+from TFapp.recommendation.ivf import IVFIndex
+from TFapp.recommendation.pq import PQIndex
+
+
+def synthetic_vectors(n, dim, clusters, seed=0):
+    """Clustered Gaussian vectors, closer to real embeddings than pure noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 1.5 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure recall@k, latency and memory of the IVF and product-quantized "
+        "indexes against exact search, for stored embeddings or a synthetic table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity', choices=['user', 'event', 'team'], help="Benchmark the stored embeddings of this model")
+        parser.add_argument('--synthetic', type=int, default=100_000, help="Rows of synthetic data when --entity is not given (default: 100000)")
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--nlist', type=int, help="Number of lists (default: ~sqrt(rows))")
+        parser.add_argument('--nprobe', default='1,4,8,16,32,64', help="Comma-separated nprobe values to try")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        ids, vectors = self._load(options)
+        if not len(ids):
+            raise CommandError("No vectors to benchmark.")
+        rng = np.random.default_rng(options['seed'])
+        queries = vectors[rng.choice(len(ids), size=min(options['queries'], len(ids)), replace=False)]
+        queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+        k = options['k']
+
+        exact = EmbeddingIndex()
+        exact.upsert(ids, vectors)
+        started = time.perf_counter()
+        truth = [set(pk for pk, _ in exact.search(q, k)) for q in queries]
+        exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        ivf = IVFIndex()
+        ivf.upsert(ids, vectors)
+        started = time.perf_counter()
+        ivf.train(nlist=options['nlist'])
+        self.stdout.write(
+            f"{len(ids)} rows, {ivf.nlist} lists, trained in {time.perf_counter() - started:.1f}s; "
+            f"exact search {exact_ms:.2f} ms/query"
+        )
+
+        # Round-trip through the on-disk format so the numbers reflect a
+        # memory-mapped index.
+        with tempfile.TemporaryDirectory() as tmp:
+            ivf.save(f'{tmp}/ivf')
+            ivf = IVFIndex.load(f'{tmp}/ivf')
+            for nprobe in (int(p) for p in options['nprobe'].split(',')):
+                started = time.perf_counter()
+                results = [ivf.search(q, k, nprobe=nprobe) for q in queries]
+                ms = (time.perf_counter() - started) * 1000 / len(queries)
+                recall = np.mean([
+                    len(truth[i] & {pk for pk, _ in hits}) / max(len(truth[i]), 1)
+                    for i, hits in enumerate(results)
+                ])
+                self.stdout.write(
+                    f"nprobe={min(nprobe, ivf.nlist):>4}  recall@{k}={recall:.3f}  {ms:.2f} ms/query"
+                )
+
+        by_id = dict(zip(ids, vectors))
+        for label, fetch in (('pq', None), ('pq+rerank', lambda pks: {pk: by_id[pk] for pk in pks})):
+            pq = PQIndex(fetch_vectors=fetch)
+            pq.upsert(ids, vectors)
+            pq.train()
+            self._report(label, pq, queries, truth, k, exact.nbytes)
+
+    def _report(self, label, index, queries, truth, k, exact_bytes):
+        started = time.perf_counter()
+        results = [index.search(q, k) for q in queries]
+        ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = np.mean([
+            len(truth[i] & {pk for pk, _ in hits}) / max(len(truth[i]), 1)
+            for i, hits in enumerate(results)
+        ])
+        self.stdout.write(
+            f"{label:>10}  recall@{k}={recall:.3f}  {ms:.2f} ms/query  "
+            f"{index.nbytes / 2**20:.1f} MiB ({exact_bytes / index.nbytes:.0f}x smaller)"
+        )
+
+    def _load(self, options):
+        if options['entity']:
+            from django.apps import apps
+
+            model_cls = apps.get_model('TFapp', options['entity'])
+            ids, vectors = [], []
+            for obj in model_cls.objects.only('id', 'embedding').iterator(chunk_size=2000):
+                ids.append(obj.pk)
+                vectors.append(obj.get_embedding_array())
+            return ids, np.array(vectors, dtype=np.float32).reshape(len(ids), -1)
+        n = options['synthetic']
+        vectors = synthetic_vectors(n, 300, clusters=max(n // 500, 1), seed=options['seed'])
+        return [uuid.UUID(int=i) for i in range(n)], vectors
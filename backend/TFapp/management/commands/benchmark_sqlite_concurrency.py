@@ -0,0 +1,172 @@
+import multiprocessing
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections, transaction
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from TFapp import sqlite_tuning
+from TFapp.models import Event, User
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float('nan')
+
+
+def _write(ids, chunk_size, stop, results):
+    """Rewrite event embeddings like ``fasttext.save_embeddings`` until ``stop`` is set.
+
+    One bulk_update of ``chunk_size`` rows per transaction. Puts
+    ``(rows written, errors, commit times)`` on ``results``.
+    """
+    rng = np.random.default_rng(0)
+    writes, errors, times = 0, 0, []
+    position = 0
+    while not stop.is_set():
+        chunk = ids[position:position + chunk_size]
+        position = (position + chunk_size) % len(ids)
+        events = [Event(pk=pk, embedding=rng.normal(size=300).astype(np.float32)) for pk in chunk]
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                Event.objects.bulk_update(events, ['embedding'])
+        except DatabaseError:
+            errors += 1
+            continue
+        times.append(time.perf_counter() - started)
+        writes += len(events)
+    connection.close()
+    results.put((writes, errors, times))
+
+
+def copy_database(source, copy, journal_mode):
+    """Consistent copy of ``source`` through the SQLite backup API.
+
+    A plain file copy would miss pages still in ``source``'s WAL file and
+    keep its journal mode, which is persistent in WAL mode.
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(copy)
+    try:
+        src.backup(dst)
+        dst.execute(f'PRAGMA journal_mode={journal_mode}')
+    finally:
+        dst.close()
+        src.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure /events/ read latency and throughput while an embedding-job style "
+        "writer rewrites event embeddings, on a scratch copy of the SQLite database, "
+        "with the default settings and with TFapp.sqlite_tuning."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help="Concurrent reader threads")
+        parser.add_argument('--seconds', type=float, default=10.0, help="Duration of each run")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Rows per write transaction")
+        parser.add_argument('--mode', choices=['both', 'default', 'tuned'], default='both')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark only applies to SQLite.")
+        source = Path(connection.settings_dict['NAME'])
+        modes = ['default', 'tuned'] if options['mode'] == 'both' else [options['mode']]
+        sqlite_tuning.uninstall()
+        try:
+            for mode in modes:
+                with tempfile.TemporaryDirectory() as scratch:
+                    self._run(mode, source, Path(scratch) / 'bench.sqlite3', options)
+        finally:
+            if getattr(settings, 'TFAPP_SQLITE_TUNING', False):
+                sqlite_tuning.install()
+
+    def _run(self, mode, source, copy, options):
+        connection.close()
+        # The default run measures a stock SQLite setup: rollback journal and
+        # deferred transactions, whatever the project settings enable
+        copy_database(source, copy, 'WAL' if mode == 'tuned' else 'DELETE')
+        saved = [(d, d['NAME'], d.get('OPTIONS')) for d in (connections.settings['default'], connection.settings_dict)]
+        for settings_dict, _, options_dict in saved:
+            db_options = dict(options_dict or {})
+            if mode == 'tuned':
+                db_options['transaction_mode'] = 'IMMEDIATE'
+            else:
+                db_options.pop('transaction_mode', None)
+            settings_dict['NAME'] = str(copy)
+            settings_dict['OPTIONS'] = db_options
+        if mode == 'tuned':
+            sqlite_tuning.install()
+        try:
+            # Cached responses would never reach the database
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                result = self._measure(options)
+        finally:
+            sqlite_tuning.uninstall()
+            connection.close()
+            for settings_dict, name, options_dict in saved:
+                settings_dict['NAME'] = name
+                settings_dict['OPTIONS'] = options_dict
+        reads, errors, writes, write_times = result
+        seconds = options['seconds']
+        self.stdout.write(
+            f"{mode:>8}: {len(reads) / seconds:7.1f} reads/s  "
+            f"p50 {percentile(reads, 50):7.1f} ms  p95 {percentile(reads, 95):7.1f} ms  "
+            f"p99 {percentile(reads, 99):7.1f} ms  errors {errors}  |  "
+            f"{writes / seconds:7.0f} rows written/s  "
+            f"commit p95 {percentile(write_times, 95):7.1f} ms"
+        )
+
+    def _measure(self, options):
+        user = User.objects.filter(is_active=True).first()
+        ids = list(Event.objects.values_list('pk', flat=True))
+        if user is None or not ids:
+            raise CommandError("Needs at least one active user and one event.")
+        stop = threading.Event()
+        lock = threading.Lock()
+        reads = []
+        counters = {'errors': 0}
+
+        def reader():
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    response = client.get('/TFapp/events/')
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        if response.status_code == 200:
+                            reads.append(elapsed)
+                        else:
+                            counters['errors'] += 1
+            finally:
+                connection.close()
+
+        # The writer runs in its own process, like the embedding worker, so
+        # it competes with the readers for the database and not for the GIL
+        context = multiprocessing.get_context('fork')
+        stop_writer = context.Event()
+        results = context.Queue()
+        connection.close()
+        writer = context.Process(target=_write, args=(ids, options['chunk_size'], stop_writer, results))
+        writer.start()
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        stop_writer.set()
+        for thread in threads:
+            thread.join()
+        writes, write_errors, write_times = results.get()
+        writer.join()
+        return reads, counters['errors'] + write_errors, writes, write_times
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from TFapp.query_plans import FULL_SCAN_PATTERNS, explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot queries (event listings, dirty-embedding polls, "
+        "membership lookups) and fail if any of them scans a whole table. "
+        "Supports SQLite and PostgreSQL. The test suite runs the same check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every plan, not only failing ones")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f"Query plan checks are not supported on {connection.vendor}.")
+        failures = []
+        for label, plan, scanned in explain_hot_queries():
+            if scanned:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {', '.join(scanned)}"))
+            else:
+                self.stdout.write(f"ok         {label}")
+            if scanned or options['verbose_plans']:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries fall back to a full scan.")
+        self.stdout.write(self.style.SUCCESS("All hot queries use an index."))
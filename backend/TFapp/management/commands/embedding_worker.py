@@ -0,0 +1,96 @@
+import logging
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from TFapp.recommendation.fasttext import EMBEDDING_CHUNK_SIZE, load_model, get_token_cache
+from TFapp.recommendation.jobs import claim_jobs, default_worker_id, process_jobs
+from TFapp.recommendation.recommendations import precompute_recommendations
+from TFapp.recommendation.shared import publish_shared_indexes
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run an embedding worker that consumes the EmbeddingJob queue. "
+        "Start several copies to process the queue in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EMBEDDING_CHUNK_SIZE,
+                            help="Jobs claimed per batch")
+        parser.add_argument('--min-sleep', type=float, default=0.5,
+                            help="Initial idle back-off in seconds")
+        parser.add_argument('--max-sleep', type=float, default=30.0,
+                            help="Maximum idle back-off in seconds")
+        parser.add_argument('--worker-id', default=None,
+                            help="Name recorded on claimed jobs (default: host:pid)")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue once and exit")
+
+    def handle(self, *args, **options):
+        self._stopping = threading.Event()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        worker_id = options['worker_id'] or default_worker_id()
+        provider = load_model()
+        self.stdout.write(f"Embedding worker {worker_id} started.")
+
+        publish_shared_indexes(force=False)
+        self._unpublished = False
+        sleep = options['min_sleep']
+        while not self._stopping.is_set():
+            # Outside the request cycle nothing else drops connections that
+            # are broken or past CONN_MAX_AGE
+            close_old_connections()
+            try:
+                busy = self._step(worker_id, provider, options)
+            except Exception:
+                # A dropped connection or a failing index update: log it and
+                # retry after a back-off; unfinished jobs are reclaimed
+                # after CLAIM_TIMEOUT (and dead-lettered if they keep failing)
+                logger.exception("Embedding worker iteration failed")
+                busy = False
+            if busy:
+                sleep = options['min_sleep']
+                continue
+            if options['once']:
+                break
+            self._stopping.wait(sleep)
+            sleep = min(sleep * 2, options['max_sleep'])
+
+        get_token_cache().save_store()
+        self.stdout.write(f"Embedding worker {worker_id} stopped.")
+
+    def _step(self, worker_id, provider, options):
+        """Process one batch of jobs; returns False when the queue was empty."""
+        started = time.perf_counter()
+        jobs = claim_jobs(worker_id, options['batch_size'])
+        if jobs:
+            count = process_jobs(jobs, provider)
+            elapsed = time.perf_counter() - started
+            rate = count / elapsed if elapsed > 0 else 0.0
+            self.stdout.write(f"Embedded {count} rows in {elapsed:.2f}s ({rate:.0f} rows/s).")
+            self._unpublished = True
+            return True
+        # Idle: publish the shared indexes and precompute recommendations
+        # once per drained queue and persist the warm token cache. Without
+        # new embeddings the indexes are still republished now and then, for
+        # deletes and date changes made elsewhere.
+        if self._unpublished:
+            publish_shared_indexes()
+            users = precompute_recommendations()
+            self.stdout.write(f"Precomputed recommendations for {users} users.")
+            self._unpublished = False
+        else:
+            publish_shared_indexes(force=False)
+        get_token_cache().save_store()
+        return False
+
+    def _stop(self, signum, frame):
+        self._stopping.set()
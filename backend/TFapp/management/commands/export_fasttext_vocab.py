@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from TFapp.recommendation.fasttext import MODEL_PATH, PRUNED_VECTORS_PATH
+from TFapp.recommendation.provider import FastTextProvider, export_pruned_vectors
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the most frequent words of the fastText model and their vectors "
+        "as a memory-mapped .npy/.json pair. Set TFAPP_WORD_VECTORS=pruned to "
+        "embed with it instead of loading the full binary."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=200_000, help="Number of words to keep (default: 200000)")
+        parser.add_argument('--model', default=MODEL_PATH, help="fastText .bin to export from")
+        parser.add_argument('--output', default=PRUNED_VECTORS_PATH, help="Output path prefix (without extension)")
+
+    def handle(self, *args, **options):
+        model = FastTextProvider(options['model']).load()
+        count = export_pruned_vectors(model, options['output'], options['top'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {count} word vectors to {options['output']}.npy/.json"
+        ))
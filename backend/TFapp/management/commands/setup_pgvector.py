@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from TFapp.models import Event, Team, User
+from TFapp.recommendation import pgvector
+
+
+class Command(BaseCommand):
+    help = (
+        "Install pgvector, add the embedding_vec columns with HNSW indexes to the "
+        "user, event and team tables and copy the stored embeddings into them. "
+        "Run once before setting TFAPP_PGVECTOR=1 (PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-backfill', action='store_true',
+                            help="Only create the extension, columns and indexes")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("pgvector needs PostgreSQL (DJANGO_DB_ENGINE=postgresql).")
+        models = (User, Event, Team)
+        pgvector.install(models)
+        self.stdout.write("pgvector columns and indexes ready.")
+        if options['skip_backfill']:
+            return
+        for model_cls in models:
+            count = pgvector.backfill(model_cls)
+            self.stdout.write(f"{model_cls.__name__}: copied {count} embeddings.")
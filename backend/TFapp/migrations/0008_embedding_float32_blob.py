@@ -0,0 +1,86 @@
+# Moves the 300-d embeddings from JSON text to packed float32 blobs.
+
+import numpy as np
+import TFapp.fields
+import TFapp.models
+from django.db import migrations
+
+EMBEDDING_MODELS = ('user', 'event', 'team')
+BATCH_SIZE = 500
+
+
+def _to_float32(values):
+    vec = np.zeros(300, dtype='<f4')
+    arr = np.asarray(values if values is not None else [], dtype='<f4').ravel()[:300]
+    vec[: arr.size] = arr
+    return vec
+
+
+def json_to_blob(apps, schema_editor):
+    for model_name in EMBEDDING_MODELS:
+        Model = apps.get_model('TFapp', model_name)
+        batch = []
+        for obj in Model.objects.only('pk', 'embedding').iterator(chunk_size=BATCH_SIZE):
+            obj.embedding_blob = _to_float32(obj.embedding)
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                Model.objects.bulk_update(batch, ['embedding_blob'])
+                batch = []
+        if batch:
+            Model.objects.bulk_update(batch, ['embedding_blob'])
+
+
+def blob_to_json(apps, schema_editor):
+    for model_name in EMBEDDING_MODELS:
+        Model = apps.get_model('TFapp', model_name)
+        batch = []
+        for obj in Model.objects.only('pk', 'embedding_blob').iterator(chunk_size=BATCH_SIZE):
+            obj.embedding = _to_float32(obj.embedding_blob).tolist()
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                Model.objects.bulk_update(batch, ['embedding'])
+                batch = []
+        if batch:
+            Model.objects.bulk_update(batch, ['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TFapp', '0007_alter_event_embedding_needs_update_and_more'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='embedding_blob',
+                field=TFapp.fields.Float32VectorField(null=True),
+            )
+            for model_name in EMBEDDING_MODELS
+        ],
+        migrations.RunPython(json_to_blob, blob_to_json),
+        *[
+            migrations.RemoveField(
+                model_name=model_name,
+                name='embedding',
+            )
+            for model_name in EMBEDDING_MODELS
+        ],
+        *[
+            migrations.RenameField(
+                model_name=model_name,
+                old_name='embedding_blob',
+                new_name='embedding',
+            )
+            for model_name in EMBEDDING_MODELS
+        ],
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name='embedding',
+                field=TFapp.fields.Float32VectorField(blank=True, default=TFapp.models._zeros_300, help_text='300-d embedding vector (fastText)'),
+            )
+            for model_name in EMBEDDING_MODELS
+        ],
+    ]
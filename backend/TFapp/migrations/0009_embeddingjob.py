@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def enqueue_dirty_rows(apps, schema_editor):
+    """Queue jobs for rows that were already waiting for an embedding."""
+    EmbeddingJob = apps.get_model('TFapp', 'EmbeddingJob')
+    for model_name in ('user', 'event', 'team'):
+        Model = apps.get_model('TFapp', model_name)
+        ids = Model.objects.filter(embedding_needs_update=True).values_list('pk', flat=True)
+        EmbeddingJob.objects.bulk_create(
+            [EmbeddingJob(entity_type=model_name, entity_id=pk) for pk in ids],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TFapp', '0008_embedding_float32_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('user', 'User'), ('event', 'Event'), ('team', 'Team')], max_length=10)),
+                ('entity_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, max_length=100)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['claimed_at', 'id'], name='embedding_job_claim_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('claimed_at__isnull', True)), fields=('entity_type', 'entity_id'), name='unique_pending_embedding_job')],
+            },
+        ),
+        migrations.RunPython(enqueue_dirty_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+def backfill_source_key(apps, schema_editor):
+    """Scraped events stored their source id (a Kaggle/Devpost URL) in `location`."""
+    Event = apps.get_model('TFapp', 'Event')
+    seen = set()
+    batch = []
+    for ev in Event.objects.filter(location__startswith='http').order_by('created_at').only('pk', 'location'):
+        if ev.location in seen:
+            continue
+        seen.add(ev.location)
+        ev.source_key = ev.location
+        batch.append(ev)
+    Event.objects.bulk_update(batch, ['source_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TFapp', '0009_embeddingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='source_key',
+            field=models.CharField(blank=True, help_text='Source identifier of a scraped event', max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_source_key, migrations.RunPython.noop),
+    ]
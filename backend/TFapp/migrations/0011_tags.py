@@ -0,0 +1,81 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:17
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of TFapp.tags.parse_tags at the time of this migration, so later
+# changes to the app code can't change or break the backfill.
+_separators = re.compile(r'[,;\n]+')
+_spaces = re.compile(r'\s+')
+
+
+def parse_tags(text):
+    tags = []
+    for part in _separators.split(text or ''):
+        tag = _spaces.sub(' ', part.strip().lower()).strip(' .-_/')[:50]
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def backfill_tags(apps, schema_editor):
+    """Parse existing skills / interests / required_skills into tag rows."""
+    Tag = apps.get_model('TFapp', 'Tag')
+    User = apps.get_model('TFapp', 'User')
+    Team = apps.get_model('TFapp', 'Team')
+    sources = [
+        (User, 'skills', 'skill_tags'),
+        (User, 'interests', 'interest_tags'),
+        (Team, 'required_skills', 'required_tags'),
+    ]
+    parsed = []
+    names = set()
+    for model_cls, text_field, tag_field in sources:
+        for pk, text in model_cls.objects.exclude(**{text_field: ''}).values_list('pk', text_field):
+            tags = parse_tags(text)
+            names.update(tags)
+            parsed.append((model_cls, tag_field, pk, tags))
+    Tag.objects.bulk_create([Tag(name=n) for n in names], ignore_conflicts=True, batch_size=500)
+    ids = dict(Tag.objects.values_list('name', 'id'))
+    links = {}
+    for model_cls, tag_field, pk, tags in parsed:
+        through = getattr(model_cls, tag_field).through
+        owner = model_cls._meta.model_name
+        rows = links.setdefault(through, [])
+        rows.extend(through(**{f'{owner}_id': pk, 'tag_id': ids[t]}) for t in tags)
+    for through, rows in links.items():
+        through.objects.bulk_create(rows, ignore_conflicts=True, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TFapp', '0010_event_source_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='required_tags',
+            field=models.ManyToManyField(blank=True, related_name='teams', to='TFapp.tag'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='interest_tags',
+            field=models.ManyToManyField(blank=True, related_name='interested_users', to='TFapp.tag'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='skill_tags',
+            field=models.ManyToManyField(blank=True, related_name='skilled_users', to='TFapp.tag'),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TFapp', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='embeddingjob',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, help_text='Set once the job ran out of attempts', null=True),
+        ),
+        migrations.AddField(
+            model_name='embeddingjob',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TFapp', '0013_embeddingjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='source_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
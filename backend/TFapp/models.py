@@ -1,13 +1,16 @@
 import uuid
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.utils import timezone
 import os
 import numpy as np
 
+from .fields import Float32VectorField
+
 # Helper to create a 300-d zero vector for default field values.
 def _zeros_300():
-    # Return a list (JSON serializable) of 300 floats (zeros)
+    # Return a list of 300 floats (zeros); also referenced by old migrations
     return [0.0] * 300
 
 def get_profile_pic_upload_path(instance, filename):
@@ -25,10 +28,13 @@ class User(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
     skills = models.CharField(max_length=255, blank=True, help_text="Comma-separated list of skills")
     interests = models.CharField(max_length=255, blank=True, help_text="Comma-separated list of interests")
+    # Normalized copies of `skills` / `interests`, kept in sync on save (see signals.py)
+    skill_tags = models.ManyToManyField('Tag', blank=True, related_name='skilled_users')
+    interest_tags = models.ManyToManyField('Tag', blank=True, related_name='interested_users')
     location = models.CharField(max_length=100, blank=True)
     profile_picture = models.ImageField(upload_to=get_profile_pic_upload_path, null=True, blank=True)
-    # 300-d fastText embedding stored as JSON list (compatible with SQLite/Postgres)
-    embedding = models.JSONField(default=_zeros_300, blank=True, help_text="300-d embedding vector (fastText)")
+    # 300-d fastText embedding stored as a packed float32 blob (compatible with SQLite/Postgres)
+    embedding = Float32VectorField(default=_zeros_300, blank=True, help_text="300-d embedding vector (fastText)")
     # Embedding tracking: external process will mark this True when update is required
     embedding_needs_update = models.BooleanField(default=True, help_text="If true, signal that embedding should be recalculated by async process")
 
@@ -51,31 +57,37 @@ class User(AbstractUser):
         related_query_name="user",
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Partial: only the few rows waiting for a new embedding
+            models.Index(fields=['id'], condition=models.Q(embedding_needs_update=True), name='user_embedding_dirty_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
     # Helpers to interact with the embedding as a numpy array
     def set_embedding(self, vec):
-        """Accepts a list or numpy array and stores a 300-d list of floats.
+        """Accepts a list or numpy array and stores a 300-d float32 array.
 
         If the provided vector is shorter it will be padded with zeros.
         If longer, it will be truncated to 300.
         """
-        arr = np.asarray(vec, dtype=float)
+        arr = np.asarray(vec, dtype=np.float32)
         if arr.size == 0:
-            self.embedding = _zeros_300()
+            self.embedding = np.zeros(300, dtype=np.float32)
             return
         # Resize to 300
         if arr.size < 300:
-            new = np.zeros(300, dtype=float)
+            new = np.zeros(300, dtype=np.float32)
             new[: arr.size] = arr
         else:
-            new = arr.flat[:300].astype(float)
-        self.embedding = new.tolist()
+            new = arr.flat[:300]
+        self.embedding = new
 
     def get_embedding_array(self):
-        """Returns the embedding as a numpy array of shape (300,)"""
-        return np.asarray(self.embedding, dtype=float)
+        """Returns the embedding as a float32 numpy array of shape (300,)"""
+        return np.asarray(self.embedding, dtype=np.float32)
 
     # --- Embedding update helpers (simple dirty-flag only) ---
     def needs_embedding_update(self):
@@ -90,7 +102,10 @@ class User(AbstractUser):
         self.embedding_needs_update = False
 
     def mark_embedding_dirty(self):
-        """Mark the model as needing embedding recalculation by the external process."""
+        """Mark the model as needing embedding recalculation by the external process.
+
+        Once saved, an EmbeddingJob is queued for it (see signals.py).
+        """
         self.embedding_needs_update = True
 
 class Event(models.Model):
@@ -104,31 +119,45 @@ class Event(models.Model):
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
     location = models.CharField(max_length=200)
+    # Identifier of a scraped event at its source (Kaggle ref / Devpost URL);
+    # unique (and therefore indexed) so ingestion can diff a batch in one query.
+    source_key = models.CharField(max_length=255, unique=True, null=True, blank=True, help_text="Source identifier of a scraped event")
+    # sha256 of the scraped item last written to this row; cleared when the row
+    # is saved outside ingestion, so the next scrape diffs it again.
+    source_digest = models.CharField(max_length=64, blank=True, editable=False)
     # organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='organized_events')
     created_at = models.DateTimeField(default=timezone.now)
-    # 300-d fastText embedding stored as JSON list
-    embedding = models.JSONField(default=_zeros_300, blank=True, help_text="300-d embedding vector (fastText)")
+    # 300-d fastText embedding stored as a packed float32 blob
+    embedding = Float32VectorField(default=_zeros_300, blank=True, help_text="300-d embedding vector (fastText)")
     # Embedding tracking: external process will mark this True when update is required
     embedding_needs_update = models.BooleanField(default=True, help_text="If true, signal that embedding should be recalculated by async process")
 
+    class Meta:
+        indexes = [
+            # Upcoming / past listings and their keyset pagination
+            models.Index(fields=['end_date', 'id'], name='event_end_date_idx'),
+            models.Index(fields=['start_date', 'id'], name='event_start_date_idx'),
+            models.Index(fields=['id'], condition=models.Q(embedding_needs_update=True), name='event_embedding_dirty_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
     def set_embedding(self, vec):
-        """Store event embedding (list or numpy array) as 300-d list."""
-        arr = np.asarray(vec, dtype=float)
+        """Store event embedding (list or numpy array) as 300-d float32 array."""
+        arr = np.asarray(vec, dtype=np.float32)
         if arr.size == 0:
-            self.embedding = _zeros_300()
+            self.embedding = np.zeros(300, dtype=np.float32)
             return
         if arr.size < 300:
-            new = np.zeros(300, dtype=float)
+            new = np.zeros(300, dtype=np.float32)
             new[: arr.size] = arr
         else:
-            new = arr.flat[:300].astype(float)
-        self.embedding = new.tolist()
+            new = arr.flat[:300]
+        self.embedding = new
 
     def get_embedding_array(self):
-        return np.asarray(self.embedding, dtype=float)
+        return np.asarray(self.embedding, dtype=np.float32)
 
     # --- Embedding update helpers (simple dirty-flag only) ---
     def needs_embedding_update(self):
@@ -141,6 +170,33 @@ class Event(models.Model):
     def mark_embedding_dirty(self):
         self.embedding_needs_update = True
 
+class TeamQuerySet(models.QuerySet):
+    def with_member_count(self):
+        """
+        Annotate each team with `accepted_count` (number of ACCEPTED members)
+        and join its event and owner, so listing teams doesn't run per-row
+        queries for `current_size`, `is_full` or `event.name`.
+        """
+        # A correlated COUNT per team (served by membership_team_status_idx)
+        # rather than JOIN + GROUP BY, which would read and sort every team
+        # before LIMIT / keyset filters apply. Unlike Count() over the join,
+        # the subquery is not multiplied by other multi-valued joins on the
+        # same queryset (e.g. filtering on required_tags), so it also changes
+        # what the count means there: always the team's accepted members.
+        accepted = (
+            Membership.objects.filter(team=models.OuterRef('pk'), status=Membership.MemberStatus.ACCEPTED)
+            .order_by().values('team').annotate(count=models.Count('pk')).values('count')
+        )
+        return self.select_related('event', 'owner').annotate(
+            accepted_count=Coalesce(models.Subquery(accepted), 0),
+        )
+
+    def joinable(self):
+        """Open teams that still have room, decided in SQL on the annotated count."""
+        return self.with_member_count().filter(
+            is_open=True, accepted_count__lt=models.F('max_size'),
+        )
+
 class Team(models.Model):
     """
     Represents a team formed for a specific event.
@@ -154,31 +210,41 @@ class Team(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_teams')
     max_size = models.PositiveIntegerField(default=5)
     required_skills = models.CharField(max_length=255, blank=True, help_text="Comma-separated list of required skills")
+    # Normalized copy of `required_skills`, kept in sync on save (see signals.py)
+    required_tags = models.ManyToManyField('Tag', blank=True, related_name='teams')
     is_open = models.BooleanField(default=True, help_text="Is the team currently looking for members?")
     created_at = models.DateTimeField(default=timezone.now)
-    # 300-d fastText embedding stored as JSON list
-    embedding = models.JSONField(default=_zeros_300, blank=True, help_text="300-d embedding vector (fastText)")
+    # 300-d fastText embedding stored as a packed float32 blob
+    embedding = Float32VectorField(default=_zeros_300, blank=True, help_text="300-d embedding vector (fastText)")
     # Embedding tracking: external process will mark this True when update is required
     embedding_needs_update = models.BooleanField(default=True, help_text="If true, signal that embedding should be recalculated by async process")
 
+    objects = TeamQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='team_created_idx'),
+            models.Index(fields=['id'], condition=models.Q(embedding_needs_update=True), name='team_embedding_dirty_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} for {self.event.name}"
     
     def set_embedding(self, vec):
-        """Store event embedding (list or numpy array) as 300-d list."""
-        arr = np.asarray(vec, dtype=float)
+        """Store event embedding (list or numpy array) as 300-d float32 array."""
+        arr = np.asarray(vec, dtype=np.float32)
         if arr.size == 0:
-            self.embedding = _zeros_300()
+            self.embedding = np.zeros(300, dtype=np.float32)
             return
         if arr.size < 300:
-            new = np.zeros(300, dtype=float)
+            new = np.zeros(300, dtype=np.float32)
             new[: arr.size] = arr
         else:
-            new = arr.flat[:300].astype(float)
-        self.embedding = new.tolist()
+            new = arr.flat[:300]
+        self.embedding = new
 
     def get_embedding_array(self):
-        return np.asarray(self.embedding, dtype=float)
+        return np.asarray(self.embedding, dtype=np.float32)
 
     # --- Embedding update helpers (simple dirty-flag only) ---
     def needs_embedding_update(self):
@@ -195,6 +261,10 @@ class Team(models.Model):
     def current_size(self):
         """Returns the current number of members in the team."""
         # We only count accepted members towards the team size.
+        # Prefer the annotation added by Team.objects.with_member_count().
+        accepted_count = getattr(self, 'accepted_count', None)
+        if accepted_count is not None:
+            return accepted_count
         return self.members.filter(status=Membership.MemberStatus.ACCEPTED).count()
 
     @property
@@ -228,7 +298,66 @@ class Membership(models.Model):
 
     class Meta:
         unique_together = ('user', 'team') # A user can only join a team once
+        indexes = [
+            # Member counts / listings per status of a team, and of a user
+            models.Index(fields=['team', 'status'], name='membership_team_status_idx'),
+            models.Index(fields=['user', 'status'], name='membership_user_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} in {self.team.name} ({self.get_status_display()})"
 
+
+class EmbeddingJob(models.Model):
+    """
+    Durable queue entry asking the embedding worker to recompute the
+    embedding of one User, Event or Team.
+
+    Jobs are inserted whenever an entity is saved with its dirty flag set
+    (see signals.py). Workers claim a batch by stamping `claimed_by` /
+    `claimed_at`, and delete the jobs once the new vectors are written.
+    Every claim counts as an attempt; a job that keeps failing is
+    dead-lettered (`failed_at`) with its last error instead of being
+    claimed forever.
+    """
+    class EntityType(models.TextChoices):
+        USER = 'user', 'User'
+        EVENT = 'event', 'Event'
+        TEAM = 'team', 'Team'
+
+    entity_type = models.CharField(max_length=10, choices=EntityType.choices)
+    entity_id = models.UUIDField()
+    created_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=100, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True, help_text="Set once the job ran out of attempts")
+
+    class Meta:
+        constraints = [
+            # At most one *pending* job per entity; a job that is already
+            # being processed doesn't block a new one for later changes.
+            models.UniqueConstraint(
+                fields=['entity_type', 'entity_id'],
+                condition=models.Q(claimed_at__isnull=True),
+                name='unique_pending_embedding_job',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['claimed_at', 'id'], name='embedding_job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.entity_type}:{self.entity_id}"
+
+class Tag(models.Model):
+    """
+    A normalized skill or interest ("python", "machine learning").
+    The many-to-many tables from User and Team act as the inverted index
+    tag -> users / teams.
+    """
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,132 @@
+"""Default pagination for list endpoints.
+
+Lists use keyset (cursor) pagination: each page continues from the
+ordering values of the last row seen (``WHERE (end_date, id) > (...)``), so
+a deep page costs the same indexed range scan as the first one. The
+ordering comes from the view's ``cursor_ordering``. It must start with an
+indexed column and end with a unique one.
+
+DRF's ``CursorPagination`` positions on the first ordering column only and
+skips rows sharing that value with an offset capped at 1000, which loops
+forever once more than 1000 rows share e.g. an end_date (bulk imports do
+that). The cursor here stores the values of every ordering column instead,
+so positions are unique and no offset is needed.
+
+Clients that need random access can still pass ``?page=`` (page numbers)
+or ``?offset=`` (limit/offset); those requests are paginated the old way
+on the same ordering. ``?limit=`` sets the page size in every mode.
+"""
+import json
+
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class _PageNumberPagination(pagination.PageNumberPagination):
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class _LimitOffsetPagination(pagination.LimitOffsetPagination):
+    default_limit = PAGE_SIZE
+    max_limit = MAX_PAGE_SIZE
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """Cursor pagination on ``view.cursor_ordering``, with offset fallbacks."""
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+    def _offset_paginator(self, request):
+        if 'page' in request.query_params:
+            return _PageNumberPagination()
+        if 'offset' in request.query_params:
+            return _LimitOffsetPagination()
+        return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.offset_paginator = self._offset_paginator(request)
+        if self.offset_paginator is None:
+            return self._keyset_paginate(queryset, request, view)
+        queryset = queryset.order_by(*self.get_ordering(request, queryset, view))
+        return self.offset_paginator.paginate_queryset(queryset, request, view)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(str(value))
+        return json.dumps(values)
+
+    def _after(self, queryset, position, reverse):
+        """Rows strictly after ``position`` in the (possibly reversed) ordering."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return queryset.filter(condition)
+
+    def _keyset_paginate(self, queryset, request, view):
+        # CursorPagination.paginate_queryset with a multi-column position
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        names, deferred = queryset.query.deferred_loading
+        if names and not deferred:
+            # Cursor positions are read from the rows; load the ordering
+            # columns alongside the ones picked with only()
+            queryset = queryset.only(*names, *(order.lstrip('-') for order in self.ordering))
+        if reverse:
+            queryset = queryset.order_by(*pagination._reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = self._after(queryset, current_position, reverse)
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        has_earlier = current_position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = has_earlier, following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next, self.has_previous = following_position is not None, has_earlier
+            self.next_position, self.previous_position = following_position, current_position
+        self.display_page_controls = self.has_previous or self.has_next
+        return self.page
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
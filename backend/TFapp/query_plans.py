@@ -0,0 +1,67 @@
+"""EXPLAIN checks for the queries the API and the workers run constantly.
+
+``explain_hot_queries`` returns the plan of every query in ``hot_queries``
+together with the tables it reads in full; a non-empty list means an index
+is missing or no longer used. Run by the test suite and by
+``manage.py check_query_plans``. Supports SQLite and PostgreSQL.
+"""
+import re
+import uuid
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import EmbeddingJob, Event, Membership, Team, User
+
+# Plan lines that mean "read the whole table"
+FULL_SCAN_PATTERNS = {
+    # SCAN without an index; SEARCH / SCAN ... USING INDEX are fine
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)(\S+)(?! USING (?:COVERING )?INDEX)(?:\s|$)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\S+)'),
+}
+# An index scan that is then sorted also reads every row before LIMIT applies
+SQLITE_INDEX_SCAN = re.compile(r'\bSCAN (\S+) USING')
+SQLITE_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+def full_scans(plan, vendor):
+    """Tables ``plan`` reads in full."""
+    scanned = [m.group(1) for m in FULL_SCAN_PATTERNS[vendor].finditer(plan)]
+    if vendor == 'sqlite' and SQLITE_SORT in plan:
+        scanned += SQLITE_INDEX_SCAN.findall(plan)
+    return scanned
+
+
+def hot_queries():
+    """``(label, queryset)`` for the queries the API and the workers run constantly."""
+    now = timezone.now()
+    some_id = uuid.uuid4()
+    return [
+        ('upcoming events', Event.objects.filter(end_date__gte=now).order_by('end_date', 'id')[:21]),
+        ('past events', Event.objects.filter(end_date__lt=now).order_by('-end_date', '-id')[:21]),
+        ('all events', Event.objects.order_by('-start_date', '-id')[:21]),
+        ('event by source key', Event.objects.filter(source_key__in=['kaggle:x', 'devpost:y'])),
+        ('dirty events', Event.objects.filter(embedding_needs_update=True).only('id')),
+        ('dirty users', User.objects.filter(embedding_needs_update=True).only('id')),
+        ('dirty teams', Team.objects.filter(embedding_needs_update=True).only('id')),
+        ('teams', Team.objects.with_member_count().order_by('created_at', 'id')[:21]),
+        ('joinable teams of an event', Team.objects.joinable().filter(event_id=some_id)),
+        ('accepted members of a team', Membership.objects.filter(team_id=some_id, status=Membership.MemberStatus.ACCEPTED)),
+        ('claimed embedding jobs', EmbeddingJob.objects.filter(claimed_at=now, claimed_by='worker:token')),
+        ('memberships of a user', Membership.objects.filter(user_id=some_id, status=Membership.MemberStatus.ACCEPTED)),
+    ]
+
+
+def explain_hot_queries():
+    """``(label, plan, fully scanned tables)`` for every hot query."""
+    results = []
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Small tables make sequential scans the cheapest plan; ask
+            # whether an index *could* be used instead
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for label, queryset in hot_queries():
+            plan = queryset.explain()
+            results.append((label, plan, full_scans(plan, connection.vendor)))
+    return results
@@ -1,9 +1,16 @@
 # run with: python3 backend/manage.py shell < backend/TFapp/scripts/populate_embeddings.py
 
+import json
 import os
+import time
+from itertools import islice
+
 import django
 import numpy as np
-import fasttext
+from django.db import transaction
+
+from .provider import FastTextProvider, PrunedVectorProvider, WordVectorsUnavailable
+from .token_cache import TokenVectorCache, write_atomically
 
 # # Django setup (when running via manage.py shell this may be unnecessary,
 # # but including it makes the script runnable standalone if you adjust paths)
@@ -12,61 +19,268 @@ import fasttext
 
 
 MODEL_PATH = 'TFapp/recommendation/cc.en.300.bin'  # set to your fastText model binary
-FASTTEXT_MODEL = None
+# Vocabulary-only, memory-mapped export of MODEL_PATH (see the export_fasttext_vocab
+# command). Used instead of the full model with TFAPP_WORD_VECTORS='pruned'.
+PRUNED_VECTORS_PATH = 'TFapp/recommendation/cc.en.300.vocab'
+_provider = None
+# Tag of the provider the stored embeddings were computed with
+EMBEDDING_SPACE_PATH = 'TFapp/recommendation/embedding_space.json'
+# Memory-mapped store of frequent token vectors (.npy + .json); None disables it
+TOKEN_STORE_PATH = 'TFapp/recommendation/token_vectors'
+_token_cache = None
+_embedding_space_checked = False
+
+# Dirty rows fetched, embedded and written back per transaction
+EMBEDDING_CHUNK_SIZE = 500
+
+def get_token_cache():
+    """Return the process-wide token vector cache, opening the on-disk store on first use."""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenVectorCache(store_path=TOKEN_STORE_PATH, store_tag=get_provider().tag)
+    return _token_cache
+
+def token_cache_stats():
+    """Hit/miss counters of the token vector cache."""
+    return get_token_cache().stats()
+
+def get_avg_fasttext_vectors(texts, model):
+    """Average fastText word vectors for many texts at once.
+
+    Each distinct token in the batch is looked up once (through the token
+    vector cache, so usually without touching the model); the per-text means
+    are then computed with a single gather + ``np.add.reduceat``. Returns a
+    float32 array of shape (len(texts), 300); empty texts map to zeros.
+    """
+    vocab = {}
+    token_ids = []
+    lengths = np.zeros(len(texts), dtype=np.int64)
+    for row, text in enumerate(texts):
+        tokens = text.split()
+        lengths[row] = len(tokens)
+        token_ids.extend(vocab.setdefault(t, len(vocab)) for t in tokens)
+    out = np.zeros((len(texts), 300), dtype=np.float32)
+    if not vocab:
+        return out
+    table = get_token_cache().get_vectors(vocab, model)
+    gathered = table[np.asarray(token_ids)]
+    nonempty = lengths > 0
+    starts = (np.cumsum(lengths) - lengths)[nonempty]
+    sums = np.add.reduceat(gathered, starts, axis=0)
+    out[nonempty, : table.shape[1]] = sums / lengths[nonempty, None]
+    return out
 
 def get_avg_fasttext_vector(text, model):
-    tokens = text.split()
-    if not tokens:
-        return np.zeros(300, dtype=float)
-    vecs = [model.get_word_vector(t) for t in tokens]
-    return np.mean(vecs, axis=0)
-
-def populate_event_embeddings(model):
-    from TFapp.models import Event
+    return get_avg_fasttext_vectors([text], model)[0]
+
+def query_vector(text):
+    """Embedding of a search query, or None if no word vectors are available.
+
+    Web processes never load the full fastText binary for this; the query is
+    embedded only with the pruned vocabulary export or an already loaded model.
+    """
+    provider = get_provider()
+    if not (provider.ready or isinstance(provider, PrunedVectorProvider)):
+        return None
+    try:
+        return get_avg_fasttext_vector(text, provider)
+    except OSError:
+        return None
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def embed_instances(instances, text_fields, model):
+    """Compute and assign embeddings for a chunk of model instances (not saved)."""
+    texts = [' '.join(getattr(obj, f) or '' for f in text_fields) for obj in instances]
+    vectors = get_avg_fasttext_vectors(texts, model)
+    for obj, vec in zip(instances, vectors):
+        obj.set_embedding(vec)
+        obj.mark_embedding_updated()
+    return vectors
+
+# Per entity type: the text fields averaged into its embedding, and extra
+# fields loaded alongside so refreshed rows can patch the in-memory indexes.
+EMBEDDING_SOURCES = {
+    'event': (('name', 'description'), ('end_date',)),
+    'user': (('bio', 'skills', 'interests'), ('is_active',)),
+    'team': (('name', 'description', 'required_skills'), ('event',)),
+}
+
+def embedding_queryset(entity_type):
+    """Queryset of ``entity_type`` rows loading only what embedding needs."""
+    from django.apps import apps
+    text_fields, extra_fields = EMBEDDING_SOURCES[entity_type]
+    model_cls = apps.get_model('TFapp', entity_type)
+    return model_cls.objects.only('pk', *text_fields, *extra_fields)
+
+def _index_updaters():
+    from . import pgvector
+    from .index import update_event_index, update_team_index, update_user_index
+
+    # Search reads its vectors from the event and team indexes
+    updaters = {
+        'event': [update_event_index],
+        'user': [update_user_index],
+        'team': [update_team_index],
+    }
+    if pgvector.enabled():
+        for entity_updaters in updaters.values():
+            entity_updaters.append(pgvector.sync)
+    return updaters
+
+def save_embeddings(entity_type, instances, model):
+    """Embed a chunk of instances and write it back with one bulk_update.
+
+    The write happens in its own transaction; bulk_update sends no
+    post_save, so in-memory indexes are patched here instead.
+    """
+    if not instances:
+        return
+    text_fields, _ = EMBEDDING_SOURCES[entity_type]
+    embed_instances(instances, text_fields, model)
+    model_cls = type(instances[0])
+    with transaction.atomic():
+        model_cls.objects.bulk_update(instances, ['embedding', 'embedding_needs_update'])
+    for updater in _index_updaters().get(entity_type, ()):
+        updater(instances)
+
+def _populate_embeddings(entity_type, model, chunk_size):
+    """Refresh every dirty row of ``entity_type`` in chunks.
+
+    The dirty primary keys are read up front; each chunk of rows is then
+    fetched, embedded in one batch and written back with a single
+    ``bulk_update`` inside its own transaction. The rows are not streamed
+    with ``.iterator()``: the loop updates the table it would be reading
+    from, which SQLite does not isolate within one connection.
+    Returns ``(rows, seconds)``.
+    """
+    started = time.perf_counter()
+    model_cls = embedding_queryset(entity_type).model
+    pks = list(model_cls.objects.filter(embedding_needs_update=True).values_list('pk', flat=True))
+    count = 0
+    for chunk_pks in _chunks(pks, chunk_size):
+        chunk = list(embedding_queryset(entity_type).filter(pk__in=chunk_pks))
+        save_embeddings(entity_type, chunk, model)
+        count += len(chunk)
+    return count, time.perf_counter() - started
+
+def _report(label, count, elapsed):
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f'{label} embeddings updated: {count} rows in {elapsed:.2f}s ({rate:.0f} rows/s).')
+
+def populate_event_embeddings(model, chunk_size=EMBEDDING_CHUNK_SIZE):
     # Only update events explicitly marked dirty to avoid unnecessary work
-    for ev in Event.objects.filter(embedding_needs_update=True):
-        text = (ev.name or '') + ' ' + (ev.description or '')
-        vec = get_avg_fasttext_vector(text, model)
-        ev.set_embedding(vec)
-        ev.mark_embedding_updated()
-        ev.save(update_fields=['embedding', 'embedding_needs_update'])
-    print('Event embeddings updated.')
-
-def populate_user_embeddings(model):
-    from TFapp.models import User
-    for u in User.objects.filter(embedding_needs_update=True):
-        text = (u.bio or '') + ' ' + (u.skills or '') + ' ' + (u.interests or '')
-        vec = get_avg_fasttext_vector(text, model)
-        u.set_embedding(vec)
-        u.mark_embedding_updated()
-        u.save(update_fields=['embedding', 'embedding_needs_update'])
-    print('User embeddings updated.')
-
-def populate_team_embeddings(model):
-    from TFapp.models import Team
-    for t in Team.objects.filter(embedding_needs_update=True):
-        text = (t.name or '') + ' ' + (t.description or '') + ' ' + (t.required_skills or '')
-        vec = get_avg_fasttext_vector(text, model)
-        t.set_embedding(vec)
-        t.mark_embedding_updated()
-        t.save(update_fields=['embedding', 'embedding_needs_update'])
-    print('Team embeddings updated.')
+    count, elapsed = _populate_embeddings('event', model, chunk_size)
+    _report('Event', count, elapsed)
+    return count
+
+def populate_user_embeddings(model, chunk_size=EMBEDDING_CHUNK_SIZE):
+    count, elapsed = _populate_embeddings('user', model, chunk_size)
+    _report('User', count, elapsed)
+    return count
+
+def populate_team_embeddings(model, chunk_size=EMBEDDING_CHUNK_SIZE):
+    count, elapsed = _populate_embeddings('team', model, chunk_size)
+    _report('Team', count, elapsed)
+    return count
+
+def get_provider():
+    """Return the process-wide word-vector provider (not loaded yet).
+
+    ``settings.TFAPP_WORD_VECTORS`` selects it: ``'fasttext'`` (the full
+    model) or ``'pruned'`` (the vocabulary export).
+    """
+    global _provider
+    if _provider is None:
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+
+        kind = getattr(settings, 'TFAPP_WORD_VECTORS', 'fasttext')
+        if kind == 'pruned':
+            _provider = PrunedVectorProvider(PRUNED_VECTORS_PATH)
+        elif kind == 'fasttext':
+            _provider = FastTextProvider(MODEL_PATH)
+        else:
+            raise ImproperlyConfigured(f"TFAPP_WORD_VECTORS must be 'fasttext' or 'pruned', not {kind!r}.")
+    return _provider
+
+def check_embedding_space(provider):
+    """Queue every row for re-embedding if the stored embeddings came from another provider.
+
+    Vectors from the full model and from the pruned export are not
+    comparable (out-of-vocabulary tokens, case folding), so they must not be
+    mixed in one index. Without a record the stored embeddings are assumed
+    to come from the full model. Returns True if rows were marked dirty.
+    """
+    try:
+        with open(EMBEDDING_SPACE_PATH, encoding='utf-8') as f:
+            stored = json.load(f)['tag']
+    except (OSError, ValueError, KeyError):
+        stored = FastTextProvider(MODEL_PATH).tag
+    if stored == provider.tag:
+        return False
+    print(f'Word vectors changed from {stored} to {provider.tag}; re-embedding every row.')
+    mark_all_embeddings_dirty()
+    record = json.dumps({'tag': provider.tag}).encode('utf-8')
+    write_atomically(EMBEDDING_SPACE_PATH, lambda f: f.write(record))
+    return True
 
 def load_model():
-    global FASTTEXT_MODEL
-    FASTTEXT_MODEL = fasttext.load_model(MODEL_PATH)
-    print('FastText model loaded.')
-    return FASTTEXT_MODEL
+    """Load the word vectors synchronously and return the provider."""
+    provider = get_provider()
+    provider.load()
+    check_embedding_space(provider)
+    return provider
 
 def calculate_and_update_embeddings():
-    print(FASTTEXT_MODEL)
-    populate_event_embeddings(FASTTEXT_MODEL)
-    populate_user_embeddings(FASTTEXT_MODEL)
-    populate_team_embeddings(FASTTEXT_MODEL)
+    """Scheduler job: drain the embedding job queue in this process.
+
+    Not scheduled when TFAPP_EXTERNAL_EMBEDDING_WORKER is set; the
+    ``embedding_worker`` command consumes the queue instead. When the queue
+    is empty this costs a single query. Raises ``WordVectorsUnavailable``
+    if loading the word vectors in the background failed.
+    """
+    from .jobs import process_pending_jobs
+    from .recommendations import precompute_recommendations
+    from .shared import publish_shared_indexes
+
+    global _embedding_space_checked
+    provider = get_provider()
+    if provider.error is not None:
+        raise WordVectorsUnavailable(f'Could not load word vectors from {provider.path}') from provider.error
+    if not provider.ready:
+        # Loading happens in the background (see scheduler.start_scheduler)
+        print('Word vectors not loaded yet; skipping embedding update.')
+        return
+    if not _embedding_space_checked:
+        check_embedding_space(provider)
+        _embedding_space_checked = True
+    count, elapsed = process_pending_jobs(provider)
+    if not count:
+        # Make sure web workers have a recent generation to attach to
+        publish_shared_indexes(force=False)
+        return
+    _report('Queued', count, elapsed)
+    publish_shared_indexes()
+    started = time.perf_counter()
+    users = precompute_recommendations()
+    _report('Recommendation', users, time.perf_counter() - started)
+    cache = get_token_cache()
+    cache.save_store()
+    stats = cache.stats()
+    print(f"Token cache: {stats['hit_rate']:.1%} hit rate "
+          f"({stats['hits']} hits, {stats['store_hits']} store hits, {stats['misses']} misses).")
 
 def mark_all_embeddings_dirty():
     from TFapp.models import Event, User, Team
-    Event.objects.all().update(embedding_needs_update=True)
-    User.objects.all().update(embedding_needs_update=True)
-    Team.objects.all().update(embedding_needs_update=True)
-    print('All embeddings marked dirty.')
\ No newline at end of file
+    from .jobs import enqueue_embedding_jobs
+    for entity_type, model_cls in (('event', Event), ('user', User), ('team', Team)):
+        model_cls.objects.all().update(embedding_needs_update=True)
+        enqueue_embedding_jobs(entity_type, model_cls.objects.values_list('pk', flat=True).iterator())
+    print('All embeddings marked dirty.')
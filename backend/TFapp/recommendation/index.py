@@ -0,0 +1,575 @@
+"""In-memory embedding indexes used by the recommendation endpoints.
+
+An index keeps every embedding of one model as a row of a pre-normalized
+float32 matrix, next to an array with the matching primary keys. Cosine
+similarity against all rows is then a single matrix-vector product, and the
+top-k rows are picked with ``np.argpartition`` instead of sorting everything.
+
+Indexes are built lazily from the database on first use and kept up to date
+by the ``post_save`` / ``post_delete`` signals in ``TFapp/signals.py`` and by
+the embedding job. Each web process rebuilds its copy in the background after
+``INDEX_MAX_AGE`` seconds so it eventually picks up vectors written by other
+processes.
+
+The user index is an ``IVFIndex`` (see ``ivf.py``): exact while the table is
+small, approximate once it grows past ``IVF_MIN_ROWS``. Setting
+``TFAPP_EVENT_INDEX_CODEC = 'pq'`` stores the event index as
+product-quantization codes (see ``pq.py``) to cut its memory. Setting
+``TFAPP_SHARED_INDEX_DIR`` instead shares one memory-mapped copy of the event
+and user indexes between all worker processes (see ``shared.py``).
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 300
+# Seconds after which a process-local index is rebuilt from the database
+INDEX_MAX_AGE = 300
+# Rows fetched per round-trip while building an index
+BUILD_CHUNK_SIZE = 2000
+
+
+def normalize_rows(vectors):
+    """Return a float32 copy of ``vectors`` with every row scaled to unit length.
+
+    Rows with zero norm stay zero so they score 0 against any query.
+    """
+    mat = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    np.divide(mat, norms, out=mat, where=norms > 0)
+    return mat
+
+
+def pad_columns(vectors, dim):
+    """Cut or zero-pad the rows of a 2-d array to exactly ``dim`` columns."""
+    vectors = np.asarray(vectors)[:, :dim]
+    if vectors.shape[1] < dim:
+        vectors = np.pad(vectors, ((0, 0), (0, dim - vectors.shape[1])))
+    return vectors
+
+
+def unit_vector(vector, dim):
+    """``vector`` flattened, cut or padded to ``dim`` and scaled to unit length."""
+    return normalize_rows(pad_columns(np.ravel(vector)[None, :], dim))[0]
+
+
+class EmbeddingIndex:
+    """Pre-normalized float32 embedding matrix plus id array.
+
+    ``meta`` is an optional float64 value stored per row (e.g. the event end
+    date as a unix timestamp) that callers can turn into a boolean mask for
+    ``search``.
+    """
+
+    # Layout of one stored row; subclasses storing codes override these
+    row_dtype = np.float32
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.generation = 0
+        self.built_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._size = 0
+        self._ids = np.empty(0, dtype=object)
+        self._matrix = np.empty((0, self.row_width), dtype=self.row_dtype)
+        self._meta = np.empty(0, dtype=np.float64)
+        self._positions = {}
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, pk):
+        return pk in self._positions
+
+    @classmethod
+    def from_arrays(cls, ids, matrix, meta):
+        """Wrap existing (already normalized) arrays without copying them.
+
+        Used for memory-mapped, read-only matrices, which must not be
+        modified afterwards.
+        """
+        index = cls(dim=matrix.shape[1])
+        index._ids, index._matrix, index._meta = ids, matrix, meta
+        index._size = len(ids)
+        index._positions = {pk: pos for pos, pk in enumerate(ids)}
+        return index
+
+    @property
+    def row_width(self):
+        return self.dim
+
+    @property
+    def nbytes(self):
+        """Bytes used by the stored rows (excluding ids)."""
+        return self.matrix.nbytes
+
+    @property
+    def ids(self):
+        return self._ids[: self._size]
+
+    @property
+    def matrix(self):
+        return self._matrix[: self._size]
+
+    @property
+    def meta(self):
+        return self._meta[: self._size]
+
+    def _reserve(self, size):
+        capacity = len(self._ids)
+        if size <= capacity:
+            return
+        new_capacity = max(size, 2 * capacity, 64)
+        ids = np.empty(new_capacity, dtype=object)
+        ids[: self._size] = self._ids[: self._size]
+        matrix = np.zeros((new_capacity, self.row_width), dtype=self.row_dtype)
+        matrix[: self._size] = self._matrix[: self._size]
+        meta = np.full(new_capacity, np.nan, dtype=np.float64)
+        meta[: self._size] = self._meta[: self._size]
+        self._ids, self._matrix, self._meta = ids, matrix, meta
+
+    def upsert(self, ids, vectors, meta=None):
+        """Insert or overwrite the rows for ``ids``."""
+        ids = list(ids)
+        if not ids:
+            return
+        rows = self._encode(np.reshape(vectors, (len(ids), -1)))
+        with self._lock:
+            new_count = sum(1 for pk in set(ids) if pk not in self._positions)
+            self._reserve(self._size + new_count)
+            for i, pk in enumerate(ids):
+                pos = self._positions.get(pk)
+                if pos is None:
+                    pos = self._size
+                    self._size += 1
+                    self._positions[pk] = pos
+                    self._ids[pos] = pk
+                self._matrix[pos] = rows[i]
+                if meta is not None:
+                    self._meta[pos] = meta[i]
+            self.generation += 1
+
+    def _encode(self, vectors):
+        """Turn raw vectors into stored rows: unit length, padded to ``dim``."""
+        return normalize_rows(pad_columns(vectors, self.dim))
+
+    def _scores(self, q):
+        """Similarity of the (normalized) query to every stored row."""
+        return self.matrix @ q
+
+    def _shortlist_size(self, k):
+        """Number of candidates kept before ``_rerank``."""
+        return k
+
+    def _rerank(self, q, hits):
+        return hits
+
+    def meta_of(self, pks):
+        """Stored meta value of each pk (NaN for unknown pks)."""
+        with self._lock:
+            return [self._meta[self._positions[pk]] if pk in self._positions else np.nan for pk in pks]
+
+    def remove(self, ids):
+        """Drop the rows for ``ids`` by moving the last row into their slot."""
+        with self._lock:
+            for pk in ids:
+                pos = self._positions.pop(pk, None)
+                if pos is None:
+                    continue
+                last = self._size - 1
+                if pos != last:
+                    moved = self._ids[last]
+                    self._ids[pos] = moved
+                    self._matrix[pos] = self._matrix[last]
+                    self._meta[pos] = self._meta[last]
+                    self._positions[moved] = pos
+                self._ids[last] = None
+                self._size = last
+            self.generation += 1
+
+    def search_batch(self, queries, k, where=None):
+        """``search`` for many queries, scored with one matrix product."""
+        if self.row_dtype != np.float32 or self._scores.__func__ is not EmbeddingIndex._scores:
+            return [self.search(q, k, where=where) for q in queries]
+        q = normalize_rows(pad_columns(np.reshape(queries, (len(queries), -1)), self.dim))
+        with self._lock:
+            scores = q @ self.matrix.T
+            ids = self.ids.copy()
+            valid = np.ones(scores.shape[1], dtype=bool)
+            if where is not None:
+                with np.errstate(invalid='ignore'):
+                    valid = np.asarray(where(self.meta), dtype=bool)
+        scores[:, ~valid] = -np.inf
+        k = min(k, int(np.count_nonzero(valid)))
+        if k <= 0:
+            return [[] for _ in range(len(q))]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, cols in zip(scores, top):
+            cols = cols[np.argsort(-row[cols], kind='stable')]
+            results.append([(ids[i], float(np.clip(row[i], -1.0, 1.0))) for i in cols])
+        return results
+
+    def search(self, query, k, where=None, exclude=(), include=None):
+        """Return up to ``k`` ``(pk, cosine similarity)`` pairs, best first.
+
+        ``where`` is an optional callable receiving the per-row ``meta`` array
+        and returning a boolean mask; rows where it is False, rows whose pk is
+        in ``exclude`` and, if ``include`` is given, rows whose pk is not in
+        it are never returned.
+        """
+        q = unit_vector(query, self.dim)
+        with self._lock:
+            scores = self._scores(q)
+            ids = self.ids.copy()
+            if where is not None:
+                with np.errstate(invalid='ignore'):
+                    valid = np.asarray(where(self.meta), dtype=bool)
+            else:
+                valid = np.ones(len(scores), dtype=bool)
+            if include is not None:
+                allowed = np.zeros(len(scores), dtype=bool)
+                for pk in include:
+                    pos = self._positions.get(pk)
+                    if pos is not None:
+                        allowed[pos] = True
+                valid &= allowed
+            for pk in exclude:
+                pos = self._positions.get(pk)
+                if pos is not None:
+                    valid[pos] = False
+        scores = np.where(valid, scores, -np.inf)
+        n = min(self._shortlist_size(k), int(np.count_nonzero(valid)))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        hits = [(ids[i], float(np.clip(scores[i], -1.0, 1.0))) for i in top]
+        return self._rerank(q, hits)[:k]
+
+
+class PartitionedIndex:
+    """One EmbeddingIndex per partition key (e.g. the event of a team).
+
+    ``search`` only scores the rows of a single partition. Rows moving to
+    another partition are removed from the old one.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.built_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._partitions = {}
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, pk):
+        return pk in self._keys
+
+    @property
+    def generation(self):
+        return sum(p.generation for p in self._partitions.values())
+
+    def partition(self, key):
+        return self._partitions.get(key)
+
+    def search_all(self, query, k, **kwargs):
+        """``search`` over every partition; ``(pk, similarity)`` pairs, best first."""
+        with self._lock:
+            parts = list(self._partitions.values())
+        hits = [hit for part in parts for hit in part.search(query, k, **kwargs)]
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:k]
+
+    def upsert(self, ids, vectors, keys):
+        ids, keys = list(ids), list(keys)
+        if not ids:
+            return
+        vectors = np.reshape(vectors, (len(ids), -1))
+        groups = {}
+        with self._lock:
+            for i, (pk, key) in enumerate(zip(ids, keys)):
+                old = self._keys.get(pk)
+                if old is not None and old != key:
+                    self._partitions[old].remove([pk])
+                self._keys[pk] = key
+                groups.setdefault(key, []).append(i)
+            for key, rows in groups.items():
+                part = self._partitions.get(key)
+                if part is None:
+                    part = self._partitions[key] = EmbeddingIndex(self.dim)
+                part.upsert([ids[i] for i in rows], vectors[rows])
+
+    def remove(self, ids):
+        with self._lock:
+            for pk in ids:
+                key = self._keys.pop(pk, None)
+                if key is None:
+                    continue
+                part = self._partitions[key]
+                part.remove([pk])
+                if not len(part):
+                    del self._partitions[key]
+
+    def search(self, key, query, k, **kwargs):
+        part = self._partitions.get(key)
+        if part is None:
+            return []
+        return part.search(query, k, **kwargs)
+
+
+def _timestamp(dt):
+    return dt.timestamp() if dt is not None else np.nan
+
+
+class LazyIndex:
+    """Process-wide EmbeddingIndex built on first use.
+
+    The first ``get()`` builds the index synchronously. Once it is older than
+    ``INDEX_MAX_AGE`` it is rebuilt in a background thread while requests keep
+    using the current copy; updates that arrive during the rebuild are
+    replayed onto the new index before it is swapped in.
+    """
+
+    def __init__(self, queryset, row, index_class=EmbeddingIndex):
+        # queryset: callable returning the rows to index
+        # row: instance -> arguments of index_class.upsert for one row,
+        # e.g. (pk, vector, meta)
+        self._queryset = queryset
+        self._row = row
+        self._index_class = index_class
+        self._index = None
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def build(self):
+        index = self._index_class()
+        batch = []
+        for obj in self._queryset().iterator(chunk_size=BUILD_CHUNK_SIZE):
+            batch.append(self._row(obj))
+            if len(batch) >= BUILD_CHUNK_SIZE:
+                index.upsert(*zip(*batch))
+                batch = []
+        if batch:
+            index.upsert(*zip(*batch))
+        if hasattr(index, 'train'):
+            # Approximate indexes cluster once all rows are loaded
+            index.train()
+        return index
+
+    def get(self):
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self.build()
+                return self._index
+        if self._is_stale(index):
+            self._start_rebuild()
+        return index
+
+    def _is_stale(self, index):
+        return time.monotonic() - index.built_at >= INDEX_MAX_AGE
+
+    def peek(self):
+        """Return the index if this process has built one, else None."""
+        return self._index
+
+    def update(self, instances):
+        rows = [self._row(obj) for obj in instances]
+        if not rows:
+            return
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(('upsert', rows))
+            index = self._index
+        if index is not None:
+            index.upsert(*zip(*rows))
+
+    def remove(self, pks):
+        pks = list(pks)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(('remove', pks))
+            index = self._index
+        if index is not None:
+            index.remove(pks)
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._pending is not None:
+                return  # already rebuilding
+            self._pending = []
+        threading.Thread(target=self._rebuild, name='embedding-index-rebuild', daemon=True).start()
+
+    def _rebuild(self):
+        from django.db import connection
+
+        try:
+            index = self.build()
+        except Exception:
+            logger.exception("Failed to rebuild embedding index")
+            index = None
+        finally:
+            connection.close()
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if index is None:
+                # Try again after another INDEX_MAX_AGE
+                if self._index is not None:
+                    self._index.built_at = time.monotonic()
+                return
+            for op, payload in pending:
+                if op == 'upsert':
+                    index.upsert(*zip(*payload))
+                else:
+                    index.remove(payload)
+            self._index = index
+
+
+def _event_row(ev):
+    return ev.pk, ev.get_embedding_array(), _timestamp(ev.end_date)
+
+
+def _user_row(user):
+    return user.pk, user.get_embedding_array(), np.nan
+
+
+def _team_row(team):
+    return team.pk, team.get_embedding_array(), team.event_id
+
+
+def _event_index():
+    from django.conf import settings
+
+    if getattr(settings, 'TFAPP_EVENT_INDEX_CODEC', 'exact') == 'pq':
+        from .pq import PQIndex
+        return PQIndex(fetch_vectors=_event_vectors)
+    return EmbeddingIndex()
+
+
+def _event_vectors(pks):
+    """Full stored embeddings of the given events, for exact re-ranking."""
+    from TFapp.models import Event
+    return {ev.pk: ev.get_embedding_array() for ev in Event.objects.filter(pk__in=pks).only('id', 'embedding')}
+
+
+def _ivf_index():
+    from .ivf import IVFIndex
+    return IVFIndex()
+
+
+def _events():
+    from TFapp.models import Event
+    return Event.objects.only('id', 'embedding', 'end_date')
+
+
+def _users():
+    from TFapp.models import User
+    return User.objects.filter(is_active=True).only('id', 'embedding')
+
+
+def _teams():
+    from TFapp.models import Team
+    return Team.objects.only('id', 'embedding', 'event')
+
+
+def _make_event_index():
+    from django.conf import settings
+
+    directory = getattr(settings, 'TFAPP_SHARED_INDEX_DIR', None)
+    if directory:
+        from .shared import SharedLazyIndex
+        return SharedLazyIndex(_events, _event_row, directory, 'events')
+    return LazyIndex(_events, _event_row, index_class=_event_index)
+
+
+def _make_user_index():
+    from django.conf import settings
+
+    directory = getattr(settings, 'TFAPP_SHARED_INDEX_DIR', None)
+    if directory:
+        from .ivf import SharedLazyIVFIndex
+        return SharedLazyIVFIndex(_users, _user_row, directory, 'users')
+    return LazyIndex(_users, _user_row, index_class=_ivf_index)
+
+
+event_index = _make_event_index()
+user_index = _make_user_index()
+team_index = LazyIndex(_teams, _team_row, index_class=PartitionedIndex)
+
+
+def get_event_index():
+    """Return the process-wide event index, building it on first use."""
+    return event_index.get()
+
+
+def get_team_index():
+    """Return the process-wide team index, building it on first use."""
+    return team_index.get()
+
+
+def peek_event_index():
+    """Return the event index if this process has built one, else None."""
+    return event_index.peek()
+
+
+def update_event_index(events):
+    """Patch the already-built event index with the given Event instances."""
+    event_index.update(events)
+
+
+def remove_from_event_index(pks):
+    event_index.remove(pks)
+
+
+def recommend_events(vector, k=5, now=None):
+    """Return ``(event_pk, similarity)`` pairs for upcoming events most similar to ``vector``."""
+    now = now if now is not None else time.time()
+    return get_event_index().search(vector, k, where=lambda end_ts: end_ts >= now)
+
+
+def update_user_index(users):
+    """Patch the already-built user index; inactive users are dropped from it."""
+    users = list(users)
+    user_index.update([u for u in users if u.is_active])
+    inactive = [u.pk for u in users if not u.is_active]
+    if inactive:
+        user_index.remove(inactive)
+
+
+def remove_from_user_index(pks):
+    user_index.remove(pks)
+
+
+def similar_users(vector, k=10, exclude=()):
+    """Return ``(user_pk, similarity)`` pairs for the users most similar to ``vector``."""
+    from . import pgvector
+    if pgvector.enabled():
+        from TFapp.models import User
+        return pgvector.nearest(User, vector, k, exclude=exclude, active_only=True)
+    return user_index.get().search(vector, k, exclude=exclude)
+
+
+def update_team_index(teams):
+    """Patch the already-built team index with the given Team instances."""
+    team_index.update(teams)
+
+
+def remove_from_team_index(pks):
+    team_index.remove(pks)
+
+
+def recommend_teams(event_id, vector, k=10, include=None):
+    """Return ``(team_pk, similarity)`` pairs among the teams of ``event_id``.
+
+    Only that event's teams are scored; ``include`` further restricts the
+    candidates (e.g. to teams that are open and not full).
+    """
+    return team_index.get().search(event_id, vector, k, include=include)
@@ -0,0 +1,357 @@
+"""Inverted-file (IVF) approximate nearest-neighbour index in pure NumPy.
+
+Vectors are normalized and assigned to the closest of ``nlist`` centroids
+found by spherical k-means. Each centroid owns an inverted list: a contiguous
+float32 block of its vectors plus their ids. A query only scores the vectors
+of the ``nprobe`` lists whose centroids are closest to it, so raising
+``nprobe`` trades latency for recall (``nprobe == nlist`` is exact search).
+
+Below ``IVF_MIN_ROWS`` rows ``train`` keeps a single list, which makes the
+index exact and as fast as ``EmbeddingIndex`` for small tables.
+
+``save`` writes the index as a new generation of ``.npy`` files and then
+swaps in a ``.json`` manifest naming it; ``IVFIndex.load`` opens the vector
+block with ``mmap_mode='r'`` and copies a list into memory only when it is
+modified. With ``TFAPP_SHARED_INDEX_DIR`` set the user index is a
+``SharedLazyIVFIndex``: the embedding job saves it there and every process
+loads the same memory-mapped files instead of rebuilding it.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .index import EMBEDDING_DIM, LazyIndex, normalize_rows, pad_columns, unit_vector
+from .shared import SharedLazyIndex, decode_ids, encode_ids, prune_generations
+from .token_cache import write_atomically
+
+# Tables smaller than this are kept in one list (exact search)
+IVF_MIN_ROWS = 20_000
+# Lists scanned per query unless the caller asks otherwise
+DEFAULT_NPROBE = 16
+KMEANS_ITERS = 10
+# Training points per centroid (k-means runs on a sample)
+TRAIN_POINTS_PER_LIST = 64
+# Rows scored per matrix product during assignment
+ASSIGN_CHUNK_SIZE = 16_384
+
+
+def default_nlist(n):
+    """Number of lists for ``n`` rows: 1 for small tables, ~sqrt(n) above."""
+    if n < IVF_MIN_ROWS:
+        return 1
+    return int(np.sqrt(n))
+
+
+def assign(vectors, centroids, chunk_size=ASSIGN_CHUNK_SIZE):
+    """Index of the most similar centroid for every (normalized) row."""
+    if len(centroids) == 1:
+        return np.zeros(len(vectors), dtype=np.int64)
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(vectors, nlist, iters=KMEANS_ITERS, seed=0):
+    """Unit-length centroids of ``nlist`` clusters of normalized ``vectors``.
+
+    Empty clusters are re-seeded with random points.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    centroids = np.array(vectors[rng.choice(n, size=nlist, replace=False)], dtype=np.float32)
+    for _ in range(iters):
+        labels = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class _InvertedList:
+    """Growable block of rows belonging to one centroid."""
+
+    def __init__(self, dim, ids=None, matrix=None, meta=None):
+        self.dim = dim
+        if ids is None:
+            ids = np.empty(0, dtype=object)
+            matrix = np.empty((0, dim), dtype=np.float32)
+            meta = np.empty(0, dtype=np.float64)
+        self.size = len(ids)
+        self.ids, self.matrix, self.meta = ids, matrix, meta
+
+    def _reserve(self, size):
+        # Also makes memory-mapped (read-only) blocks writable on first change
+        if size <= len(self.ids) and self.matrix.flags.writeable:
+            return
+        capacity = max(size, 2 * len(self.ids), 16)
+        ids = np.empty(capacity, dtype=object)
+        ids[: self.size] = self.ids[: self.size]
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[: self.size] = self.matrix[: self.size]
+        meta = np.full(capacity, np.nan, dtype=np.float64)
+        meta[: self.size] = self.meta[: self.size]
+        self.ids, self.matrix, self.meta = ids, matrix, meta
+
+    def append(self, ids, rows, meta):
+        start = self.size
+        self._reserve(start + len(ids))
+        end = start + len(ids)
+        self.ids[start:end] = ids
+        self.matrix[start:end] = rows
+        self.meta[start:end] = meta
+        self.size = end
+        return start
+
+    def remove(self, pos):
+        """Remove row ``pos``; returns the pk moved into its slot, if any."""
+        self._reserve(self.size)
+        last = self.size - 1
+        moved = None
+        if pos != last:
+            moved = self.ids[last]
+            self.ids[pos] = moved
+            self.matrix[pos] = self.matrix[last]
+            self.meta[pos] = self.meta[last]
+        self.ids[last] = None
+        self.size = last
+        return moved
+
+
+class IVFIndex:
+    """Approximate cosine-similarity index with the ``EmbeddingIndex`` interface.
+
+    ``search`` takes an extra ``nprobe`` argument; ``train`` (re)clusters the
+    rows already in the index.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, nprobe=DEFAULT_NPROBE):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.generation = 0
+        self.built_at = time.monotonic()
+        # Generation this index was loaded from (see ``load``)
+        self.published_generation = None
+        self._lock = threading.RLock()
+        self.centroids = np.zeros((1, dim), dtype=np.float32)
+        self._lists = [_InvertedList(dim)]
+        # pk -> (list number, row in that list)
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, pk):
+        return pk in self._positions
+
+    @property
+    def nlist(self):
+        return len(self._lists)
+
+    def _rows(self):
+        """All rows as ``(ids, matrix, meta)``, in list order."""
+        ids = np.concatenate([lst.ids[: lst.size] for lst in self._lists])
+        matrix = np.concatenate([lst.matrix[: lst.size] for lst in self._lists])
+        meta = np.concatenate([lst.meta[: lst.size] for lst in self._lists])
+        return ids, matrix, meta
+
+    def upsert(self, ids, vectors, meta=None):
+        """Insert or overwrite the rows for ``ids``."""
+        ids = list(ids)
+        if not ids:
+            return
+        rows = normalize_rows(pad_columns(np.reshape(vectors, (len(ids), -1)), self.dim))
+        meta = np.full(len(ids), np.nan) if meta is None else np.asarray(meta, dtype=np.float64)
+        with self._lock:
+            self._remove([pk for pk in ids if pk in self._positions])
+            # Last occurrence wins when a pk appears twice in one call
+            last = {pk: i for i, pk in enumerate(ids)}
+            keep = np.fromiter(sorted(last.values()), dtype=np.int64)
+            labels = assign(rows[keep], self.centroids)
+            for list_no in np.unique(labels):
+                sel = keep[labels == list_no]
+                lst = self._lists[list_no]
+                start = lst.append([ids[i] for i in sel], rows[sel], meta[sel])
+                for offset, i in enumerate(sel):
+                    self._positions[ids[i]] = (int(list_no), start + offset)
+            self.generation += 1
+
+    def remove(self, ids):
+        with self._lock:
+            self._remove(ids)
+            self.generation += 1
+
+    def _remove(self, ids):
+        for pk in ids:
+            loc = self._positions.pop(pk, None)
+            if loc is None:
+                continue
+            list_no, pos = loc
+            moved = self._lists[list_no].remove(pos)
+            if moved is not None:
+                self._positions[moved] = (list_no, pos)
+
+    def train(self, nlist=None, iters=KMEANS_ITERS, seed=0):
+        """Cluster the current rows into ``nlist`` lists and reassign them all."""
+        with self._lock:
+            ids, matrix, meta = self._rows()
+            n = len(ids)
+            nlist = min(nlist or default_nlist(n), max(n, 1))
+            if nlist <= 1:
+                centroids = np.zeros((1, self.dim), dtype=np.float32)
+            else:
+                rng = np.random.default_rng(seed)
+                sample_size = min(n, nlist * TRAIN_POINTS_PER_LIST)
+                sample = matrix[np.sort(rng.choice(n, size=sample_size, replace=False))]
+                centroids = spherical_kmeans(sample, nlist, iters=iters, seed=seed)
+            self.centroids = centroids
+            self._lists = [_InvertedList(self.dim) for _ in range(len(centroids))]
+            self._positions = {}
+            if n:
+                self.upsert(ids, matrix, meta)
+            self.generation += 1
+
+    def search(self, query, k, where=None, exclude=(), include=None, nprobe=None):
+        """Return up to ``k`` ``(pk, cosine similarity)`` pairs, best first.
+
+        Only the ``nprobe`` lists closest to the query are scored; the
+        filters behave like ``EmbeddingIndex.search``.
+        """
+        q = unit_vector(query, self.dim)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        with self._lock:
+            if nprobe < self.nlist:
+                probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+            else:
+                probe = range(self.nlist)
+            probe_set = set(int(p) for p in probe)
+            blocked = {}
+            for pk in exclude:
+                loc = self._positions.get(pk)
+                if loc is not None and loc[0] in probe_set:
+                    blocked.setdefault(loc[0], []).append(loc[1])
+            allowed = None
+            if include is not None:
+                allowed = {}
+                for pk in include:
+                    loc = self._positions.get(pk)
+                    if loc is not None and loc[0] in probe_set:
+                        allowed.setdefault(loc[0], []).append(loc[1])
+            all_ids, all_scores = [], []
+            for list_no in probe_set:
+                lst = self._lists[list_no]
+                if not lst.size:
+                    continue
+                scores = lst.matrix[: lst.size] @ q
+                valid = np.ones(lst.size, dtype=bool)
+                if where is not None:
+                    with np.errstate(invalid='ignore'):
+                        valid &= np.asarray(where(lst.meta[: lst.size]), dtype=bool)
+                if list_no in blocked:
+                    valid[blocked[list_no]] = False
+                if allowed is not None:
+                    mask = np.zeros(lst.size, dtype=bool)
+                    mask[allowed.get(list_no, [])] = True
+                    valid &= mask
+                all_scores.append(np.where(valid, scores, -np.inf))
+                all_ids.append(lst.ids[: lst.size].copy())
+        if not all_scores:
+            return []
+        scores = np.concatenate(all_scores)
+        ids = np.concatenate(all_ids)
+        k = min(k, int(np.count_nonzero(np.isfinite(scores))))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(ids[i], float(np.clip(scores[i], -1.0, 1.0))) for i in top]
+
+    # --- Persistence ---
+
+    @staticmethod
+    def _files(path, generation):
+        prefix = f'{path}.{generation}'
+        return {
+            'centroids': prefix + '.centroids.npy',
+            'vectors': prefix + '.vectors.npy',
+            'meta': prefix + '.meta.npy',
+            'ids': prefix + '.ids.npy',
+        }
+
+    def save(self, path):
+        """Write the index as a new generation next to ``path``; returns the generation.
+
+        The arrays go to files named after the generation and the manifest
+        naming it is swapped in last, so ``load`` never pairs the arrays of
+        one save with the list sizes of another.
+        """
+        with self._lock:
+            ids, matrix, meta = self._rows()
+            sizes = [lst.size for lst in self._lists]
+            centroids = self.centroids
+        id_type, encoded = encode_ids(ids)
+        generation = time.time_ns()
+        files = self._files(path, generation)
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        for name, array in (('centroids', centroids), ('vectors', matrix), ('meta', meta), ('ids', encoded)):
+            write_atomically(files[name], lambda f, array=array: np.save(f, array))
+        manifest = {
+            'generation': generation, 'dim': self.dim, 'nprobe': self.nprobe,
+            'id_type': id_type, 'sizes': sizes,
+        }
+        write_atomically(path + '.json', lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+        prune_generations(directory, os.path.basename(path), generation)
+        return generation
+
+    @classmethod
+    def load(cls, path):
+        """Open the current generation written by ``save``; vectors stay memory-mapped."""
+        with open(path + '.json', encoding='utf-8') as f:
+            manifest = json.load(f)
+        files = cls._files(path, manifest['generation'])
+        index = cls(dim=manifest['dim'], nprobe=manifest['nprobe'])
+        index.published_generation = manifest['generation']
+        index.centroids = np.load(files['centroids'])
+        vectors = np.load(files['vectors'], mmap_mode='r')
+        meta = np.load(files['meta'], mmap_mode='r')
+        ids = decode_ids(manifest['id_type'], np.load(files['ids']))
+        index._lists = []
+        start = 0
+        for list_no, size in enumerate(manifest['sizes']):
+            end = start + size
+            index._lists.append(_InvertedList(index.dim, ids[start:end], vectors[start:end], meta[start:end]))
+            for pos, pk in enumerate(ids[start:end]):
+                index._positions[pk] = (list_no, pos)
+            start = end
+        return index
+
+
+class SharedLazyIVFIndex(SharedLazyIndex):
+    """``SharedLazyIndex`` for an ``IVFIndex`` saved by the embedding job.
+
+    The loaded index is used directly: its lists stay memory-mapped until a
+    local change copies one into the process.
+    """
+
+    def __init__(self, queryset, row, directory, name):
+        super().__init__(queryset, row, directory, name, index_class=IVFIndex)
+
+    def build(self):
+        if self.current_manifest() is not None:
+            try:
+                return IVFIndex.load(os.path.join(self.directory, self.name))
+            except (OSError, ValueError, KeyError):
+                pass
+        return LazyIndex.build(self)
+
+    def publish(self):
+        return LazyIndex.build(self).save(os.path.join(self.directory, self.name))
@@ -0,0 +1,155 @@
+"""Embedding job queue backed by the EmbeddingJob table.
+
+Producers call ``enqueue_embedding_jobs`` (the post_save signal does it for
+every entity saved with ``embedding_needs_update=True``). Consumers - the
+``embedding_worker`` management command, or the in-process scheduler when no
+worker is deployed - repeatedly ``claim_jobs`` and ``process_jobs``.
+
+Several workers can run in parallel: a claim stamps a batch of jobs with a
+unique token in a single statement (``SELECT ... FOR UPDATE SKIP LOCKED`` on
+backends that support it), so no job is handed to two workers. Claims older
+than ``CLAIM_TIMEOUT`` are considered abandoned and can be taken again.
+
+Each claim counts as an attempt. A batch that raises is retried job by job,
+so one bad row doesn't hold back the others; failing jobs keep their claim
+(and are retried after ``CLAIM_TIMEOUT``) until ``MAX_ATTEMPTS`` is used up,
+then they are dead-lettered with ``failed_at`` and their last error. A job
+whose final claim is abandoned (the worker died) is dead-lettered by the
+next ``claim_jobs`` once that claim expires.
+"""
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from .fasttext import EMBEDDING_CHUNK_SIZE, embedding_queryset, save_embeddings
+
+# Seconds after which a claimed but unfinished job may be claimed again
+CLAIM_TIMEOUT = 600
+# Claims after which a failing job is dead-lettered
+MAX_ATTEMPTS = 5
+# last_error of a job dead-lettered because its final claim was abandoned
+ABANDONED_ERROR = 'Claim abandoned (worker crashed or timed out)'
+ENQUEUE_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_embedding_jobs(entity_type, ids):
+    """Queue embedding jobs for ``ids``; ids with a pending job are skipped."""
+    from TFapp.models import EmbeddingJob
+
+    ids = iter(ids)
+    count = 0
+    while True:
+        batch = list(islice(ids, ENQUEUE_BATCH_SIZE))
+        if not batch:
+            return count
+        EmbeddingJob.objects.bulk_create(
+            [EmbeddingJob(entity_type=entity_type, entity_id=pk) for pk in batch],
+            ignore_conflicts=True,
+        )
+        count += len(batch)
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_jobs(worker_id, limit=EMBEDDING_CHUNK_SIZE):
+    """Atomically claim up to ``limit`` jobs for ``worker_id`` and return them."""
+    from TFapp.models import EmbeddingJob
+
+    now = timezone.now()
+    expired = Q(claimed_at__lt=now - timedelta(seconds=CLAIM_TIMEOUT))
+    # Jobs whose last attempt was abandoned (worker crash, timeout) are
+    # never claimed again, so dead-letter them here
+    abandoned = EmbeddingJob.objects.filter(expired, failed_at__isnull=True, attempts__gte=MAX_ATTEMPTS)
+    abandoned.filter(last_error='').update(last_error=ABANDONED_ERROR)
+    abandoned.update(failed_at=now)
+    claimable = Q(claimed_at__isnull=True) | expired
+    claimable &= Q(failed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+    # A fresh token per claim, so stale claims by the same worker id are
+    # never confused with this batch.
+    token = f'{worker_id}:{uuid.uuid4().hex[:8]}'[-100:]
+    candidates = EmbeddingJob.objects.filter(claimable).order_by('id').values_list('id', flat=True)
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            # Postgres: lock a batch, skipping rows other workers hold
+            ids = list(candidates.select_for_update(skip_locked=True)[:limit])
+            claimed = EmbeddingJob.objects.filter(id__in=ids, claimed_by=token)
+        else:
+            # SQLite: one UPDATE ... WHERE id IN (SELECT ... LIMIT n) runs
+            # under the database write lock, so it is atomic on its own.
+            # The batch is read back through embedding_job_claim_idx
+            # (claimed_by has no index).
+            ids = Subquery(candidates[:limit])
+            claimed = EmbeddingJob.objects.filter(claimed_at=now, claimed_by=token)
+        EmbeddingJob.objects.filter(claimable, id__in=ids).update(
+            claimed_by=token, claimed_at=now, attempts=F('attempts') + 1,
+        )
+    return list(claimed)
+
+
+def process_jobs(jobs, model):
+    """Recompute the embeddings for claimed ``jobs`` and delete them.
+
+    Jobs pointing at rows that no longer exist are simply dropped. If a
+    batch raises, its jobs are retried one by one and the ones that still
+    fail are recorded with ``fail_jobs``.
+    """
+    by_type = defaultdict(list)
+    for job in jobs:
+        by_type[job.entity_type].append(job)
+    count = 0
+    for entity_type, type_jobs in by_type.items():
+        try:
+            count += _process_batch(entity_type, type_jobs, model)
+        except Exception as exc:
+            if len(type_jobs) == 1:
+                logger.exception("Embedding job %s failed", type_jobs[0])
+                fail_jobs(type_jobs, exc)
+                continue
+            logger.warning("Embedding batch of %d %s jobs failed; retrying one by one",
+                           len(type_jobs), entity_type, exc_info=True)
+            for job in type_jobs:
+                count += process_jobs([job], model)
+    return count
+
+
+def _process_batch(entity_type, jobs, model):
+    from TFapp.models import EmbeddingJob
+
+    rows = list(embedding_queryset(entity_type).filter(pk__in=[j.entity_id for j in jobs]))
+    save_embeddings(entity_type, rows, model)
+    EmbeddingJob.objects.filter(pk__in=[j.pk for j in jobs]).delete()
+    return len(rows)
+
+
+def fail_jobs(jobs, error):
+    """Record ``error`` on ``jobs``; those out of attempts are dead-lettered."""
+    from TFapp.models import EmbeddingJob
+
+    pks = [job.pk for job in jobs]
+    EmbeddingJob.objects.filter(pk__in=pks).update(last_error=f'{type(error).__name__}: {error}')
+    EmbeddingJob.objects.filter(pk__in=pks, attempts__gte=MAX_ATTEMPTS).update(failed_at=timezone.now())
+
+
+def process_pending_jobs(model, worker_id=None, batch_size=EMBEDDING_CHUNK_SIZE):
+    """Drain the queue in batches. Returns ``(rows, seconds)``."""
+    worker_id = worker_id or default_worker_id()
+    started = time.perf_counter()
+    count = 0
+    while True:
+        jobs = claim_jobs(worker_id, batch_size)
+        if not jobs:
+            return count, time.perf_counter() - started
+        count += process_jobs(jobs, model)
@@ -0,0 +1,89 @@
+"""pgvector copies of the stored embeddings (PostgreSQL with TFAPP_PGVECTOR=1).
+
+``manage.py setup_pgvector`` installs the extension and adds an
+``embedding_vec vector(300)`` column with an HNSW cosine index to the user,
+event and team tables. The column is managed here rather than in the
+migrations, so SQLite installs and servers without the extension are
+unaffected. It mirrors the ``embedding`` blob, which stays the source of
+truth: the embedding job writes both (see ``fasttext._index_updaters``).
+
+With the flag on, ``similar_users`` is answered by the database. Web
+processes then never load the user table into an in-memory index.
+"""
+from django.conf import settings
+from django.db import connection
+
+from .index import BUILD_CHUNK_SIZE, EMBEDDING_DIM
+
+COLUMN = 'embedding_vec'
+
+
+def enabled():
+    return getattr(settings, 'TFAPP_PGVECTOR', False) and connection.vendor == 'postgresql'
+
+
+def _table(model_cls):
+    return connection.ops.quote_name(model_cls._meta.db_table)
+
+
+def _literal(vector):
+    """pgvector text input: ``[x1,x2,...]``."""
+    return '[' + ','.join(repr(float(x)) for x in vector) + ']'
+
+
+def install(model_classes):
+    """Create the extension, the vector columns and their HNSW indexes."""
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS vector')
+        for model_cls in model_classes:
+            table = _table(model_cls)
+            index = connection.ops.quote_name(f'{model_cls._meta.db_table}_{COLUMN}_hnsw')
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {COLUMN} vector({EMBEDDING_DIM})')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {index} ON {table} USING hnsw ({COLUMN} vector_cosine_ops)'
+            )
+
+
+def sync(instances):
+    """Copy the embeddings of ``instances`` (one model) into the vector column."""
+    if not instances:
+        return
+    table = _table(type(instances[0]))
+    rows = [(_literal(obj.get_embedding_array()), obj.pk) for obj in instances]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'UPDATE {table} SET {COLUMN} = %s::vector WHERE id = %s', rows)
+
+
+def backfill(model_cls, chunk_size=BUILD_CHUNK_SIZE):
+    """Fill the vector column from every stored embedding. Returns the row count."""
+    count = 0
+    chunk = []
+    for obj in model_cls.objects.only('id', 'embedding').iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            sync(chunk)
+            count += len(chunk)
+            chunk = []
+    sync(chunk)
+    return count + len(chunk)
+
+
+def nearest(model_cls, vector, k, exclude=(), active_only=False):
+    """``(pk, cosine similarity)`` of the ``k`` rows closest to ``vector``."""
+    exclude = list(exclude)
+    query = _literal(vector)
+    conditions = [f'{COLUMN} IS NOT NULL']
+    params = [query]
+    if active_only:
+        conditions.append('is_active')
+    if exclude:
+        conditions.append('NOT (id = ANY(%s))')
+        params.append(exclude)
+    # ORDER BY the distance operator itself so the HNSW index is used
+    sql = (
+        f'SELECT id, 1 - ({COLUMN} <=> %s::vector) FROM {_table(model_cls)} '
+        f'WHERE {" AND ".join(conditions)} ORDER BY {COLUMN} <=> %s::vector LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [query, k])
+        return [(pk, float(score)) for pk, score in cursor.fetchall()]
@@ -0,0 +1,168 @@
+"""Word-vector providers used to compute embeddings.
+
+Loading ``cc.en.300.bin`` takes several GB of RAM and a long time, so nothing
+is loaded at import or startup any more:
+
+- ``FastTextProvider`` wraps the full fastText binary. It loads on first use,
+  or ahead of time in a background thread via ``load_in_background()``;
+  ``ready`` tells whether the model is available yet.
+- ``PrunedVectorProvider`` reads a vocabulary-only export of the model (the
+  most frequent words and their vectors, see ``export_pruned_vectors`` and the
+  ``export_fasttext_vocab`` command). The matrix is opened with
+  ``np.load(mmap_mode='r')``, so every worker process shares one copy through
+  the page cache instead of each holding the model in its own RSS.
+  Out-of-vocabulary tokens map to a zero vector.
+
+``settings.TFAPP_WORD_VECTORS`` chooses between them (see
+``fasttext.get_provider``).
+
+Both expose ``get_word_vector(token)`` like a fastText model, so they can be
+passed anywhere the code used to take the model itself.
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from .token_cache import write_atomically
+
+logger = logging.getLogger(__name__)
+
+
+class WordVectorsUnavailable(RuntimeError):
+    """The word vectors failed to load; see ``EmbeddingProvider.error``."""
+
+
+class EmbeddingProvider:
+    """Common interface: ``get_word_vector``, ``dim``, ``ready`` and ``tag``."""
+    dim = 300
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._thread = None
+        self.error = None
+
+    @property
+    def tag(self):
+        """Identifies the vectors this provider returns (used by caches)."""
+        return f'{type(self).__name__}:{self.path}'
+
+    @property
+    def ready(self):
+        raise NotImplementedError
+
+    def load(self):
+        raise NotImplementedError
+
+    def load_in_background(self):
+        """Start loading in a daemon thread; returns immediately."""
+        with self._lock:
+            if self.ready or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(
+                target=self._load_quietly, name=f'{type(self).__name__}-loader', daemon=True,
+            )
+            self._thread.start()
+
+    def _load_quietly(self):
+        try:
+            self.load()
+        except Exception as exc:
+            self.error = exc
+            logger.exception("Failed to load word vectors from %s", self.path)
+
+    def get_word_vector(self, token):
+        raise NotImplementedError
+
+
+class FastTextProvider(EmbeddingProvider):
+    """The full fastText binary model, loaded lazily."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._model = None
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import fasttext
+
+                    model = fasttext.load_model(self.path)
+                    self.dim = model.get_dimension()
+                    self._model = model
+                    print('FastText model loaded.')
+        return self._model
+
+    @property
+    def model(self):
+        return self.load()
+
+    def get_word_vector(self, token):
+        return self.model.get_word_vector(token)
+
+    def get_words(self, include_freq=False):
+        return self.model.get_words(include_freq=include_freq)
+
+
+class PrunedVectorProvider(EmbeddingProvider):
+    """Vocabulary-only export of a model: ``<path>.npy`` vectors + ``<path>.json`` words."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._rows = None
+        self._vectors = None
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(path + '.npy') and os.path.exists(path + '.json')
+
+    @property
+    def ready(self):
+        return self._rows is not None
+
+    def load(self):
+        if self._rows is None:
+            with self._lock:
+                if self._rows is None:
+                    vectors = np.load(self.path + '.npy', mmap_mode='r')
+                    with open(self.path + '.json', encoding='utf-8') as f:
+                        words = json.load(f)['words']
+                    self._vectors = vectors
+                    self.dim = vectors.shape[1]
+                    self._rows = {w: i for i, w in enumerate(words)}
+        return self
+
+    def get_word_vector(self, token):
+        self.load()
+        pos = self._rows.get(token)
+        if pos is None:
+            pos = self._rows.get(token.lower())
+        if pos is None:
+            return np.zeros(self.dim, dtype=np.float32)
+        return np.array(self._vectors[pos], dtype=np.float32)
+
+
+def export_pruned_vectors(model, path, top_n):
+    """Write the ``top_n`` most frequent words of ``model`` and their vectors to ``path``.
+
+    fastText keeps its vocabulary sorted by frequency, so the head of
+    ``get_words()`` is what we want. Returns the number of words written.
+    """
+    words = list(model.get_words())[:top_n]
+    matrix = np.empty((len(words), model.get_dimension()), dtype=np.float32)
+    for i, word in enumerate(words):
+        matrix[i] = model.get_word_vector(word)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    vocabulary = json.dumps({'words': words}, ensure_ascii=False).encode('utf-8')
+    # Private temporary names: concurrent exports must not share them
+    write_atomically(path + '.npy', lambda f: np.save(f, matrix))
+    write_atomically(path + '.json', lambda f: f.write(vocabulary))
+    return len(words)
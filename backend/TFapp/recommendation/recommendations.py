@@ -0,0 +1,135 @@
+"""Per-user cache of event recommendations.
+
+A user's recommendations only change when their embedding or the event
+index changes, so results are cached under
+``(user, crc32 of the embedding bytes, event index version)``. The version
+is the one of the index this process searches (``index_version``): a
+published shared generation is the same in every process, any other index
+is private to the process that built it. A new embedding or any change to
+the local index produces a new key; old entries expire.
+
+Each entry holds the best ``CACHED_RESULTS`` upcoming events together with
+their end time, so events that end later are dropped on read instead of
+invalidating the entry. The embedding job calls
+``precompute_recommendations`` once it has drained the queue, which fills
+the cache for recently active users in batches; the endpoint then usually
+does a single cache read. Precomputing is skipped when the cache is local
+to the process, since web workers could never read the results.
+"""
+import time
+import uuid
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from TFapp.cache import get_cache
+from .index import get_event_index
+
+# Results stored per user; more than the endpoint shows, so ended events can be skipped
+CACHED_RESULTS = 20
+CACHE_TIMEOUT = 24 * 60 * 60
+# Users who logged in within this many days get their results precomputed
+PRECOMPUTE_ACTIVE_DAYS = 30
+PRECOMPUTE_BATCH_SIZE = 1000
+
+# Tells apart indexes built in different processes
+_PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+
+def embedding_version(vector):
+    return zlib.crc32(np.asarray(vector, dtype=np.float32).tobytes())
+
+
+def index_version(index):
+    """Cache key part identifying the contents of ``index``."""
+    generation = index.generation
+    if isinstance(generation, tuple):
+        published, local = generation
+        if published is not None:
+            # A published shared generation (shared.SharedIndex) plus local changes
+            return f'{published}.{local}'
+        generation = local
+    return f'{_PROCESS_TOKEN}.{index.built_at:.6f}.{generation}'
+
+
+def cache_is_shared():
+    """Whether other processes read the same cache as this one."""
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def _key(user_pk, vector, version):
+    return f'tfapp:recommendations:{user_pk}:{embedding_version(vector)}:{version}'
+
+
+def _entry(index, hits):
+    """Cache entry: ``[(pk, score, end timestamp), ...]``."""
+    ends = index.meta_of([pk for pk, _ in hits])
+    return [(pk, score, float(end)) for (pk, score), end in zip(hits, ends)]
+
+
+def _upcoming(now):
+    return lambda end_ts: end_ts >= now
+
+
+def recommended_events_for(user, k=5, now=None):
+    """``(event_pk, similarity)`` pairs for ``user``, from the cache when possible."""
+    now = now if now is not None else time.time()
+    vector = user.get_embedding_array()
+    index = get_event_index()
+    key = _key(user.pk, vector, index_version(index))
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is not None:
+        hits = [(pk, score) for pk, score, end in entry if end >= now]
+        # A short entry already holds every upcoming match
+        if len(hits) >= k or len(entry) < CACHED_RESULTS:
+            return hits[:k]
+    entry = _entry(index, index.search(vector, max(k, CACHED_RESULTS), where=_upcoming(now)))
+    cache.set(key, entry, timeout=CACHE_TIMEOUT)
+    return [(pk, score) for pk, score, _ in entry][:k]
+
+
+def precompute_recommendations(now=None):
+    """Fill the cache for every recently active user. Returns the number of users.
+
+    Does nothing (and returns 0) when the cache is not shared between processes.
+    """
+    from TFapp.models import User
+
+    if not cache_is_shared():
+        return 0
+    now = now if now is not None else time.time()
+    index = get_event_index()
+    version = index_version(index)
+    since = timezone.now() - timedelta(days=PRECOMPUTE_ACTIVE_DAYS)
+    users = User.objects.filter(is_active=True, last_login__gte=since).only('id', 'embedding')
+    search_batch = getattr(index, 'search_batch', None)
+    cache = get_cache()
+    count = 0
+    batch = []
+    for user in users.iterator(chunk_size=PRECOMPUTE_BATCH_SIZE):
+        batch.append(user)
+        if len(batch) >= PRECOMPUTE_BATCH_SIZE:
+            count += _precompute_batch(cache, index, search_batch, batch, version, now)
+            batch = []
+    if batch:
+        count += _precompute_batch(cache, index, search_batch, batch, version, now)
+    return count
+
+
+def _precompute_batch(cache, index, search_batch, users, version, now):
+    vectors = np.stack([u.get_embedding_array() for u in users])
+    if search_batch is not None:
+        results = search_batch(vectors, CACHED_RESULTS, where=_upcoming(now))
+    else:
+        results = [index.search(v, CACHED_RESULTS, where=_upcoming(now)) for v in vectors]
+    cache.set_many(
+        {_key(u.pk, v, version): _entry(index, hits) for u, v, hits in zip(users, vectors, results)},
+        timeout=CACHE_TIMEOUT,
+    )
+    return len(users)
@@ -0,0 +1,202 @@
+"""Hybrid keyword + embedding search over events and teams.
+
+``SearchIndex`` keeps a BM25 inverted index over the text of every event
+and team. A query is answered by it and, when the query can be embedded, by
+the event and team embedding indexes the recommendations already keep in
+memory (``get_event_index`` / ``get_team_index``), so no second copy of
+the vectors is held. The rankings are merged with reciprocal rank fusion
+(RRF): each document scores ``sum(1 / (RRF_K + rank))`` over the rankings
+it appears in, so documents found by both methods rise to the top without
+having to calibrate BM25 scores against cosine similarities.
+
+Documents are keyed ``('event', pk)`` / ``('team', pk)``. The index is built
+lazily like the recommendation indexes and patched by the Event/Team signals
+and by ingestion, never rebuilt per query.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from .index import BUILD_CHUNK_SIZE, LazyIndex, get_event_index, get_team_index
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Rank constant of reciprocal rank fusion
+RRF_K = 60
+# Candidates taken from each ranking before fusion
+SEARCH_CANDIDATES = 100
+
+SEARCH_FIELDS = {
+    'event': ('name', 'description'),
+    'team': ('name', 'description', 'required_skills'),
+}
+
+_token_re = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _token_re.findall((text or '').lower())
+
+
+def document_text(obj):
+    return ' '.join(getattr(obj, f) or '' for f in SEARCH_FIELDS[obj._meta.model_name])
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring and incremental updates."""
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1, self.b = k1, b
+        self._lock = threading.Lock()
+        # term -> {doc: term frequency}
+        self._postings = defaultdict(dict)
+        # doc -> {term: term frequency}
+        self._docs = {}
+        self._lengths = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def upsert(self, doc, tokens):
+        counts = Counter(tokens)
+        with self._lock:
+            self._remove(doc)
+            self._docs[doc] = counts
+            self._lengths[doc] = sum(counts.values())
+            self._total_length += self._lengths[doc]
+            for term, tf in counts.items():
+                self._postings[term][doc] = tf
+
+    def remove(self, doc):
+        with self._lock:
+            self._remove(doc)
+
+    def _remove(self, doc):
+        counts = self._docs.pop(doc, None)
+        if counts is None:
+            return
+        self._total_length -= self._lengths.pop(doc)
+        for term in counts:
+            posting = self._postings[term]
+            posting.pop(doc, None)
+            if not posting:
+                del self._postings[term]
+
+    def search(self, tokens, k, kind=None):
+        """Return up to ``k`` ``(doc, score)`` pairs, best first."""
+        scores = defaultdict(float)
+        with self._lock:
+            n = len(self._docs)
+            if not n:
+                return []
+            avg_length = self._total_length / n
+            for term in set(tokens):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc, tf in posting.items():
+                    if kind is not None and doc[0] != kind:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc] / avg_length)
+                    scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: -item[1])
+        return best[:k]
+
+
+class SearchIndex:
+    """BM25 over the text of every event and team; see ``search`` for the vectors."""
+
+    def __init__(self):
+        self.built_at = time.monotonic()
+        self.keywords = BM25Index()
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def __contains__(self, doc):
+        return doc in self.keywords._docs
+
+    def upsert(self, docs, texts):
+        for doc, text in zip(docs, texts):
+            self.keywords.upsert(doc, tokenize(text))
+
+    def remove(self, docs):
+        for doc in docs:
+            self.keywords.remove(doc)
+
+    def search(self, query, k, kind=None):
+        return self.keywords.search(tokenize(query), k, kind=kind)
+
+
+class LazySearchIndex(LazyIndex):
+    """``LazyIndex`` over both events and teams."""
+
+    def __init__(self):
+        super().__init__(None, _search_row, index_class=SearchIndex)
+
+    def build(self):
+        from TFapp.models import Event, Team
+
+        index = SearchIndex()
+        for model_cls, kind in ((Event, 'event'), (Team, 'team')):
+            rows = []
+            queryset = model_cls.objects.only('id', *SEARCH_FIELDS[kind])
+            for obj in queryset.iterator(chunk_size=BUILD_CHUNK_SIZE):
+                rows.append(_search_row(obj))
+            if rows:
+                index.upsert(*zip(*rows))
+        return index
+
+
+def _search_row(obj):
+    return (obj._meta.model_name, obj.pk), document_text(obj)
+
+
+def vector_ranking(vector, k, kind=None):
+    """``(doc, similarity)`` pairs from the event and team embedding indexes, best first."""
+    hits = []
+    if kind in (None, 'event'):
+        hits += [(('event', pk), score) for pk, score in get_event_index().search(vector, k)]
+    if kind in (None, 'team'):
+        hits += [(('team', pk), score) for pk, score in get_team_index().search_all(vector, k)]
+    hits.sort(key=lambda hit: -hit[1])
+    return hits[:k]
+
+
+def fuse(rankings, k):
+    """Reciprocal rank fusion of several ``(doc, score)`` rankings."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, start=1):
+            fused[doc] += 1.0 / (RRF_K + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])[:k]
+
+
+search_index = LazySearchIndex()
+
+
+def update_search_index(instances):
+    """Patch the already-built search index with Event/Team instances."""
+    search_index.update(instances)
+
+
+def remove_from_search_index(kind, pks):
+    search_index.remove([(kind, pk) for pk in pks])
+
+
+def search(query, k=20, vector=None, kind=None, candidates=SEARCH_CANDIDATES):
+    """Hybrid search; returns ``(kind, pk, score)`` triples, best first.
+
+    Ranks with RRF over BM25 and, if ``vector`` is given, embedding similarity.
+    """
+    rankings = [search_index.get().search(query, candidates, kind=kind)]
+    if vector is not None and np.any(vector):
+        rankings.append(vector_ranking(vector, candidates, kind=kind))
+    return [(doc[0], doc[1], score) for doc, score in fuse(rankings, k)]
@@ -0,0 +1,255 @@
+"""Embedding indexes shared between processes through memory-mapped files.
+
+The embedding job (in-process scheduler or ``embedding_worker``) builds the
+event index from the database and ``publish``es it as one *generation*: an
+ids file, a float32 matrix and a meta column, all ``.npy``, named after the
+generation number. A small JSON manifest naming the current generation is
+then swapped in with ``os.replace``, so readers see either the old or the new
+generation, never a half-written one.
+
+Web workers ``attach`` to the current generation with ``np.load(mmap_mode='r')``:
+every worker maps the same pages, nothing is copied, and a restarted worker
+serves recommendations as soon as it has mapped the files instead of
+rebuilding the index from the database. ``SharedLazyIndex`` checks the
+manifest every ``MANIFEST_CHECK_INTERVAL`` seconds and re-attaches when a new
+generation appears. Rows changed in this process since the generation was
+written (signals) are kept in a small private overlay.
+
+Changes made by other processes (deletes, ``end_date`` updates from the admin
+or from ingestion) only reach a worker through a new generation, so the
+embedding job republishes at least every ``REPUBLISH_INTERVAL`` seconds even
+when it has nothing to embed. A generation older than
+``MAX_GENERATION_AGE`` means no embedding job is running; workers then
+ignore it and rebuild from the database like a plain ``LazyIndex``.
+
+The user index is shared the same way, in the IVF format (see
+``ivf.SharedLazyIVFIndex``). Enabled by setting ``TFAPP_SHARED_INDEX_DIR``.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from .index import INDEX_MAX_AGE, EmbeddingIndex, LazyIndex
+from .token_cache import write_atomically
+
+# Seconds between two looks at a shared index manifest
+MANIFEST_CHECK_INTERVAL = 5
+# Seconds after which the embedding job publishes a generation again
+REPUBLISH_INTERVAL = INDEX_MAX_AGE
+# Generations older than this (seconds) are not attached to
+MAX_GENERATION_AGE = 3 * REPUBLISH_INTERVAL
+# Generations kept on disk; older ones are deleted after a publish
+KEEP_GENERATIONS = 2
+
+
+def encode_ids(ids):
+    """Ids as an array ``np.save`` can write without pickling."""
+    if all(isinstance(pk, uuid.UUID) for pk in ids):
+        return 'uuid', np.frombuffer(b''.join(pk.bytes for pk in ids), dtype=np.uint8).reshape(-1, 16)
+    return 'str', np.array([str(pk) for pk in ids], dtype=str)
+
+
+def decode_ids(id_type, encoded):
+    ids = np.empty(len(encoded), dtype=object)
+    if id_type == 'uuid':
+        ids[:] = [uuid.UUID(bytes=row.tobytes()) for row in encoded]
+    else:
+        ids[:] = [str(pk) for pk in encoded]
+    return ids
+
+
+def _manifest_path(directory, name):
+    return os.path.join(directory, f'{name}.json')
+
+
+def _generation_files(directory, name, generation):
+    prefix = os.path.join(directory, f'{name}.{generation}')
+    return {'ids': prefix + '.ids.npy', 'matrix': prefix + '.matrix.npy', 'meta': prefix + '.meta.npy'}
+
+
+def read_manifest(directory, name):
+    try:
+        with open(_manifest_path(directory, name), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def generation_age(manifest):
+    """Seconds since the generation named by ``manifest`` was published."""
+    return time.time() - manifest['generation'] / 1e9
+
+
+def publish(directory, name, index):
+    """Write ``index`` as a new generation and make it current. Returns the generation."""
+    with index._lock:
+        id_type, ids = encode_ids(list(index.ids))
+        matrix = np.array(index.matrix, dtype=np.float32)
+        meta = np.array(index.meta, dtype=np.float64)
+    generation = time.time_ns()
+    files = _generation_files(directory, name, generation)
+    os.makedirs(directory, exist_ok=True)
+    # Private temporary names: several processes may publish at once
+    for key, array in (('ids', ids), ('matrix', matrix), ('meta', meta)):
+        write_atomically(files[key], lambda f, array=array: np.save(f, array))
+    manifest = {'generation': generation, 'id_type': id_type, 'count': len(ids), 'dim': index.dim}
+    write_atomically(_manifest_path(directory, name), lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+    prune_generations(directory, name, generation)
+    return generation
+
+
+def prune_generations(directory, name, current):
+    """Delete the ``<name>.<generation>.*.npy`` files of all but the newest generations."""
+    # Readers may still map the previous generation; keep a few around.
+    # (On POSIX, deleting a mapped file doesn't affect existing maps.)
+    generations = {}
+    for filename in os.listdir(directory):
+        parts = filename.split('.')
+        if len(parts) == 4 and parts[0] == name and parts[1].isdigit() and parts[3] == 'npy':
+            generations.setdefault(int(parts[1]), []).append(filename)
+    for generation in sorted(generations, reverse=True)[KEEP_GENERATIONS:]:
+        if generation == current:
+            continue
+        for filename in generations[generation]:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                pass
+
+
+def attach(directory, name, manifest=None):
+    """Map the current generation read-only; returns ``(index, generation)`` or None."""
+    manifest = manifest or read_manifest(directory, name)
+    if manifest is None:
+        return None
+    files = _generation_files(directory, name, manifest['generation'])
+    try:
+        ids = decode_ids(manifest['id_type'], np.load(files['ids']))
+        matrix = np.load(files['matrix'], mmap_mode='r')
+        meta = np.load(files['meta'], mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    return EmbeddingIndex.from_arrays(ids, matrix, meta), manifest['generation']
+
+
+class SharedIndex:
+    """A read-only published generation plus a private overlay of local changes."""
+
+    def __init__(self, base, published_generation=None):
+        self.base = base
+        self.published_generation = published_generation
+        self.dim = base.dim
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = EmbeddingIndex(base.dim)
+        # pks whose base row is outdated (changed or removed locally)
+        self._hidden = set()
+
+    def __len__(self):
+        return len(self.base) + sum(1 for pk in self._local.ids if pk not in self.base)
+
+    def __contains__(self, pk):
+        return pk in self._local or (pk in self.base and pk not in self._hidden)
+
+    @property
+    def generation(self):
+        return (self.published_generation, self._local.generation)
+
+    def upsert(self, ids, vectors, meta=None):
+        ids = list(ids)
+        with self._lock:
+            self._hidden.update(ids)
+        self._local.upsert(ids, vectors, meta)
+
+    def remove(self, ids):
+        ids = list(ids)
+        with self._lock:
+            self._hidden.update(ids)
+        self._local.remove(ids)
+
+    def meta_of(self, pks):
+        local = self._local.meta_of(pks)
+        base = self.base.meta_of(pks)
+        return [l if pk in self._local else b for pk, l, b in zip(pks, local, base)]
+
+    def search(self, query, k, where=None, exclude=(), include=None):
+        with self._lock:
+            hidden = set(self._hidden)
+        hits = self.base.search(query, k, where=where, exclude=hidden.union(exclude), include=include)
+        hits += self._local.search(query, k, where=where, exclude=exclude, include=include)
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:k]
+
+
+class SharedLazyIndex(LazyIndex):
+    """LazyIndex that attaches to published generations instead of querying the database.
+
+    Falls back to building from the database while nothing (recent) is
+    published.
+    """
+
+    def __init__(self, queryset, row, directory, name, index_class=EmbeddingIndex):
+        # Published event generations are always plain float32 matrices
+        super().__init__(queryset, row, index_class=index_class)
+        self.directory = directory
+        self.name = name
+        self._checked_at = 0.0
+
+    def current_manifest(self):
+        """Manifest of the current generation, or None if there is none recent enough."""
+        manifest = read_manifest(self.directory, self.name)
+        if manifest is None or generation_age(manifest) >= MAX_GENERATION_AGE:
+            return None
+        return manifest
+
+    def build(self):
+        manifest = self.current_manifest()
+        attached = attach(self.directory, self.name, manifest) if manifest is not None else None
+        if attached is None:
+            return SharedIndex(super().build())
+        return SharedIndex(*attached)
+
+    def _is_stale(self, index):
+        now = time.monotonic()
+        if now - self._checked_at < MANIFEST_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        manifest = self.current_manifest()
+        if manifest is None:
+            return super()._is_stale(index)
+        return manifest['generation'] != index.published_generation
+
+    def publish(self):
+        """Build from the database, publish a new generation and switch to it."""
+        generation = publish(self.directory, self.name, LazyIndex.build(self))
+        attached = attach(self.directory, self.name)
+        if attached is not None:
+            # Search the new generation right away, so results this process
+            # caches (precompute_recommendations) carry the version web
+            # workers will see. Skipped while a rebuild is replaying updates.
+            with self._lock:
+                if self._pending is None:
+                    self._index = SharedIndex(*attached)
+        return generation
+
+
+def publish_shared_indexes(force=True):
+    """Publish the shared event and user indexes, if ``TFAPP_SHARED_INDEX_DIR`` is set.
+
+    With ``force=False`` only publishes indexes whose current generation is
+    missing or older than ``REPUBLISH_INTERVAL``; the embedding job calls it
+    that way whenever it is idle.
+    """
+    from .index import event_index, user_index
+
+    for lazy_index in (event_index, user_index):
+        if not isinstance(lazy_index, SharedLazyIndex):
+            continue
+        manifest = read_manifest(lazy_index.directory, lazy_index.name)
+        if not force and manifest is not None and generation_age(manifest) < REPUBLISH_INTERVAL:
+            continue
+        lazy_index.publish()
@@ -0,0 +1,226 @@
+"""Token -> word-vector cache in front of the fastText model.
+
+The same vocabulary ("python", "ml", "react", hackathon boilerplate) shows up
+in almost every bio, description and skill list, so re-embedding an entity
+mostly asks the model for vectors it has already produced. ``TokenVectorCache``
+keeps a bounded LRU of those vectors in the process and can persist the most
+frequent ones to an on-disk store (a ``.npy`` matrix plus a ``.json`` token
+list) that is opened memory-mapped, so a restarted worker starts warm.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+# Maximum number of token vectors kept in the in-process LRU
+TOKEN_CACHE_SIZE = 50_000
+# Number of most frequent tokens written to the on-disk store
+TOKEN_STORE_TOP_N = 20_000
+# Store generations kept on disk; readers may still map the previous one
+KEEP_STORE_GENERATIONS = 2
+
+
+def write_atomically(path, write):
+    """Call ``write(file)`` on a private temporary file, then move it to ``path``."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class TokenVectorCache:
+    """Bounded LRU of token vectors with an optional memory-mapped store.
+
+    Lookups check the LRU first, then the on-disk store, and only then ask
+    the model. ``hits``, ``store_hits`` and ``misses`` count token lookups.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, store_path=None, store_tag=''):
+        self.maxsize = maxsize
+        self.store_path = store_path
+        # Identifies the model the vectors came from; a store written for a
+        # different model is ignored.
+        self.store_tag = store_tag
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._counts = Counter()
+        self._store_rows = {}
+        self._store_vectors = None
+        self._store_dirty = False
+        if store_path:
+            self.load_store()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def get_vectors(self, tokens, model):
+        """Return a float32 array with one row per token in ``tokens``."""
+        tokens = list(tokens)
+        rows = [None] * len(tokens)
+        missing = []
+        with self._lock:
+            self._counts.update(tokens)
+            for i, token in enumerate(tokens):
+                vec = self._lru.get(token)
+                if vec is not None:
+                    self._lru.move_to_end(token)
+                    self.hits += 1
+                    rows[i] = vec
+                    continue
+                pos = self._store_rows.get(token)
+                if pos is not None:
+                    vec = np.array(self._store_vectors[pos], dtype=np.float32)
+                    self._put(token, vec)
+                    self.store_hits += 1
+                    rows[i] = vec
+                    continue
+                missing.append(i)
+            self.misses += len(missing)
+            self._trim_counts()
+        # Ask the model outside the lock; lookups can be slow.
+        for i in missing:
+            rows[i] = np.asarray(model.get_word_vector(tokens[i]), dtype=np.float32)
+        if missing:
+            with self._lock:
+                for i in missing:
+                    self._put(tokens[i], rows[i])
+                self._store_dirty = True
+        if not rows:
+            return np.zeros((0, 300), dtype=np.float32)
+        return np.stack(rows)
+
+    def _put(self, token, vec):
+        self._lru[token] = vec
+        self._lru.move_to_end(token)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def _trim_counts(self):
+        # Frequencies only rank tokens for the store; keep the table bounded.
+        if len(self._counts) > 4 * self.maxsize:
+            self._counts = Counter(dict(self._counts.most_common(self.maxsize)))
+
+    def stats(self):
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            'size': len(self._lru),
+            'maxsize': self.maxsize,
+            'store_size': len(self._store_rows),
+            'hits': self.hits,
+            'store_hits': self.store_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.store_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._counts.clear()
+            self.hits = self.store_hits = self.misses = 0
+
+    # --- On-disk store ---
+    #
+    # Each save writes ``<store_path>.<generation>.npy`` and then swaps in
+    # the ``<store_path>.json`` manifest naming that generation and its
+    # tokens, so the vectors and the token list always change together.
+
+    def _manifest_path(self):
+        return self.store_path + '.json'
+
+    def _vectors_path(self, generation):
+        return f'{self.store_path}.{generation}.npy'
+
+    def load_store(self):
+        """Open the on-disk store memory-mapped; missing or stale stores are ignored."""
+        try:
+            with open(self._manifest_path(), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('tag') != self.store_tag:
+                return False
+            vectors = np.load(self._vectors_path(meta['generation']), mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return False
+        tokens = meta.get('tokens', [])
+        if len(tokens) != len(vectors):
+            return False
+        with self._lock:
+            self._store_vectors = vectors
+            self._store_rows = {t: i for i, t in enumerate(tokens)}
+        return True
+
+    def save_store(self, top_n=TOKEN_STORE_TOP_N):
+        """Write the ``top_n`` most frequent cached tokens to the on-disk store.
+
+        Tokens seen by this process come first, by frequency; the rest of
+        the slots keep the previous store's tokens in their order, so a
+        restarted worker doesn't drop the ones it hasn't looked up yet.
+        Several workers may save at once: every file is written under a
+        private temporary name and the manifest is swapped in last.
+        """
+        if not self.store_path:
+            return 0
+        with self._lock:
+            if not self._store_dirty:
+                return len(self._store_rows)
+            tokens, vectors = [], []
+            for token, _ in self._counts.most_common():
+                vec = self._lru.get(token)
+                if vec is None and token in self._store_rows:
+                    vec = np.array(self._store_vectors[self._store_rows[token]], dtype=np.float32)
+                if vec is None:
+                    continue
+                tokens.append(token)
+                vectors.append(vec)
+                if len(tokens) >= top_n:
+                    break
+            if len(tokens) < top_n and self._store_rows:
+                chosen = set(tokens)
+                for token, pos in self._store_rows.items():
+                    if token in chosen:
+                        continue
+                    tokens.append(token)
+                    vectors.append(np.array(self._store_vectors[pos], dtype=np.float32))
+                    if len(tokens) >= top_n:
+                        break
+            self._store_dirty = False
+        if not tokens:
+            return 0
+        generation = time.time_ns()
+        os.makedirs(os.path.dirname(self.store_path) or '.', exist_ok=True)
+        matrix = np.stack(vectors).astype(np.float32)
+        write_atomically(self._vectors_path(generation), lambda f: np.save(f, matrix))
+        manifest = {'tag': self.store_tag, 'generation': generation, 'tokens': tokens}
+        write_atomically(self._manifest_path(), lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+        self._prune_store(generation)
+        self.load_store()
+        return len(tokens)
+
+    def _prune_store(self, current):
+        directory = os.path.dirname(self.store_path) or '.'
+        prefix = os.path.basename(self.store_path) + '.'
+        generations = set()
+        for filename in os.listdir(directory):
+            middle = filename[len(prefix):-len('.npy')]
+            if filename.startswith(prefix) and filename.endswith('.npy') and middle.isdigit():
+                generations.add(int(middle))
+        for generation in sorted(generations, reverse=True)[KEEP_STORE_GENERATIONS:]:
+            if generation == current:
+                continue
+            try:
+                os.remove(self._vectors_path(generation))
+            except OSError:
+                pass
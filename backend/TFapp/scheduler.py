@@ -1,12 +1,12 @@
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from django.utils import timezone
-from datetime import datetime
-from django.db import transaction
-from .Scraping.Webscrap import Confirmation, fetch_kaggle_events, ensure_timezone_aware
-from .Scraping.DevpostScrap import fetch_devpost_filtered_events, ensure_timezone_aware as en
-from .recommendation.fasttext import load_model, calculate_and_update_embeddings
+from django.conf import settings
+from collections import Counter, defaultdict
+from .Scraping.sources import fetch_pages
+from .Scraping.http_cache import reset as reset_http_cache
+from .recommendation.fasttext import get_provider, calculate_and_update_embeddings
+from .recommendation.provider import WordVectorsUnavailable
 
 
 logger = logging.getLogger(__name__)
@@ -14,51 +14,46 @@ logger = logging.getLogger(__name__)
 # Module-level scheduler reference so we only start once
 _scheduler = None
 
-def scrape_events():
-    """Placeholder scraping job.
+def scrape_events(sources=None):
+    """Fetch events from every registered source and ingest them in bulk.
 
-    Replace the body of this function with real scraping logic. For now it
-    creates a simple Event entry so you can see the periodic job working.
+    Sources and their pages are fetched concurrently (see
+    Scraping/sources.py); each page is ingested as soon as it arrives.
+    Ingestion is idempotent (see ingestion.ingest_events): known events are
+    matched on their source key, new ones inserted and changed ones updated.
+    Pages that have not changed since the last pass (HTTP 304, or an
+    identical Kaggle payload) are skipped without touching the database, and
+    unchanged items of a changed page cost one digest lookup.
+    Returns the per-source counts.
     """
-    logger.info("Running scrape_events_placeholder job")
+    logger.info("Running scrape_events job")
+    # Local import to avoid import-time model access before Django is ready
+    from .ingestion import ingest_events
+
     try:
-        kaggle_events = fetch_kaggle_events()
-        devpost_events = fetch_devpost_filtered_events()
-        # Local import to avoid import-time model access before Django is ready
-        from .models import Event
-        name = f"Scraped Event {timezone.now().isoformat()}"
+        counts = defaultdict(Counter)
+        for source, page, events in fetch_pages(sources):
+            if events is None:
+                # 304 / identical payload: nothing to ingest for this page
+                counts[source]['not_modified'] += 1
+                continue
+            counts[source].update(ingest_events(source, events))
+        counts = {source: dict(c) for source, c in counts.items()}
+        logger.info("Scraped events: %s", counts)
+        return counts
+    except Exception:
+        logger.exception("Error while running scrape_events")
+        # Don't let a failed pass be skipped as "not modified" next time
+        reset_http_cache()
 
-        # Use centralized helper from Webscrap to normalize datetimes
 
-        with transaction.atomic():
-            for ev in kaggle_events:
-                if Event.objects.filter(location=ev["id"]).exists():
-                    continue
-                start = ensure_timezone_aware(ev.get("startDate"))
-                end = ensure_timezone_aware(ev.get("submissionsDeadline"))
-                Event.objects.create(
-                    name=ev["title"],
-                    description=ev.get("description", ""),
-                    start_date=start,
-                    end_date=end,
-                    location=ev["id"],
-                )
-            for dv in devpost_events:
-                if Event.objects.filter(location=dv["id"]).exists():
-                    continue
-                start = en(dv.get("startDate"))
-                end = en(dv.get("submissionsDeadline"))
-                Event.objects.create(
-                    name=dv["title"],
-                    description=dv.get("description", ""),
-                    start_date=start,
-                    end_date=end,
-                    location=dv["id"],
-                )
-            logger.info("Created placeholder event: %s", name)
-        Confirmation()
-    except Exception:
-        logger.exception("Error while running scrape_events_placeholder")
+def update_embeddings():
+    """Run the embedding job; stop scheduling it once the word vectors failed to load."""
+    try:
+        calculate_and_update_embeddings()
+    except WordVectorsUnavailable:
+        logger.exception("Embedding job stopped")
+        _scheduler.remove_job("tfapp.update_recommendation_embeddings")
 
 
 def start_scheduler():
@@ -84,14 +79,19 @@ def start_scheduler():
         max_instances=1,
     )
 
-    load_model()
-    _scheduler.add_job(
-        calculate_and_update_embeddings,
-        trigger=IntervalTrigger(seconds=10),
-        id="tfapp.update_recommendation_embeddings",
-        replace_existing=True,
-        max_instances=1,
-    )
+    # Embeddings are computed by `manage.py embedding_worker` when one is
+    # deployed; otherwise drain the job queue from this process.
+    if not settings.TFAPP_EXTERNAL_EMBEDDING_WORKER:
+        # Load word vectors off the startup path; the embedding job skips its
+        # runs until the provider reports ready.
+        get_provider().load_in_background()
+        _scheduler.add_job(
+            update_embeddings,
+            trigger=IntervalTrigger(seconds=10),
+            id="tfapp.update_recommendation_embeddings",
+            replace_existing=True,
+            max_instances=1,
+        )
 
     _scheduler.start()
     print("Scheduler started.")
@@ -1,12 +1,120 @@
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
 from .models import Event, Team, Membership, User
 
-class EventSerializer(serializers.ModelSerializer):
+
+def requested_names(request, param):
+    """Comma-separated names given in query parameter ``param``."""
+    if request is None:
+        return set()
+    value = request.query_params.get(param, '')
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets for read responses.
+    - ``?fields=id,name`` returns only the listed fields.
+    - ``?expand=event`` replaces a related id with the nested object, using
+      the serializer class returned by ``Meta.expandable_fields[name]()``
+      (callables, so serializers defined further down can be named).
+    Unknown names in either parameter are rejected with a 400. Only the
+    top-level serializer of a response is affected; nested serializers
+    keep their full shape.
+
+    ``restrict_queryset`` loads only the columns the selected fields read.
+    Fields backed by model properties list the columns they need in
+    ``Meta.field_dependencies``.
+    """
+
+    def _is_response_root(self):
+        root = self.root
+        return root is self or (isinstance(root, serializers.ListSerializer) and root.child is self)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self._is_response_root():
+            return fields
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        expand = requested_names(request, 'expand')
+        unknown = expand - (set(expandable) & set(fields))
+        if unknown:
+            raise ValidationError({'expand': f"Cannot expand: {', '.join(sorted(unknown))}."})
+        for name in expand:
+            fields[name] = expandable[name]()(read_only=True)
+        only = requested_names(request, 'fields')
+        unknown = only - set(fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}."})
+        if only:
+            fields = {name: field for name, field in fields.items() if name in only}
+        return fields
+
+    def restrict_queryset(self, queryset):
+        """``queryset`` loading only the columns (and joins) the fields read."""
+        paths = set()
+        if not _column_paths(self, queryset.model, '', paths):
+            return queryset
+        # Join exactly the relations whose columns are read; any other
+        # select_related() would clash with only()
+        joins = {path.rsplit('__', 1)[0] for path in paths if '__' in path}
+        queryset = queryset.select_related(None)
+        if joins:
+            queryset = queryset.select_related(*joins)
+        return queryset.only(*paths)
+
+
+def _column_paths(serializer, model, prefix, paths):
+    """
+    Add the ``only()`` paths read by ``serializer``'s fields to ``paths``.
+    Returns False when some field's columns can't be determined.
+    """
+    dependencies = getattr(getattr(serializer, 'Meta', None), 'field_dependencies', {})
+    for name, field in serializer.fields.items():
+        if name in dependencies:
+            paths.update(prefix + column for column in dependencies[name])
+            continue
+        if field.source == '*':
+            return False
+        attrs = field.source.split('.')
+        try:
+            model_field = model._meta.get_field(attrs[0])
+        except FieldDoesNotExist:
+            return False
+        if not model_field.concrete or model_field.many_to_many:
+            # Reverse and many-to-many relations are prefetched, not columns
+            continue
+        paths.add(prefix + attrs[0])
+        if model_field.is_relation and isinstance(field, serializers.Serializer):
+            if not _column_paths(field, model_field.related_model, f'{prefix}{attrs[0]}__', paths):
+                return False
+        elif len(attrs) > 1:
+            if not model_field.is_relation or len(attrs) > 2:
+                return False
+            paths.add(f'{prefix}{attrs[0]}__{attrs[1]}')
+    return True
+
+
+class EventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Event
-        fields = '__all__'  # Or specify the fields you want to expose
+        # The embedding and its dirty flag are internal and never exposed
+        fields = [
+            'id',
+            'name',
+            'description',
+            'start_date',
+            'end_date',
+            'location',
+            'created_at',
+        ]
 
-class TeamSerializer(serializers.ModelSerializer):
+class TeamSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
     event_name = serializers.CharField(source='event.name', read_only=True)  # Added field for event name
 
@@ -29,6 +137,9 @@ class TeamSerializer(serializers.ModelSerializer):
         ]
         # You can also mark property fields from the model as read_only here
         read_only_fields = ['current_size', 'is_full']
+        expandable_fields = {'event': lambda: EventSerializer, 'owner': lambda: PublicUserProfileSerializer}
+        # current_size comes from the accepted_count annotation
+        field_dependencies = {'current_size': (), 'is_full': ('max_size',)}
 
 class EventDetailSerializer(serializers.ModelSerializer):
     """
@@ -93,127 +204,108 @@ class TeamDetailSerializer(serializers.ModelSerializer):
             'has_been_invited'
         ]
 
+    def _membership_state(self, obj):
+        """
+        Fetch all memberships of the team once and partition them by status.
+        Uses the 'members' prefetch (with select_related('user')) when the
+        view provides it. The requesting user's own membership is looked up
+        in the same pass. Cached per team for the serializer's lifetime.
+        """
+        cache = self.__dict__.setdefault('_membership_states', {})
+        if obj.pk in cache:
+            return cache[obj.pk]
+
+        by_status = defaultdict(list)
+        memberships = obj.members.all()
+        if 'members' not in getattr(obj, '_prefetched_objects_cache', {}):
+            memberships = memberships.select_related('user')
+        for membership in memberships:
+            by_status[membership.status].append(membership)
+
+        # Get the request object from the serializer's context
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        authenticated = bool(user and user.is_authenticated)
+        own = None
+        if authenticated:
+            own = next(
+                (m for group in by_status.values() for m in group if m.user_id == user.pk),
+                None,
+            )
+        is_owner = authenticated and obj.owner_id == user.pk
+        is_accepted_member = own is not None and own.status == Membership.MemberStatus.ACCEPTED
+
+        state = {
+            'by_status': by_status,
+            'authenticated': authenticated,
+            'own': own,
+            # Owners and accepted members can see pending requests / invites
+            'is_insider': is_owner or is_accepted_member,
+        }
+        cache[obj.pk] = state
+        return state
+
     def get_approved_members(self, obj):
         """
         Gets all 'ACCEPTED' members for this team.
         'obj' is the Team instance.
         """
-        # 'members' is the related_name from Membership.team
-        accepted_memberships = obj.members.filter(
-            status=Membership.MemberStatus.ACCEPTED
-        )
+        state = self._membership_state(obj)
         # Serialize the list of Membership objects
-        return MembershipSerializer(accepted_memberships, many=True).data
+        return MembershipSerializer(state['by_status'][Membership.MemberStatus.ACCEPTED], many=True).data
 
     def get_pending_requests(self, obj):
         """
         Gets all 'PENDING' members, but only if the user making
         the request is already an accepted member or the owner.
         """
-        # Get the request object from the serializer's context
-        request = self.context.get('request')
+        state = self._membership_state(obj)
 
         # If we can't get a user, return an empty list
-        if not request or not hasattr(request, 'user') or not request.user.is_authenticated:
+        if not state['authenticated']:
             return []
 
-        user = request.user
-        
-        # Permission check: Is the current user the owner?
-        is_owner = (obj.owner == user)
-        
-        # Permission check: Is the current user an accepted member?
-        is_accepted_member = obj.members.filter(
-            user=user, 
-            status=Membership.MemberStatus.ACCEPTED
-        ).exists()
-
-        pending_memberships = obj.members.filter(
-            status=Membership.MemberStatus.PENDING
-        )
         # If they are the owner OR an accepted member, show pending requests
-        if is_owner or is_accepted_member:
-            return MembershipSerializer(pending_memberships, many=True).data
-        
+        if state['is_insider']:
+            return MembershipSerializer(state['by_status'][Membership.MemberStatus.PENDING], many=True).data
 
         # If the requesting user has their own pending request, return only that
-        user_pending = pending_memberships.filter(user=user)
-        if user_pending.exists():
-            return MembershipSerializer(user_pending, many=True).data
+        own = state['own']
+        if own is not None and own.status == Membership.MemberStatus.PENDING:
+            return MembershipSerializer([own], many=True).data
 
         # Otherwise, return an empty list
         return []
-    
+
     def get_pending_invites(self, obj):
         """
         Gets all 'INVITED' members, but only if the user making
         the request is already an accepted member or the owner.
         """
-        # Get the request object from the serializer's context
-        request = self.context.get('request')
-
-        # If we can't get a user, return an empty list
-        if not request or not hasattr(request, 'user') or not request.user.is_authenticated:
-            return []
-
-        user = request.user
-        
-        # Permission check: Is the current user the owner?
-        is_owner = (obj.owner == user)
-        
-        # Permission check: Is the current user an accepted member?
-        is_accepted_member = obj.members.filter(
-            user=user, 
-            status=Membership.MemberStatus.ACCEPTED
-        ).exists()
+        state = self._membership_state(obj)
 
         # If they are the owner OR an accepted member, show pending invites
-        if is_owner or is_accepted_member:
-            invited_memberships = obj.members.filter(
-                status=Membership.MemberStatus.INVITED
-            )
-            return MembershipSerializer(invited_memberships, many=True).data
+        if state['authenticated'] and state['is_insider']:
+            return MembershipSerializer(state['by_status'][Membership.MemberStatus.INVITED], many=True).data
 
         # Otherwise, return an empty list
         return []
-    
+
     def get_has_been_rejected(self, obj):
         """
         return true if the requesting user has been rejected from this team.
         """
-        request = self.context.get('request')
-
-        # If we can't get a user, return an empty list
-        if not request or not hasattr(request, 'user') or not request.user.is_authenticated:
-            return False
+        own = self._membership_state(obj)['own']
+        return own is not None and own.status == Membership.MemberStatus.REJECTED
 
-        user = request.user
-        is_rejected_member = obj.members.filter(
-            user=user, 
-            status=Membership.MemberStatus.REJECTED
-        ).exists()
-
-        return is_rejected_member
-    
     def get_has_been_invited(self, obj):
         """
         return true if the requesting user has been invited to this team.
         """
-        request = self.context.get('request')
-
-        # If we can't get a user, return an empty list
-        if not request or not hasattr(request, 'user') or not request.user.is_authenticated:
-            return False
-
-        user = request.user
-        is_invited_member = obj.members.filter(
-            user=user, 
-            status=Membership.MemberStatus.INVITED
-        ).exists()
+        own = self._membership_state(obj)['own']
+        return own is not None and own.status == Membership.MemberStatus.INVITED
 
-        return is_invited_member
-            
-class MembershipSerializer(serializers.ModelSerializer):
+class MembershipSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Expose the username of the related user for convenience in API responses
     username = serializers.CharField(source='user.username', read_only=True)
     class Meta:
@@ -230,6 +322,7 @@ class MembershipSerializer(serializers.ModelSerializer):
             'username',
         ]
         read_only_fields = ['username', 'joined_at']
+        expandable_fields = {'team': lambda: TeamSerializer, 'user': lambda: PublicUserProfileSerializer}
 
 from django.contrib.auth import get_user_model
 
@@ -247,7 +340,7 @@ class UserDetailsSerializer(serializers.ModelSerializer):
         fields = ('pk', 'username', 'email', 'first_name', 'last_name', 'profile_picture')
         read_only_fields = ('email', 'profile_picture', ) # Email should not be updatable through this serializer
 
-class PublicUserProfileSerializer(serializers.ModelSerializer):
+class PublicUserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for public-facing user profile data.
     """
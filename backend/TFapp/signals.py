@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_response_generation
+from .ingestion import SCRAPED_FIELDS
+from .models import Event, Membership, Team, User
+from .recommendation.index import (
+    remove_from_event_index,
+    remove_from_team_index,
+    remove_from_user_index,
+    update_event_index,
+    update_team_index,
+    update_user_index,
+)
+from .recommendation.jobs import enqueue_embedding_jobs
+from .recommendation.search import remove_from_search_index, update_search_index
+from .tags import sync_tags
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    """Keep the in-memory event and search indexes in sync once the write is committed."""
+    transaction.on_commit(lambda: update_event_index([instance]))
+    transaction.on_commit(lambda: update_search_index([instance]))
+
+
+@receiver(pre_save, sender=Event)
+def forget_source_digest(sender, instance, update_fields=None, **kwargs):
+    """An event edited outside ingestion (admin, API) no longer matches its scraped item.
+
+    Saves that write ``source_digest`` themselves keep the value they set.
+    """
+    if update_fields is None:
+        instance.source_digest = ''
+    elif 'source_digest' not in update_fields and set(SCRAPED_FIELDS) & set(update_fields):
+        # Not among the saved fields, so clear it with a statement of its own
+        instance.source_digest = ''
+        Event.objects.filter(pk=instance.pk).update(source_digest='')
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: remove_from_event_index([pk]))
+    transaction.on_commit(lambda: remove_from_search_index('event', [pk]))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    """Keep the in-memory user index in sync (skips e.g. last_login updates)."""
+    if update_fields is not None and not {'embedding', 'is_active'} & set(update_fields):
+        return
+    transaction.on_commit(lambda: update_user_index([instance]))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: remove_from_user_index([pk]))
+
+
+@receiver(post_save, sender=Team)
+def team_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: update_team_index([instance]))
+    transaction.on_commit(lambda: update_search_index([instance]))
+
+
+@receiver(post_delete, sender=Team)
+def team_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: remove_from_team_index([pk]))
+    transaction.on_commit(lambda: remove_from_search_index('team', [pk]))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Team)
+def queue_embedding_job(sender, instance, **kwargs):
+    """Queue an embedding job for entities saved with their dirty flag set.
+
+    The job is inserted in the same transaction as the entity write.
+    """
+    if instance.embedding_needs_update:
+        enqueue_embedding_jobs(sender._meta.model_name, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Team)
+def sync_skill_tags(sender, instance, update_fields=None, **kwargs):
+    """Keep the normalized tag fields in line with the free-text skill fields."""
+    sync_tags(instance, update_fields)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_cached_responses(sender, **kwargs):
+    """Event responses embed teams and member counts; any of these writes stales them."""
+    transaction.on_commit(bump_response_generation)
@@ -0,0 +1,52 @@
+"""Opt-in SQLite tuning for single-node deployments (TFAPP_SQLITE_TUNING=1).
+
+With the default rollback journal a committing writer locks out every
+reader, so the scheduler's scrape and embedding transactions stall
+``/events/`` requests. ``tune_connection`` runs on every new SQLite
+connection (``connection_created``) and sets:
+
+- ``journal_mode=WAL``: readers keep reading the last committed snapshot
+  while a write is in progress; only writers serialize.
+- ``synchronous=NORMAL``: in WAL mode, fsync only at checkpoints. A power
+  loss may drop the last commits but never corrupts the database.
+- ``mmap_size`` / ``cache_size``: read pages through a memory map and keep a
+  larger page cache per connection.
+- ``busy_timeout``: wait for the write lock instead of failing at once with
+  "database is locked".
+
+``settings.TFAPP_SQLITE_PRAGMAS`` overrides individual values. The effect
+can be measured with ``manage.py benchmark_sqlite_concurrency``.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative: size in KiB (64 MB)
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+def pragmas():
+    return {**DEFAULT_PRAGMAS, **getattr(settings, 'TFAPP_SQLITE_PRAGMAS', {})}
+
+
+def tune_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def install():
+    """Tune every SQLite connection opened from now on."""
+    connection_created.connect(tune_connection, dispatch_uid='tfapp_sqlite_tuning')
+
+
+def uninstall():
+    connection_created.disconnect(dispatch_uid='tfapp_sqlite_tuning')
@@ -0,0 +1,57 @@
+"""Parsing of the free-text skill lists into normalized Tag rows.
+
+`User.skills`, `User.interests` and `Team.required_skills` stay the source
+of truth (they are what users type and see); on every save their parsed
+tags are mirrored into the `skill_tags`, `interest_tags` and `required_tags`
+many-to-many fields, so matching can work on integer tag ids.
+"""
+import re
+
+from .models import Tag
+
+# Longest tag kept (Tag.name max_length)
+MAX_TAG_LENGTH = 50
+
+# text field -> tag field, per model
+TAG_FIELDS = {
+    'user': {'skills': 'skill_tags', 'interests': 'interest_tags'},
+    'team': {'required_skills': 'required_tags'},
+}
+
+_separators = re.compile(r'[,;\n]+')
+_spaces = re.compile(r'\s+')
+
+
+def normalize_tag(text):
+    """Lowercase, collapse whitespace and trim punctuation: ' Machine  Learning.' -> 'machine learning'."""
+    tag = _spaces.sub(' ', text.strip().lower()).strip(' .-_/')
+    return tag[:MAX_TAG_LENGTH]
+
+
+def parse_tags(text):
+    """Unique normalized tags of a comma-separated list, in order."""
+    tags = []
+    for part in _separators.split(text or ''):
+        tag = normalize_tag(part)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def tag_ids(names):
+    """Ids of the tags called ``names``, creating the missing ones."""
+    names = list(names)
+    if not names:
+        return []
+    Tag.objects.bulk_create([Tag(name=n) for n in names], ignore_conflicts=True)
+    ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    return [ids[n] for n in names]
+
+
+def sync_tags(instance, update_fields=None):
+    """Mirror the text skill fields of a User or Team into its tag fields."""
+    fields = TAG_FIELDS.get(instance._meta.model_name, {})
+    for text_field, tag_field in fields.items():
+        if update_fields is not None and text_field not in update_fields:
+            continue
+        getattr(instance, tag_field).set(tag_ids(parse_tags(getattr(instance, text_field))))
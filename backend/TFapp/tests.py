@@ -1,3 +1,934 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+from django.core import serializers
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .Scraping.http_cache import reset as reset_http_cache
+from .fields import FLOAT32_LE
+from .Scraping.sources import DevpostSource, fetch_pages
+from .ingestion import ingest_events
+from .models import EmbeddingJob, Event, Membership, Team, User
+from .pagination import PAGE_SIZE
+from .query_plans import explain_hot_queries, full_scans
+from .recommendation import fasttext, index, recommendations, search
+from .recommendation.ivf import IVFIndex
+from .recommendation.jobs import ABANDONED_ERROR, CLAIM_TIMEOUT, MAX_ATTEMPTS, claim_jobs, process_jobs
+from .recommendation.pq import PQIndex
+from .recommendation.provider import PrunedVectorProvider, export_pruned_vectors
+from .recommendation.shared import (
+    MAX_GENERATION_AGE,
+    REPUBLISH_INTERVAL,
+    SharedLazyIndex,
+    publish_shared_indexes,
+    read_manifest,
+)
+from .recommendation.token_cache import TokenVectorCache
+from .scheduler import scrape_events
+from .serializers import TeamSerializer
+from .tags import MAX_TAG_LENGTH, parse_tags
+
+
+class FakeWordVectors:
+    """Stands in for a fastText model: a distinct vector per token, counting lookups."""
+
+    def __init__(self):
+        self.lookups = 0
+
+    def get_word_vector(self, token):
+        self.lookups += 1
+        return np.full(300, float(len(token)), dtype=np.float32)
+
+
+class AppSignalsTests(TestCase):
+    def test_saving_a_dirty_user_enqueues_an_embedding_job(self):
+        self.assertTrue(post_save.has_listeners(User))
+        user = User.objects.create_user(
+            username='clean', email='clean@example.com', password='x', embedding_needs_update=False,
+        )
+        self.assertFalse(EmbeddingJob.objects.filter(entity_id=user.pk).exists())
+
+        user.mark_embedding_dirty()
+        user.save()
+        job = EmbeddingJob.objects.get(entity_id=user.pk)
+        self.assertEqual(job.entity_type, EmbeddingJob.EntityType.USER)
+
+
+class Float32VectorFieldTests(TestCase):
+    def setUp(self):
+        self.vector = np.linspace(-1, 1, 300, dtype=np.float32)
+        now = timezone.now()
+        self.event = Event.objects.create(
+            name='e', description='d', start_date=now, end_date=now, location='l', embedding=self.vector.tolist(),
+        )
+        self.field = Event._meta.get_field('embedding')
+
+    def test_stored_as_packed_float32_and_read_back_as_a_read_only_view(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT embedding FROM "TFapp_event" WHERE id = %s', [self.event.pk.hex])
+            stored = bytes(cursor.fetchone()[0])
+        self.assertEqual(stored, self.vector.astype(FLOAT32_LE).tobytes())
+
+        loaded = Event.objects.get(pk=self.event.pk).embedding
+        self.assertEqual(loaded.dtype, FLOAT32_LE)
+        self.assertFalse(loaded.flags.writeable)
+        self.assertIsInstance(loaded.base, bytes)
+        np.testing.assert_array_equal(loaded, self.vector)
+
+    def test_serialization_round_trip(self):
+        text = self.field.value_to_string(self.event)
+        np.testing.assert_array_equal(self.field.to_python(text), self.vector)
+        data = serializers.serialize('json', [self.event])
+        restored = next(serializers.deserialize('json', data)).object
+        np.testing.assert_array_equal(restored.embedding, self.vector)
+
+    def test_null(self):
+        self.assertIsNone(self.field.to_python(None))
+        self.assertIsNone(self.field.get_prep_value(None))
+        self.assertIsNone(self.field.from_db_value(None, None, connection))
+
+
+class EmbeddingBlobMigrationTests(TransactionTestCase):
+    before = [('TFapp', '0007_alter_event_embedding_needs_update_and_more')]
+    after = [('TFapp', '0008_embedding_float32_blob')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('TFapp'))
+
+    def test_json_embeddings_move_to_blobs_and_back(self):
+        apps = self.migrate(self.before)
+        now = timezone.now()
+        short = apps.get_model('TFapp', 'Event').objects.create(
+            name='short', description='d', start_date=now, end_date=now, location='l', embedding=[0.5, -2.0],
+        ).pk
+
+        apps = self.migrate(self.after)
+        embedding = apps.get_model('TFapp', 'Event').objects.get(pk=short).embedding
+        self.assertEqual(embedding.dtype, FLOAT32_LE)
+        self.assertEqual(embedding.shape, (300,))
+        np.testing.assert_array_equal(embedding[:3], [0.5, -2.0, 0.0])
+
+        apps = self.migrate(self.before)
+        embedding = apps.get_model('TFapp', 'Event').objects.get(pk=short).embedding
+        self.assertEqual(embedding[:3], [0.5, -2.0, 0.0])
+        self.assertEqual(len(embedding), 300)
+
+
+class TokenVectorCacheStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, 'tokens')
+
+    def test_restart_keeps_tokens_not_seen_since(self):
+        first = TokenVectorCache(store_path=self.path, store_tag='model')
+        first.get_vectors(['python', 'django', 'numpy'], FakeWordVectors())
+        self.assertEqual(first.save_store(), 3)
+
+        # A restarted worker that only looks up one old and one new token
+        second = TokenVectorCache(store_path=self.path, store_tag='model')
+        model = FakeWordVectors()
+        second.get_vectors(['python', 'react'], model)
+        self.assertEqual(model.lookups, 1)
+        self.assertEqual(second.save_store(), 4)
+
+        third = TokenVectorCache(store_path=self.path, store_tag='model')
+        self.assertEqual(third.stats()['store_size'], 4)
+        vectors = third.get_vectors(['numpy', 'react'], FakeWordVectors())
+        self.assertEqual(third.store_hits, 2)
+        np.testing.assert_array_equal(vectors[:, 0], [5.0, 5.0])
+
+    def test_saves_leave_one_manifest_and_recent_generations(self):
+        cache = TokenVectorCache(store_path=self.path, store_tag='model')
+        for token in ('a', 'bb', 'ccc', 'dddd'):
+            cache.get_vectors([token], FakeWordVectors())
+            cache.save_store()
+        files = sorted(os.listdir(self.directory))
+        self.assertIn('tokens.json', files)
+        self.assertEqual(len([f for f in files if f.endswith('.npy')]), 2)
+        self.assertFalse([f for f in files if f.endswith('.tmp')])
+
+    def test_store_of_another_model_is_ignored(self):
+        cache = TokenVectorCache(store_path=self.path, store_tag='model')
+        cache.get_vectors(['python'], FakeWordVectors())
+        cache.save_store()
+        other = TokenVectorCache(store_path=self.path, store_tag='other-model')
+        self.assertEqual(other.stats()['store_size'], 0)
+
+
+class PrunedVectorExportTests(SimpleTestCase):
+    def test_export_round_trip_leaves_no_temporary_files(self):
+        class Model(FakeWordVectors):
+            def get_words(self):
+                return ['python', 'go', 'rust']
+
+            def get_dimension(self):
+                return 300
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'vocab')
+        self.assertEqual(export_pruned_vectors(Model(), path, 2), 2)
+        self.assertEqual(sorted(os.listdir(directory.name)), ['vocab.json', 'vocab.npy'])
+        provider = PrunedVectorProvider(path)
+        self.assertEqual(provider.get_word_vector('Python')[0], 6.0)
+        self.assertFalse(provider.get_word_vector('rust').any())
+
+
+class EmbeddingSpaceTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        space_path = os.path.join(directory.name, 'embedding_space.json')
+        patcher = mock.patch.object(fasttext, 'EMBEDDING_SPACE_PATH', space_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        now = timezone.now()
+        self.event = Event.objects.create(
+            name='Hack', description='d', start_date=now, end_date=now, location='l',
+            embedding_needs_update=False,
+        )
+
+    def provider(self, kind):
+        with override_settings(TFAPP_WORD_VECTORS=kind), mock.patch.object(fasttext, '_provider', None):
+            return fasttext.get_provider()
+
+    def test_switching_word_vectors_marks_embeddings_dirty(self):
+        self.assertFalse(fasttext.check_embedding_space(self.provider('fasttext')))
+        self.event.refresh_from_db()
+        self.assertFalse(self.event.embedding_needs_update)
+
+        self.assertTrue(fasttext.check_embedding_space(self.provider('pruned')))
+        self.event.refresh_from_db()
+        self.assertTrue(self.event.embedding_needs_update)
+        self.assertTrue(EmbeddingJob.objects.filter(entity_id=self.event.pk).exists())
+
+        # Recorded: the next check with the same vectors is a no-op
+        self.assertFalse(fasttext.check_embedding_space(self.provider('pruned')))
+
+    def test_unknown_word_vectors_setting_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.provider('pruned-vectors')
+
+
+class PoisonWordVectors(FakeWordVectors):
+    def get_word_vector(self, token):
+        if token == 'poison':
+            raise ValueError('cannot embed')
+        return super().get_word_vector(token)
+
+
+class EmbeddingJobFailureTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.good, self.bad = (
+            Event.objects.create(name=name, description='d', start_date=now, end_date=now, location='l')
+            for name in ('fine', 'poison')
+        )
+
+    def test_failing_job_does_not_block_the_batch_and_is_dead_lettered(self):
+        jobs = claim_jobs('test-worker')
+        self.assertEqual(process_jobs(jobs, PoisonWordVectors()), 1)
+        self.good.refresh_from_db()
+        self.assertFalse(self.good.embedding_needs_update)
+
+        job = EmbeddingJob.objects.get()
+        self.assertEqual(job.entity_id, self.bad.pk)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('cannot embed', job.last_error)
+        self.assertIsNone(job.failed_at)
+
+        # Out of attempts: recorded as failed and never claimed again
+        EmbeddingJob.objects.update(attempts=MAX_ATTEMPTS - 1, claimed_at=None)
+        process_jobs(claim_jobs('test-worker'), PoisonWordVectors())
+        job.refresh_from_db()
+        self.assertIsNotNone(job.failed_at)
+        self.assertEqual(claim_jobs('test-worker'), [])
+
+    def test_abandoned_claims_are_retried_then_dead_lettered(self):
+        def crash():
+            # The worker died holding its claim; let the claim expire
+            expired = timezone.now() - timedelta(seconds=CLAIM_TIMEOUT + 1)
+            EmbeddingJob.objects.update(claimed_at=expired)
+
+        self.assertEqual(len(claim_jobs('crashing-worker')), 2)
+        for attempt in range(2, MAX_ATTEMPTS + 1):
+            crash()
+            jobs = claim_jobs('other-worker')
+            self.assertEqual([job.attempts for job in jobs], [attempt, attempt])
+
+        crash()
+        self.assertEqual(claim_jobs('other-worker'), [])
+        self.assertFalse(EmbeddingJob.objects.filter(failed_at__isnull=True).exists())
+        self.assertEqual(set(EmbeddingJob.objects.values_list('last_error', flat=True)), {ABANDONED_ERROR})
+
+
+def scraped_item(key, title='Hack', days=1):
+    start = timezone.now().replace(microsecond=0)
+    return {
+        'id': key,
+        'title': title,
+        'description': 'Build things',
+        'startDate': start,
+        'submissionsDeadline': start + timedelta(days=days),
+    }
+
+
+class IngestEventsTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(index.event_index, '_index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ingest(self, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ingest_events('test', items)
+
+    def test_reingesting_a_batch_inserts_once_and_updates_changes(self):
+        items = [scraped_item('devpost:a'), scraped_item('devpost:b')]
+        self.assertEqual(self.ingest(items)['inserted'], 2)
+        counts = self.ingest(items)
+        self.assertEqual((counts['inserted'], counts['updated'], counts['unchanged']), (0, 0, 2))
+        self.assertEqual(Event.objects.count(), 2)
+
+        index.get_event_index()
+        moved = scraped_item('devpost:a', days=10)
+        counts = self.ingest([moved, scraped_item('devpost:b')])
+        self.assertEqual((counts['updated'], counts['unchanged']), (1, 1))
+        event = Event.objects.get(source_key='devpost:a')
+        self.assertEqual(event.end_date, moved['submissionsDeadline'])
+        # Bulk updates send no post_save; the index is patched on commit
+        self.assertEqual(index.get_event_index().meta_of([event.pk]), [event.end_date.timestamp()])
+
+    def test_unchanged_items_restore_edited_and_deleted_events(self):
+        items = [scraped_item('devpost:a', title='Original'), scraped_item('devpost:b')]
+        self.ingest(items)
+        edited = Event.objects.get(source_key='devpost:a')
+        edited.name = 'Edited in the admin'
+        edited.save()
+        Event.objects.filter(source_key='devpost:b').delete()
+
+        counts = self.ingest(items)
+        self.assertEqual((counts['inserted'], counts['updated']), (1, 1))
+        self.assertEqual(Event.objects.get(source_key='devpost:a').name, 'Original')
+        self.assertTrue(Event.objects.filter(source_key='devpost:b').exists())
+
+        # Just the digest lookup (between the test transaction's
+        # SAVEPOINT / RELEASE)
+        with self.assertNumQueries(3):
+            counts = ingest_events('test', items)
+        self.assertEqual(counts['unchanged'], 2)
+
+    def test_partial_saves_of_scraped_fields_forget_the_digest(self):
+        items = [scraped_item('devpost:a', title='Original'), scraped_item('devpost:b')]
+        self.ingest(items)
+        edited = Event.objects.get(source_key='devpost:a')
+        edited.name = 'Edited through the API'
+        edited.save(update_fields=['name', 'description'])
+        # Saves of other fields, or that set the digest on purpose, keep it
+        kept = Event.objects.get(source_key='devpost:b')
+        kept.save(update_fields=['embedding_needs_update'])
+        kept.name = 'Renamed with its digest'
+        kept.save(update_fields=['name', 'source_digest'])
+
+        self.assertEqual(Event.objects.get(pk=edited.pk).source_digest, '')
+        self.assertNotEqual(Event.objects.get(pk=kept.pk).source_digest, '')
+        counts = self.ingest(items)
+        self.assertEqual((counts['updated'], counts['unchanged']), (1, 1))
+        self.assertEqual(Event.objects.get(pk=edited.pk).name, 'Original')
+        self.assertEqual(Event.objects.get(pk=kept.pk).name, 'Renamed with its digest')
+
+    def test_long_source_keys_fit_their_columns(self):
+        key = 'https://devpost.example/' + 'x' * 300
+        self.assertEqual(self.ingest([scraped_item(key)])['inserted'], 1)
+        event = Event.objects.get()
+        self.assertEqual(len(event.source_key), Event._meta.get_field('source_key').max_length)
+        self.assertEqual(len(event.location), Event._meta.get_field('location').max_length)
+
+
+class StubDevpostHandler(BaseHTTPRequestHandler):
+    """Serves Devpost-shaped API pages: two hackathons per page, with an ETag."""
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+    failing_page = None
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            # Slow enough that sequential fetching would never overlap
+            time.sleep(0.05)
+            page = int(parse_qs(urlparse(self.path).query)['page'][0])
+            etag = f'"page-{page}"'
+            if page == cls.failing_page:
+                self.send_response(500)
+                self.end_headers()
+            elif self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+            else:
+                body = json.dumps({'hackathons': [
+                    {
+                        'title': f'Hackathon {page}-{i}',
+                        'url': f'https://devpost.example/{page}-{i}',
+                        'submission_period_dates': 'Oct 01 - Nov 05, 2030',
+                        'themes': [{'name': 'AI'}],
+                    }
+                    for i in range(2)
+                ]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ConcurrentScrapeTests(TestCase):
+    def setUp(self):
+        StubDevpostHandler.max_in_flight = 0
+        StubDevpostHandler.failing_page = None
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubDevpostHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.source = DevpostSource(base_url=f'http://127.0.0.1:{server.server_port}/api/hackathons', max_pages=4)
+        reset_http_cache()
+        self.addCleanup(reset_http_cache)
+
+    def test_pages_are_fetched_concurrently_and_merged(self):
+        counts = scrape_events([self.source])
+        self.assertEqual(counts, {'devpost': {'inserted': 8, 'updated': 0, 'unchanged': 0, 'skipped': 0}})
+        self.assertGreater(StubDevpostHandler.max_in_flight, 1)
+        self.assertEqual(
+            set(Event.objects.values_list('source_key', flat=True)),
+            {f'https://devpost.example/{page}-{i}' for page in range(1, 5) for i in range(2)},
+        )
+
+        # Second pass: every page answers 304 and nothing is written
+        counts = scrape_events([self.source])
+        self.assertEqual(counts, {'devpost': {'not_modified': 4}})
+        self.assertEqual(Event.objects.count(), 8)
+
+    def test_failing_page_does_not_stop_the_others(self):
+        StubDevpostHandler.failing_page = 2
+        with self.assertLogs('TFapp.Scraping.sources', 'ERROR'):
+            pages = {(name, page): events for name, page, events in fetch_pages([self.source])}
+        self.assertEqual(sorted(pages), [('devpost', 1), ('devpost', 3), ('devpost', 4)])
+        self.assertTrue(all(len(events) == 2 for events in pages.values()))
+
+
+class IVFIndexPersistenceTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, 'users')
+
+    def test_load_returns_the_latest_save(self):
+        rng = np.random.default_rng(0)
+        ivf = IVFIndex()
+        for n in (10, 20, 30):
+            ivf.upsert([f'user-{i}' for i in range(len(ivf), n)], rng.normal(size=(n - len(ivf), 300)))
+            generation = ivf.save(self.path)
+        loaded = IVFIndex.load(self.path)
+        self.assertEqual(loaded.published_generation, generation)
+        self.assertEqual(len(loaded), 30)
+        query = rng.normal(size=300)
+        self.assertEqual(loaded.search(query, 5), ivf.search(query, 5))
+        # Only the newest generations stay on disk, and no temporary files
+        files = os.listdir(self.directory)
+        self.assertEqual(len({f.split('.')[1] for f in files if f.endswith('.npy')}), 2)
+        self.assertFalse([f for f in files if f.endswith('.tmp')])
+
+    def test_loaded_index_accepts_local_changes(self):
+        ivf = IVFIndex()
+        ivf.upsert(['a', 'b'], np.eye(2, 300))
+        ivf.save(self.path)
+        loaded = IVFIndex.load(self.path)
+        loaded.remove(['a'])
+        loaded.upsert(['c'], np.eye(3, 300)[2:])
+        self.assertEqual([pk for pk, _ in loaded.search(np.eye(3, 300)[2], 3)], ['c', 'b'])
+
+
+class PQIndexTests(SimpleTestCase):
+    def test_rows_removed_before_training_stay_removed(self):
+        vectors = np.random.default_rng(0).normal(size=(300, 300))
+        pq = PQIndex()
+        pq.upsert([f'event-{i}' for i in range(300)], vectors)
+        pq.remove(['event-0', 'event-1'])
+        pq.train()
+        self.assertEqual(len(pq), 298)
+        self.assertNotIn('event-0', pq)
+        hits = {pk for pk, _ in pq.search(vectors[0], 10)}
+        self.assertNotIn('event-0', hits)
+
+
+class SharedIndexTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.lazy = SharedLazyIndex(index._events, index._event_row, directory.name, 'events')
+        now = timezone.now()
+        self.event = Event.objects.create(name='e', description='d', start_date=now, end_date=now, location='l')
+
+    def test_old_generations_fall_back_to_the_database(self):
+        self.lazy.publish()
+        self.assertIsNotNone(self.lazy.build().published_generation)
+
+        # Deleted by another process after the last publish
+        Event.objects.filter(pk=self.event.pk).delete()
+        self.assertIn(self.event.pk, self.lazy.build())
+        with mock.patch('TFapp.recommendation.shared.time.time', return_value=time.time() + MAX_GENERATION_AGE):
+            rebuilt = self.lazy.build()
+        self.assertIsNone(rebuilt.published_generation)
+        self.assertNotIn(self.event.pk, rebuilt)
+
+    def test_idle_publish_only_replaces_old_generations(self):
+        with mock.patch.object(index, 'event_index', self.lazy), \
+                mock.patch.object(index, 'user_index', index.LazyIndex(index._users, index._user_row)):
+            publish_shared_indexes(force=False)
+            first = read_manifest(self.lazy.directory, 'events')['generation']
+            publish_shared_indexes(force=False)
+            self.assertEqual(read_manifest(self.lazy.directory, 'events')['generation'], first)
+            later = time.time() + REPUBLISH_INTERVAL
+            with mock.patch('TFapp.recommendation.shared.time.time', return_value=later):
+                publish_shared_indexes(force=False)
+            self.assertNotEqual(read_manifest(self.lazy.directory, 'events')['generation'], first)
+
+
+class RecommendationCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        now = timezone.now()
+        event = Event(name='e', description='d', start_date=now, end_date=now + timedelta(days=1), location='l')
+        event.set_embedding(np.ones(300, dtype=np.float32))
+        event.save()
+        self.event = event
+        self.user = User.objects.create_user(username='u', email='u@example.com', password='x', last_login=now)
+        self.user.set_embedding(np.ones(300, dtype=np.float32))
+        self.user.save()
+
+    def lazy_index(self):
+        return SharedLazyIndex(index._events, index._event_row, self.directory, 'events')
+
+    def test_precompute_is_skipped_with_a_local_cache(self):
+        with mock.patch.object(index, 'event_index', self.lazy_index()):
+            self.assertEqual(recommendations.precompute_recommendations(), 0)
+
+    def test_workers_on_the_published_generation_read_precomputed_results(self):
+        job = self.lazy_index()
+        with mock.patch.object(recommendations, 'cache_is_shared', return_value=True):
+            with mock.patch.object(index, 'event_index', job):
+                job.publish()
+                self.assertEqual(recommendations.precompute_recommendations(), 1)
+
+        worker = self.lazy_index()
+        with mock.patch.object(index, 'event_index', worker):
+            with mock.patch.object(worker.get(), 'search', side_effect=AssertionError('cache miss')):
+                hits = recommendations.recommended_events_for(self.user)
+            self.assertEqual([pk for pk, _ in hits], [self.event.pk])
+
+            # Local changes give this worker's index a version of its own
+            index.update_event_index([self.event])
+            with mock.patch.object(worker.get(), 'search', wraps=worker.get().search) as search:
+                recommendations.recommended_events_for(self.user)
+            search.assert_called_once()
+
+
+class BM25IndexTests(SimpleTestCase):
+    def test_rare_terms_and_short_documents_rank_first(self):
+        bm25 = search.BM25Index()
+        bm25.upsert(('event', 1), search.tokenize('Python hackathon'))
+        bm25.upsert(('event', 2), search.tokenize('Hackathon for python and rust and go and java developers'))
+        bm25.upsert(('team', 3), search.tokenize('Hackathon team'))
+        self.assertEqual([doc for doc, _ in bm25.search(search.tokenize('python'), 10)], [('event', 1), ('event', 2)])
+        self.assertEqual(bm25.search(search.tokenize('rust hackathon'), 1)[0][0], ('event', 2))
+        self.assertEqual([doc for doc, _ in bm25.search(['hackathon'], 10, kind='team')], [('team', 3)])
+
+        bm25.upsert(('event', 1), search.tokenize('Go meetup'))
+        bm25.remove(('event', 2))
+        self.assertEqual(bm25.search(['python'], 10), [])
+        self.assertEqual(len(bm25), 2)
+
+    def test_documents_in_both_rankings_rise_to_the_top(self):
+        keyword = [('a', 9.0), ('b', 5.0), ('c', 1.0)]
+        vector = [('d', 0.9), ('c', 0.8), ('a', 0.1)]
+        self.assertEqual([doc for doc, _ in search.fuse([keyword, vector], 3)], ['a', 'c', 'd'])
+
+
+class SearchViewTests(TestCase):
+    def setUp(self):
+        for lazy in (search.search_index, index.event_index, index.team_index):
+            patcher = mock.patch.object(lazy, '_index', None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='s', email='s@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        self.event = Event.objects.create(
+            name='Robotics hackathon', description='Build robots', start_date=now, end_date=now, location='l',
+        )
+        self.team = Team.objects.create(
+            name='Robot builders', description='We like robotics', event=self.event, owner=self.user, max_size=3,
+        )
+
+    def get(self, query, **params):
+        with mock.patch('TFapp.views.search_view.query_vector', return_value=None):
+            response = self.client.get('/TFapp/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['item']['id']) for row in response.data]
+
+    def test_type_filter(self):
+        self.assertEqual(len(self.get('robotics')), 2)
+        self.assertEqual(self.get('robotics', type='team'), [('team', str(self.team.pk))])
+        self.assertEqual(self.get('robotics', type='event'), [('event', str(self.event.pk))])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.get('drones'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.name = 'Drones hackathon'
+            self.event.save()
+        self.assertEqual(self.get('drones'), [('event', str(self.event.pk))])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.delete()
+        self.assertEqual(self.get('robotics', type='team'), [])
+
+    def test_vector_matches_come_from_the_embedding_indexes(self):
+        vector = np.zeros(300, dtype=np.float32)
+        vector[0] = 1.0
+        self.event.set_embedding(vector)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.save()
+        hits = search.search('nothing matches this text', vector=vector)
+        self.assertEqual([(kind, pk) for kind, pk, _ in hits][0], ('event', self.event.pk))
+        self.assertNotIn('vectors', vars(search.search_index.get()))
+
+
+class ParseTagsTests(SimpleTestCase):
+    def test_normalizes_and_deduplicates(self):
+        self.assertEqual(
+            parse_tags(' Machine  Learning., python;PYTHON\nReact/ ,, '),
+            ['machine learning', 'python', 'react'],
+        )
+
+    def test_empty_and_overlong_input(self):
+        self.assertEqual(parse_tags(None), [])
+        self.assertEqual(parse_tags(' , ;'), [])
+        self.assertEqual(parse_tags('x' * 80), ['x' * MAX_TAG_LENGTH])
+
+
+class TeamQueryCountTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.me = User.objects.create_user(username='me', email='me@example.com', password='x')
+        now = timezone.now()
+        event = Event.objects.create(name='Hack', description='d', start_date=now, end_date=now, location='l')
+        self.teams = []
+        for i in range(5):
+            owner = User.objects.create_user(username=f'owner{i}', email=f'owner{i}@example.com', password='x')
+            team = Team.objects.create(name=f'Team {i}', description='d', event=event, owner=owner, max_size=4)
+            Membership.objects.create(user=owner, team=team, status=Membership.MemberStatus.ACCEPTED)
+            Membership.objects.create(user=self.me, team=team, status=Membership.MemberStatus.ACCEPTED)
+            self.teams.append(team)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def test_team_list_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/TFapp/teams/')
+        self.assertEqual([row['current_size'] for row in response.data['results']], [2] * 5)
+        self.assertEqual(response.data['results'][0]['event_name'], 'Hack')
+
+    def test_team_detail_does_not_query_per_member(self):
+        # The team, then all its memberships with their users
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/TFapp/teams/{self.teams[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_teams_does_not_query_per_team(self):
+        # The user lookup, then the teams with their counts
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/TFapp/users/{self.me.pk}/teams/')
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual({row['current_size'] for row in response.data}, {2})
+
+
+class TeamDetailMembershipTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        now = timezone.now()
+        event = Event.objects.create(name='Hack', description='d', start_date=now, end_date=now, location='l')
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='x')
+        self.team = Team.objects.create(name='Team', description='d', event=event, owner=self.owner, max_size=10)
+        self.pending = []
+        for i, status in enumerate([Membership.MemberStatus.ACCEPTED] * 3 + [Membership.MemberStatus.PENDING] * 3):
+            user = User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='x')
+            Membership.objects.create(user=user, team=self.team, status=status)
+            if status == Membership.MemberStatus.PENDING:
+                self.pending.append(user)
+
+    def retrieve(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        # The team, then all its memberships with their users
+        with self.assertNumQueries(2):
+            response = client.get(f'/TFapp/teams/{self.team.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_memberships_are_partitioned_in_one_pass(self):
+        data = self.retrieve(self.owner)
+        self.assertEqual(len(data['approved_members']), 3)
+        self.assertEqual(len(data['pending_requests']), 3)
+        self.assertEqual(data['current_size'], 3)
+
+        # An applicant only sees their own request
+        data = self.retrieve(self.pending[0])
+        self.assertEqual(len(data['approved_members']), 3)
+        self.assertEqual(len(data['pending_requests']), 1)
+
+
+def direction(angle):
+    """Unit embedding at ``angle`` radians from the first axis, in the first plane."""
+    vector = np.zeros(300, dtype=np.float32)
+    vector[:2] = np.cos(angle), np.sin(angle)
+    return vector
+
+
+class RecommendationEndpointTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        for lazy in (index.user_index, index.team_index):
+            patcher = mock.patch.object(lazy, '_index', None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        now = timezone.now()
+        self.event = Event.objects.create(
+            name='Hack', description='d', start_date=now, end_date=now + timedelta(days=7), location='l',
+        )
+
+    def user(self, name, angle):
+        user = User.objects.create_user(username=name, email=f'{name}@example.com', password='x')
+        user.set_embedding(direction(angle))
+        user.save()
+        return user
+
+    def team(self, name, owner, angle, **kwargs):
+        team = Team(name=name, description='d', event=self.event, owner=owner, max_size=kwargs.pop('max_size', 4), **kwargs)
+        team.set_embedding(direction(angle))
+        team.save()
+        return team
+
+    def get(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data]
+
+    def test_recommended_members(self):
+        owner = self.user('owner', 0.0)
+        team = self.team('Team', owner, 0.0)
+        member = self.user('member', 0.0)
+        applicant = self.user('applicant', 0.0)
+        Membership.objects.create(user=member, team=team, status=Membership.MemberStatus.ACCEPTED)
+        Membership.objects.create(user=applicant, team=team, status=Membership.MemberStatus.PENDING)
+        close, far = self.user('close', 0.2), self.user('far', 1.2)
+
+        ids = self.get(owner, f'/TFapp/teams/{team.pk}/recommended_members/')
+        self.assertEqual(ids, [str(close.pk), str(far.pk)])
+
+    def test_recommended_teams(self):
+        me = self.user('me', 0.0)
+        owner = self.user('owner', 1.0)
+        close = self.team('Close', owner, 0.1)
+        far = self.team('Far', owner, 1.0)
+        self.team('Closed', owner, 0.0, is_open=False)
+        full = self.team('Full', owner, 0.0, max_size=1)
+        Membership.objects.create(user=owner, team=full, status=Membership.MemberStatus.ACCEPTED)
+        self.team('Mine', me, 0.0)
+        applied = self.team('Applied', owner, 0.0)
+        Membership.objects.create(user=me, team=applied, status=Membership.MemberStatus.PENDING)
+
+        ids = self.get(me, f'/TFapp/events/{self.event.pk}/recommended_teams/')
+        self.assertEqual(ids, [str(close.pk), str(far.pk)])
+
+
+class NeedingMySkillsTests(TestCase):
+    def test_team_with_room_is_listed_when_several_skills_match(self):
+        owner = User.objects.create_user(username='owner', email='owner@example.com', password='x')
+        member = User.objects.create_user(username='member', email='member@example.com', password='x')
+        me = User.objects.create_user(
+            username='me', email='me@example.com', password='x', skills='Python, Django, React',
+        )
+        now = timezone.now()
+        event = Event.objects.create(
+            name='Hack', description='d', start_date=now, end_date=now + timedelta(days=7), location='l',
+        )
+        team = Team.objects.create(
+            name='Team', description='d', event=event, owner=owner, max_size=3,
+            required_skills='python, django, react',
+        )
+        Membership.objects.create(user=member, team=team, status=Membership.MemberStatus.ACCEPTED)
+
+        client = APIClient()
+        client.force_authenticate(me)
+        response = client.get('/TFapp/teams/needing_my_skills/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], [str(team.pk)])
+        self.assertEqual(response.data[0]['current_size'], 1)
+        self.assertEqual(response.data[0]['skill_match'], 1.0)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='x')
+        now = timezone.now()
+        self.event = Event.objects.create(
+            name='Hack', description='d', start_date=now, end_date=now + timedelta(days=7), location='l',
+            source_key='devpost:hack',
+        )
+        self.team = Team.objects.create(name='Team', description='d', event=self.event, owner=self.owner, max_size=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_fields_selects_keys_and_loads_only_their_columns(self):
+        response = self.client.get('/TFapp/teams/', {'fields': 'id,name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'id': str(self.team.pk), 'name': 'Team'}])
+
+        request = mock.Mock(method='GET', query_params={'fields': 'id,event_name'})
+        serializer = TeamSerializer(context={'request': request})
+        sql = str(serializer.restrict_queryset(Team.objects.with_member_count()).query)
+        self.assertIn('"TFapp_event"."name"', sql)
+        self.assertNotIn('description', sql)
+
+    def test_expand_nests_the_related_object(self):
+        response = self.client.get('/TFapp/teams/', {'expand': 'event,owner', 'fields': 'event,owner'})
+        self.assertEqual(response.status_code, 200)
+        row = response.data['results'][0]
+        self.assertEqual(row['event']['name'], 'Hack')
+        self.assertEqual(row['owner']['username'], 'owner')
+
+    def test_unknown_names_are_rejected(self):
+        for params in ({'fields': 'id,bogus'}, {'expand': 'bogus'}, {'expand': 'max_size'}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get('/TFapp/teams/', params).status_code, 400)
+
+    def test_events_do_not_expose_ingestion_fields(self):
+        response = self.client.get(f'/TFapp/events/{self.event.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('source_key', response.data)
+        self.assertEqual(self.client.get('/TFapp/events/', {'fields': 'source_key'}).status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='p', email='p@example.com', password='x'))
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), PAGE_SIZE)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_through_rows_sharing_one_end_date(self):
+        now = timezone.now()
+        # More than two pages of events ending at the same moment (a bulk import)
+        for end in (now + timedelta(days=1), now - timedelta(days=1)):
+            Event.objects.bulk_create(
+                Event(name=f'e{i}', description='d', start_date=now - timedelta(days=2), end_date=end, location='l')
+                for i in range(2 * PAGE_SIZE + 5)
+            )
+        upcoming = {str(pk) for pk in Event.objects.filter(end_date__gte=now).values_list('pk', flat=True)}
+        past = {str(pk) for pk in Event.objects.filter(end_date__lt=now).values_list('pk', flat=True)}
+
+        for url, expected in (('/TFapp/events/', upcoming), ('/TFapp/events/past/', past)):
+            ids = self.walk(url)
+            self.assertEqual(len(ids), len(set(ids)))
+            self.assertEqual(set(ids), expected)
+
+
+class EventResponseCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        self.event = Event.objects.create(
+            name='Before', description='d', start_date=now, end_date=now + timedelta(days=1), location='l',
+        )
+
+    def test_revalidation_and_invalidation_on_write(self):
+        url = f'/TFapp/events/{self.event.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data['name'], 'Before')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.name = 'After'
+            self.event.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.data['name'], 'After')
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_an_index(self):
+        for label, plan, scanned in explain_hot_queries():
+            with self.subTest(label):
+                self.assertEqual(scanned, [], plan)
+
+    def test_full_scans_are_detected(self):
+        plan = Event.objects.filter(description='x').explain()
+        self.assertTrue(full_scans(plan, connection.vendor), plan)
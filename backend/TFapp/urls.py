@@ -2,7 +2,7 @@ from django.urls import path, include
 from . import views
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
-from .views import EventViewSet, TeamViewSet, MembershipViewSet
+from .views import EventViewSet, TeamViewSet, MembershipViewSet, SearchView
 
 
 
@@ -30,6 +30,7 @@ teams_router.register(r'members', views.MembershipViewSet, basename='team-member
 
 # eg: GET http://127.0.0.1:8000/TFapp/events/
 urlpatterns = [
+    path('search/', SearchView.as_view(), name='search'),
     path('', include(router.urls)),
     path('', include(teams_router.urls)),
 ]
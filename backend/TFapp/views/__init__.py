@@ -2,3 +2,4 @@ from .team_view import TeamViewSet
 from .membership_view import MembershipViewSet
 from .user_view import UserProfileViewSet
 from .event_view import EventViewSet
+from .search_view import SearchView
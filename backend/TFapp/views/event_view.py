@@ -10,17 +10,31 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
-import numpy as np
+from django.db.models import Prefetch
 
 from ..models import Event, Team, Membership, User
 from ..serializers import EventSerializer, TeamSerializer, MembershipSerializer, PublicUserProfileSerializer, EventDetailSerializer, TeamDetailSerializer
 from ..permissions import IsTeamOwner, IsMemberItself, IsTeamOwnerOrMemberItself
+from ..cache import cache_response
+from ..recommendation.index import recommend_teams
+from ..recommendation.recommendations import recommended_events_for
+from .params import SparseQuerysetMixin, get_limit
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated]
+    sparse_actions = ('list', 'retrieve', 'past', 'all')
+
+    @property
+    def cursor_ordering(self):
+        """Keyset ordering of the paginated list actions."""
+        if self.action == 'past':
+            return ('-end_date', '-id')
+        if self.action == 'all':
+            return ('-start_date', '-id')
+        return ('end_date', 'id')
 
     def perform_create(self, serializer):
         print(self.request.user)
@@ -38,6 +52,14 @@ class EventViewSet(viewsets.ModelViewSet):
         # For the list view (e.g., /api/events/)
         return EventSerializer
 
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_queryset(self):
         """Return default queryset based on action.
 
@@ -48,6 +70,12 @@ class EventViewSet(viewsets.ModelViewSet):
         now = timezone.now()
         if self.action == 'list':
             return Event.objects.filter(end_date__gte=now)
+        if self.action == 'retrieve':
+            # EventDetailSerializer nests the event's teams; fetch them with
+            # their member counts in a single extra query.
+            return Event.objects.prefetch_related(
+                Prefetch('teams', queryset=Team.objects.with_member_count())
+            )
 
         return Event.objects.all()
 
@@ -63,12 +91,13 @@ class EventViewSet(viewsets.ModelViewSet):
         instance.save(update_fields=['embedding_needs_update'])
 
     @action(detail=False, methods=['get'], url_path='past')
+    @cache_response
     def past(self, request):
         """Return events that have already ended (end_date < now).
             GET /events/past/ 
         """
         now = timezone.now()
-        qs = Event.objects.filter(end_date__lt=now).order_by('-end_date')
+        qs = self.filter_queryset(Event.objects.filter(end_date__lt=now).order_by('-end_date'))
         page = self.paginate_queryset(qs)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -78,11 +107,12 @@ class EventViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='all')
+    @cache_response
     def all(self, request):
         """Return every event without filtering (special endpoint).
             GET /events/all/ 
         """
-        qs = Event.objects.all().order_by('-start_date')
+        qs = self.filter_queryset(Event.objects.all().order_by('-start_date'))
         page = self.paginate_queryset(qs)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -98,43 +128,43 @@ class EventViewSet(viewsets.ModelViewSet):
         similarity between the user's embedding and each event's embedding.
         GET /events/recommended/
         """
-        user = request.user
-        # Ensure user has an embedding accessor
+        # Recommend only upcoming/current events (same as list view). Results
+        # are cached per user embedding and event index generation, and
+        # usually precomputed by the embedding job.
         try:
-            user_vec = user.get_embedding_array()
+            hits = recommended_events_for(request.user, k=5, now=timezone.now().timestamp())
         except Exception:
             # If something is wrong with the user/embed, return empty list
             return Response([], status=status.HTTP_200_OK)
-
-        user_norm = np.linalg.norm(user_vec.astype(float))
-
-        # Recommend only upcoming/current events (same as list view)
-        now = timezone.now()
-        events_qs = Event.objects.filter(end_date__gte=now)
-
-        scored = []  # list of (score, event)
-        for ev in events_qs:
-            try:
-                ev_vec = ev.get_embedding_array()
-            except Exception:
-                # If event has bad embedding, treat similarity as 0
-                scored.append((0.0, ev))
-                continue
-
-            ev_norm = np.linalg.norm(ev_vec.astype(float))
-            if user_norm == 0 or ev_norm == 0:
-                sim = 0.0
-            else:
-                sim = float(np.dot(user_vec, ev_vec) / (user_norm * ev_norm))
-
-            # Clip numerical noise to [-1, 1]
-            sim = max(-1.0, min(1.0, sim))
-            scored.append((sim, ev))
-
-        # Sort by similarity descending and take top 5
-        scored.sort(key=lambda x: x[0], reverse=True)
-        top_events = [e for _, e in scored[:5]]
+        events = self.get_serializer().restrict_queryset(Event.objects.all()).in_bulk([pk for pk, _ in hits])
+        top_events = [events[pk] for pk, _ in hits if pk in events]
 
         serializer = self.get_serializer(top_events, many=True)
         return Response(serializer.data)
     
+
+    @action(detail=True, methods=['get'], url_path='recommended_teams')
+    def recommended_teams(self, request, pk=None):
+        """
+        Open, non-full teams of this event ranked by similarity between the
+        current user's embedding and each team's embedding. Teams the user
+        owns or already has a membership with are left out.
+        GET /events/{id}/recommended_teams/?limit=10
+        """
+        event = self.get_object()
+        limit = get_limit(request)
+        serializer = TeamSerializer(context={'request': request})
+        candidates = {
+            team.pk: team
+            for team in serializer.restrict_queryset(Team.objects.joinable())
+            .filter(event=event)
+            .exclude(owner=request.user)
+            .exclude(pk__in=Membership.objects.filter(user=request.user).values('team_id'))
+        }
+        if not candidates:
+            return Response([], status=status.HTTP_200_OK)
+
+        hits = recommend_teams(event.pk, request.user.get_embedding_array(), k=limit, include=candidates)
+        teams = [candidates[pk] for pk, _ in hits if pk in candidates]
+        serializer = TeamSerializer(teams, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
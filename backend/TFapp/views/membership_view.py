@@ -9,14 +9,16 @@ from ..serializers import (
     EventSerializer, TeamSerializer, MembershipSerializer, 
     PublicUserProfileSerializer, EventDetailSerializer, TeamDetailSerializer
 )
+from .params import SparseQuerysetMixin
 # Note: We no longer need the custom permission classes for this viewset
 
 # We inherit from ListModelMixin (for 'list') and GenericViewSet
 # This gives us more control and disables retrieve, update, destroy, create
-class MembershipViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class MembershipViewSet(SparseQuerysetMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     
     queryset = Membership.objects.all()
     serializer_class = MembershipSerializer
+    cursor_ordering = ('joined_at', 'id')
     # We set a simple default. Permissions will be checked
     # manually inside each action.
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,30 @@
+from rest_framework.exceptions import ValidationError
+
+
+def get_limit(request, default=10, maximum=50):
+    """Read the ``?limit=`` query parameter, clamped to ``1..maximum``."""
+    raw = request.query_params.get('limit')
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValidationError({'limit': 'Must be an integer.'})
+    return max(1, min(limit, maximum))
+
+
+class SparseQuerysetMixin:
+    """
+    Viewset mixin: for the actions in ``sparse_actions``, load only the
+    columns read by the response serializer (see
+    ``serializers.SparseFieldsMixin``), honouring ``?fields=`` / ``?expand=``.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.sparse_actions:
+            serializer = self.get_serializer()
+            if hasattr(serializer, 'restrict_queryset'):
+                queryset = serializer.restrict_queryset(queryset)
+        return queryset
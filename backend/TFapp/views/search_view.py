@@ -0,0 +1,48 @@
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..models import Event, Team
+from ..recommendation.fasttext import query_vector
+from ..recommendation.search import search
+from ..serializers import EventSerializer, TeamSerializer
+from .params import get_limit
+
+
+class SearchView(APIView):
+    """
+    Hybrid keyword + embedding search over events and teams.
+    GET /search/?q=<text>&type=event|team&limit=20
+
+    Results are ranked by reciprocal rank fusion of BM25 and embedding
+    similarity; each item is {"type", "score", "item"}.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This parameter is required.'})
+        kind = request.query_params.get('type') or None
+        if kind not in (None, 'event', 'team'):
+            raise ValidationError({'type': "Must be 'event' or 'team'."})
+        limit = get_limit(request, default=20, maximum=100)
+
+        hits = search(query, k=limit, vector=query_vector(query), kind=kind)
+        context = {'request': request}
+        events = EventSerializer(context=context).restrict_queryset(Event.objects.all())
+        events = events.in_bulk([pk for k, pk, _ in hits if k == 'event'])
+        teams = TeamSerializer(context=context).restrict_queryset(Team.objects.with_member_count())
+        teams = teams.in_bulk([pk for k, pk, _ in hits if k == 'team'])
+        results = []
+        for k, pk, score in hits:
+            if k == 'event' and pk in events:
+                item = EventSerializer(events[pk], context=context).data
+            elif k == 'team' and pk in teams:
+                item = TeamSerializer(teams[pk], context=context).data
+            else:
+                continue
+            results.append({'type': k, 'score': score, 'item': item})
+        return Response(results, status=status.HTTP_200_OK)
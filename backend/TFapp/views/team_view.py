@@ -11,16 +11,20 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.utils import timezone
+from django.db.models import Prefetch
 
-from ..models import Event, Team, Membership, User
+from ..models import Event, Team, Membership, User, Tag
 from ..serializers import EventSerializer, TeamSerializer, MembershipSerializer, PublicUserProfileSerializer, EventDetailSerializer, TeamDetailSerializer
 from ..permissions import IsTeamOwner, IsMemberItself, IsTeamOwnerOrMemberItself
+from ..recommendation.index import similar_users
+from .params import SparseQuerysetMixin, get_limit
 
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('created_at', 'id')
 
     def perform_create(self, serializer: TeamSerializer):
         # Prevent creating teams for events that have already ended
@@ -31,6 +35,16 @@ class TeamViewSet(viewsets.ModelViewSet):
         print(self.request.user)
         serializer.save(owner=self.request.user)
 
+    def get_queryset(self):
+        """Annotate accepted-member counts and join event/owner in one query."""
+        queryset = Team.objects.with_member_count()
+        if self.action == 'retrieve':
+            # TeamDetailSerializer partitions all memberships in memory
+            queryset = queryset.prefetch_related(
+                Prefetch('members', queryset=Membership.objects.select_related('user'))
+            )
+        return queryset
+
     def get_serializer_class(self):
         """
         Use TeamDetailSerializer for 'retrieve' (detail) view
@@ -64,6 +78,75 @@ class TeamViewSet(viewsets.ModelViewSet):
         serializer = MembershipSerializer(membership, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['get'], url_path='recommended_members', permission_classes=[IsAuthenticated])
+    def recommended_members(self, request, pk=None):
+        """
+        Users whose embedding is most similar to this team's, excluding the
+        owner and anyone who already has a membership (in any status).
+        GET /teams/{id}/recommended_members/?limit=10
+        """
+        team = self.get_object()
+        limit = get_limit(request)
+        exclude = set(Membership.objects.filter(team=team).values_list('user_id', flat=True))
+        exclude.add(team.owner_id)
+
+        hits = similar_users(team.get_embedding_array(), k=limit, exclude=exclude)
+        serializer = PublicUserProfileSerializer(context={'request': request})
+        users = serializer.restrict_queryset(User.objects.filter(is_active=True)).in_bulk([pk for pk, _ in hits])
+        ranked = [users[pk] for pk, _ in hits if pk in users]
+        serializer = PublicUserProfileSerializer(ranked, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='needing_my_skills')
+    def needing_my_skills(self, request):
+        """
+        Open, non-full teams of running/upcoming events that need at least one
+        of the current user's skills, best skill overlap first.
+        GET /teams/needing_my_skills/?limit=10
+
+        Each team gets `matched_skills`, `missing_skills` and `skill_match`
+        (the fraction of its required skills the user has).
+        """
+        limit = get_limit(request)
+        mine = set(request.user.skill_tags.values_list('id', flat=True))
+        if not mine:
+            return Response([], status=status.HTTP_200_OK)
+
+        # Matched through a subquery on the tag table: joining required_tags
+        # would repeat each team per matched tag and inflate accepted_count
+        candidates = {
+            team.pk: team
+            for team in Team.objects.joinable()
+            .filter(event__end_date__gte=timezone.now())
+            .filter(pk__in=Team.required_tags.through.objects.filter(tag_id__in=mine).values('team_id'))
+            .exclude(owner=request.user)
+            .exclude(pk__in=Membership.objects.filter(user=request.user).values('team_id'))
+        }
+        required = {}
+        for team_id, tag_id in Team.required_tags.through.objects.filter(
+            team_id__in=candidates
+        ).values_list('team_id', 'tag_id'):
+            required.setdefault(team_id, set()).add(tag_id)
+
+        scored = []
+        for team_id, tags in required.items():
+            matched = tags & mine
+            scored.append((len(matched) / len(tags), len(matched), team_id, matched, tags - matched))
+        scored.sort(key=lambda row: (-row[0], -row[1], str(row[2])))
+        scored = scored[:limit]
+
+        names = dict(Tag.objects.filter(
+            pk__in=set().union(*(row[3] | row[4] for row in scored))
+        ).values_list('id', 'name'))
+        results = []
+        for score, _, team_id, matched, missing in scored:
+            data = TeamSerializer(candidates[team_id], context={'request': request}).data
+            data['skill_match'] = score
+            data['matched_skills'] = sorted(names[t] for t in matched)
+            data['missing_skills'] = sorted(names[t] for t in missing)
+            results.append(data)
+        return Response(results, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], permission_classes=[IsTeamOwner])
     def invite(self, request, pk=None):
         """
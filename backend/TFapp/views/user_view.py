@@ -14,8 +14,10 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from ..models import Event, Team, Membership, User
 from ..serializers import EventSerializer, TeamSerializer, MembershipSerializer, PublicUserProfileSerializer, EventDetailSerializer, TeamDetailSerializer, UserProfileUpdateSerializer
 from ..permissions import IsTeamOwner, IsMemberItself, IsTeamOwnerOrMemberItself
+from ..recommendation.index import similar_users
+from .params import SparseQuerysetMixin, get_limit
 
-class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
+class UserProfileViewSet(SparseQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     """
     A viewset for viewing user profiles.
     
@@ -25,6 +27,7 @@ class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = User.objects.all().order_by('username')
     serializer_class = PublicUserProfileSerializer
+    cursor_ordering = ('username',)
     
     # Specify the lookup field, as your PK is 'id' (a UUID)
     lookup_field = 'id' 
@@ -56,7 +59,23 @@ class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
         Fetch all teams that the user is part of.
         """
         user = self.get_object()
-        memberships = Membership.objects.filter(user=user)
-        teams = [membership.team for membership in memberships]
-        serializer = TeamSerializer(teams, many=True)
+        serializer = TeamSerializer(context={'request': request})
+        teams = serializer.restrict_queryset(Team.objects.with_member_count()).filter(
+            pk__in=Membership.objects.filter(user=user).values('team_id')
+        )
+        serializer = TeamSerializer(teams, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def similar(self, request, id=None):
+        """
+        Users whose embedding is most similar to this user's.
+        GET /users/{id}/similar/?limit=10
+        """
+        user = self.get_object()
+        limit = get_limit(request)
+        hits = similar_users(user.get_embedding_array(), k=limit, exclude={user.pk})
+        users = self.get_serializer().restrict_queryset(User.objects.filter(is_active=True)).in_bulk([pk for pk, _ in hits])
+        ranked = [users[pk] for pk, _ in hits if pk in users]
+        serializer = PublicUserProfileSerializer(ranked, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from datetime import timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -92,12 +95,53 @@ WSGI_APPLICATION = 'teamfinder.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default. Set DJANGO_DB_ENGINE=postgresql (and the POSTGRES_*
+# variables) in production: SQLite serializes every write, so the scheduler
+# and web requests end up waiting on "database is locked".
+DJANGO_DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite3')
+if DJANGO_DB_ENGINE not in ('sqlite3', 'postgresql'):
+    # A typo must not silently run production on SQLite
+    raise ImproperlyConfigured(f"DJANGO_DB_ENGINE must be 'sqlite3' or 'postgresql', not {DJANGO_DB_ENGINE!r}.")
+
+if DJANGO_DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'teamfinder'),
+            'USER': os.environ.get('POSTGRES_USER', 'teamfinder'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # Reuse connections across requests, checking them before reuse
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DJANGO_DB_POOL', '') == '1':
+        # psycopg connection pool (needs psycopg[pool]); replaces persistent
+        # connections, which Django doesn't allow together with a pool
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DJANGO_DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('DJANGO_DB_POOL_MAX', '10')),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
-}
+
+# SQLite only: WAL journal and tuned pragmas on every connection (see
+# TFapp/sqlite_tuning.py), so readers aren't blocked by the scheduler's writes.
+TFAPP_SQLITE_TUNING = os.environ.get('TFAPP_SQLITE_TUNING', '') == '1'
+if TFAPP_SQLITE_TUNING and DJANGO_DB_ENGINE == 'sqlite3':
+    # Take the write lock when a transaction starts, so two writers queue on
+    # busy_timeout instead of one failing when it upgrades its read lock
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
 
 
 # Password validation
@@ -187,6 +231,8 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'dj_rest_auth.jwt_auth.JWTCookieAuthentication',  # or TokenAuthentication
     ],
+    # Keyset pagination; ?page= / ?offset= fall back to offset pagination
+    'DEFAULT_PAGINATION_CLASS': 'TFapp.pagination.KeysetPagination',
 }
 
 
@@ -198,4 +244,48 @@ ACCOUNT_USERNAME_REQUIRED = True
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend',
     'allauth.account.auth_backends.AuthenticationBackend',
-)
\ No newline at end of file
+)
+
+
+# Embeddings
+# Set TFAPP_EXTERNAL_EMBEDDING_WORKER=1 when `manage.py embedding_worker`
+# processes consume the embedding job queue; the in-process scheduler then
+# stops running the embedding job in web processes.
+TFAPP_EXTERNAL_EMBEDDING_WORKER = os.environ.get('TFAPP_EXTERNAL_EMBEDDING_WORKER', '') == '1'
+
+# Word vectors the embeddings are computed with: 'fasttext' loads the full
+# cc.en.300.bin, 'pruned' its memory-mapped vocabulary export
+# (`manage.py export_fasttext_vocab`). They embed the same text differently,
+# so switching queues every row for re-embedding.
+TFAPP_WORD_VECTORS = os.environ.get('TFAPP_WORD_VECTORS', 'fasttext')
+
+# Storage of the in-memory event recommendation index: 'exact' keeps float32
+# vectors, 'pq' keeps 30-byte product-quantization codes and re-ranks the
+# short list with the full vectors from the database.
+TFAPP_EVENT_INDEX_CODEC = os.environ.get('TFAPP_EVENT_INDEX_CODEC', 'exact')
+
+# Directory for the memory-mapped event and user indexes shared by all worker
+# processes. When set, the embedding job publishes the indexes there and web
+# processes attach to them instead of each building their own copy.
+TFAPP_SHARED_INDEX_DIR = os.environ.get('TFAPP_SHARED_INDEX_DIR') or None
+
+# PostgreSQL only: keep a pgvector copy of every embedding (see
+# `manage.py setup_pgvector`) and answer similar-user queries in the
+# database instead of the in-memory user index.
+TFAPP_PGVECTOR = os.environ.get('TFAPP_PGVECTOR', '') == '1'
+
+# Caching
+# Local memory by default; point DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION at
+# a shared backend (e.g. django.core.cache.backends.redis.RedisCache) so all
+# worker processes share cached responses and their invalidation.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'teamfinder'),
+    }
+}
+# Cache used for event endpoint responses (TFapp/cache.py) and how long an
+# entry may be served; with the per-process local-memory cache this also
+# bounds how stale another process's view of a write can be.
+TFAPP_RESPONSE_CACHE_ALIAS = 'default'
+TFAPP_RESPONSE_CACHE_TIMEOUT = int(os.environ.get('TFAPP_RESPONSE_CACHE_TIMEOUT', '60'))
@@ -20,4 +20,19 @@ apiClient.interceptors.request.use(config => {
   return Promise.reject(error);
 });
 
+// List endpoints are paginated ({next, previous, results}); follow the
+// `next` links and return every row. Plain arrays are returned as is.
+export const getAllPages = async (url) => {
+  let rows = [];
+  while (url) {
+    const response = await apiClient.get(url);
+    if (Array.isArray(response.data)) {
+      return rows.concat(response.data);
+    }
+    rows = rows.concat(response.data.results);
+    url = response.data.next;
+  }
+  return rows;
+}
+
 export default apiClient;
\ No newline at end of file
@@ -1,8 +1,7 @@
-import apiClient from './apiClient';
+import apiClient, { getAllPages } from './apiClient';
 
 export const getEvents = async () => {
-    const response = await apiClient.get(`TFapp/events/`);
-    return response.data;
+    return getAllPages(`TFapp/events/`);
 }
 
 export const getRecommendedEvents = async () => {
@@ -11,8 +10,7 @@ export const getRecommendedEvents = async () => {
 }
 
 export const getPastEvents = async () => {
-    const response = await apiClient.get(`TFapp/events/past/`);
-    return response.data;
+    return getAllPages(`TFapp/events/past/`);
 }
 
 export const getEvent = async (eventID) => {
@@ -1,9 +1,17 @@
 import apiClient from './apiClient';
 
 export const getProfile = async(username) => {
-  const response = await apiClient.get(`TFapp/users/`);
-  
-  return response.data.find((profile) => profile.username == username);
+  // Users are listed by username; stop at the first page containing it
+  let url = `TFapp/users/`;
+  while (url) {
+    const response = await apiClient.get(url);
+    const profile = response.data.results.find((profile) => profile.username == username);
+    if (profile) {
+      return profile;
+    }
+    url = response.data.next;
+  }
+  return undefined;
 }
 
 export const updateProfile = async(userID, newProfile) => {
@@ -6,7 +6,7 @@ export const getTeamInfo = async (teamID) => {
 }
 
 export const getRecommendedMembers = async (teamID) => {
-    const response = await apiClient.get(`TFapp/teams/${teamID}/recommended/`);
+    const response = await apiClient.get(`TFapp/teams/${teamID}/recommended_members/`);
     return response.data;
 }
 